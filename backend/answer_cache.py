@@ -0,0 +1,131 @@
+import os
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from index_version import INDEX_VERSION_FILE, read_index_version
+from lexical import identifiers
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Cosine similarity needed for a "near duplicate" question to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+def normalize_query(query):
+    query = query.lower().strip()
+    query = re.sub(r"\s+", " ", query)
+    return query.rstrip("?!. ")
+
+
+class AnswerCache:
+    """TTL + LRU cache of /chat answers with exact and near-duplicate lookup.
+
+    Exact hits are keyed by normalized query text and skip the embedding
+    call as well. Near hits compare the query embedding against every
+    cached one (a few hundred vectors, a single matrix product), and only
+    count when both questions name the same identifiers: "fire rating of
+    door D-101" and "... D-102" embed almost alike but have different
+    answers. The whole cache is dropped when ingest.py bumps the index
+    version.
+    """
+
+    def __init__(
+        self, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD,
+        version_path=INDEX_VERSION_FILE,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # key -> (value, unit vector or None, stored_at, identifiers)
+        self._matrix = None  # stacked vectors for near-hit search, rebuilt lazily
+        self._matrix_keys = []
+        self.version_path = version_path
+        self._index_version = read_index_version(version_path)
+        self.counters = {"hits_exact": 0, "hits_semantic": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _check_index_version(self):
+        version = read_index_version(self.version_path)
+        if version != self._index_version:
+            self._index_version = version
+            self.invalidate()
+
+    def invalidate(self):
+        self._entries.clear()
+        self._matrix = None
+        self._matrix_keys = []
+        self.counters["invalidations"] += 1
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] > self.ttl:
+            del self._entries[key]
+            self._matrix = None
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get_exact(self, query):
+        self._check_index_version()
+        value = self._live(normalize_query(query))
+        if value is not None:
+            self.counters["hits_exact"] += 1
+        return value
+
+    def get_similar(self, query, query_vector):
+        """Near-duplicate lookup; counts a miss when nothing close enough names the same identifiers."""
+        if self._matrix is None:
+            self._rebuild_matrix()
+        if self._matrix is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            scores = self._matrix @ vector
+            wanted = identifiers(normalize_query(query))
+            for best in np.argsort(-scores):
+                if scores[best] < self.threshold:
+                    break
+                key = self._matrix_keys[best]
+                entry = self._entries.get(key)
+                if entry is None or entry[3] != wanted:
+                    continue
+                value = self._live(key)
+                if value is not None:
+                    self.counters["hits_semantic"] += 1
+                    return value
+        self.counters["misses"] += 1
+        return None
+
+    def _rebuild_matrix(self):
+        keys = [key for key, entry in self._entries.items() if entry[1] is not None]
+        self._matrix_keys = keys
+        self._matrix = np.stack([self._entries[key][1] for key in keys]) if keys else None
+
+    def put(self, query, query_vector, value):
+        vector = None
+        if query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+        key = normalize_query(query)
+        self._entries[key] = (value, vector, time.monotonic(), identifiers(key))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+        self._matrix = None
+
+    def stats(self):
+        hits = self.counters["hits_exact"] + self.counters["hits_semantic"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            # Every hit skips one Gemini generation and one vector search;
+            # exact hits skip the query embedding too.
+            "llm_calls_saved": hits,
+            "embedding_calls_saved": self.counters["hits_exact"],
+        }
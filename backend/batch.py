@@ -0,0 +1,195 @@
+"""Answer a checklist of questions in one request (/chat/batch).
+
+A /chat loop pays one embedding call, one search and one generation per
+question, one question at a time. Here the uncached questions are
+embedded in a single API call and searched concurrently. Questions
+whose retrieved chunks mostly coincide ("fire rating of D-101", "hardware
+set of D-101") are answered by one generation over their shared context.
+Results are yielded as each group finishes, not when the whole batch does.
+"""
+import asyncio
+import json
+import os
+import time
+
+from answer_cache import normalize_query
+from lexical import doc_key
+from observability import CACHE_REQUESTS, record_stage, stage
+from pipeline import _elapsed_ms, _pack, aembed_queries, aretrieve, build_sources, retrieval_k
+
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+# Searches / generations of one batch in flight at once (the limiters still apply)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Most questions one generation answers
+BATCH_GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "5"))
+# Share of a question's chunks that must already be in a group's context for it to join the group
+BATCH_GROUP_OVERLAP = float(os.getenv("BATCH_GROUP_OVERLAP", "0.6"))
+
+_decoder = json.JSONDecoder()
+
+
+class Question:
+    """One distinct (normalized) question; `indexes` are its positions in the request."""
+
+    def __init__(self, text):
+        self.text = text
+        self.indexes = []
+        self.vector = None
+        self.docs = []
+        self.keys = set()
+
+
+def group_by_context(questions, max_size=BATCH_GROUP_SIZE, min_overlap=BATCH_GROUP_OVERLAP):
+    """Greedy grouping: a question joins the first group that already holds most of its chunks."""
+    groups = []  # [(questions, chunk keys of their combined context)]
+    for question in questions:
+        for members, keys in groups:
+            if len(members) < max_size and question.keys and len(question.keys & keys) >= min_overlap * len(question.keys):
+                members.append(question)
+                keys |= question.keys
+                break
+        else:
+            groups.append(([question], set(question.keys)))
+    return [members for members, _ in groups]
+
+
+def shared_context(group):
+    """Union of the group's chunks, interleaved by rank so every question's best chunks come first."""
+    docs, seen = [], set()
+    for rank in range(max(len(question.docs) for question in group)):
+        for question in group:
+            if rank < len(question.docs) and doc_key(question.docs[rank]) not in seen:
+                seen.add(doc_key(question.docs[rank]))
+                docs.append(question.docs[rank])
+    return docs
+
+
+def parse_answers(content, count):
+    """The answers list of a grouped generation, or None if it is not `count` strings."""
+    content = content.replace("```json", "").replace("```", "")
+    # The first JSON object holding the answers; text around it may have braces of its own
+    start, answers = content.find("{"), None
+    while start >= 0 and answers is None:
+        try:
+            answers = _decoder.raw_decode(content, start)[0]["answers"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            start = content.find("{", start + 1)
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    return [str(answer) for answer in answers]
+
+
+def _unique_sources(docs):
+    return list({(source["file"], source["page"]): source for source in build_sources(docs)}.values())
+
+
+async def abatch_answer(
+    queries, embeddings, vectorstore, qa_chain, batch_chain, k=None, cache=None, lexical=None, namespace=None, filter=None,
+    chunks=None,
+):
+    """Yield (event, data): ("answer", {...}) per question as it is answered,
+    ("error", (indexes, exception)) for a group that failed, then ("done", stats).
+    """
+    timings = {}
+    start_total = time.perf_counter()
+    stats = {"questions": len(queries), "cached": 0, "llm_calls": 0, "groups": 0}
+
+    def answer_events(question, answer, sources, cached=None):
+        for index in question.indexes:
+            yield "answer", {"index": index, "question": queries[index], "answer": answer, "sources": sources, "cache": cached}
+
+    # 1. Duplicates in the batch are answered once; exact cache hits need no embedding
+    questions = {}
+    for index, query in enumerate(queries):
+        questions.setdefault(normalize_query(query), Question(query)).indexes.append(index)
+    pending = []
+    for question in questions.values():
+        cached = cache.get_exact(question.text) if cache is not None else None
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache="answer", result="exact")
+            stats["cached"] += len(question.indexes)
+            for event in answer_events(question, cached["answer"], cached["sources"], "exact"):
+                yield event
+        else:
+            pending.append(question)
+    if not pending:
+        timings["total_ms"] = _elapsed_ms(start_total)
+        yield "done", {**stats, "timings": timings}
+        return
+
+    # 2. One embedding call for every remaining question
+    with stage("embed", timings):
+        vectors = await aembed_queries(embeddings, [question.text for question in pending])
+    misses = []
+    for question, vector in zip(pending, vectors):
+        question.vector = vector
+        cached = cache.get_similar(question.text, vector) if cache is not None else None
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache="answer", result="semantic")
+            stats["cached"] += len(question.indexes)
+            for event in answer_events(question, cached["answer"], cached["sources"], "semantic"):
+                yield event
+        else:
+            if cache is not None:
+                CACHE_REQUESTS.inc(cache="answer", result="miss")
+            misses.append(question)
+
+    # 3. Concurrent searches
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    k = k or retrieval_k(lexical)
+
+    async def search(question):
+        async with slots:
+            question.docs = await aretrieve(
+                question.text, embeddings, vectorstore, k, {}, query_vector=question.vector, lexical=lexical,
+                namespace=namespace, filter=filter, chunks=chunks,
+            )
+            question.keys = {doc_key(doc) for doc in question.docs}
+
+    with stage("retrieve", timings):
+        await asyncio.gather(*[search(question) for question in misses])
+
+    # 4. One generation per group of questions with shared context, streamed as groups finish
+    async def generate(group):
+        async with slots:
+            try:
+                if len(group) > 1:
+                    docs, _ = _pack(shared_context(group))
+                    numbered = "\n".join(f"{i}. {question.text}" for i, question in enumerate(group, 1))
+                    answers = parse_answers(await batch_chain.ainvoke({"input": numbered, "context": docs}), len(group))
+                    if answers is not None:
+                        return group, answers, 1
+                # A single question, or a grouped answer that did not parse: one generation each
+                answers = []
+                for question in group:
+                    docs, _ = _pack(question.docs)
+                    answers.append(await qa_chain.ainvoke({"input": question.text, "context": docs}))
+                return group, answers, len(group) + (len(group) > 1)
+            except Exception as e:
+                return group, e, 0
+
+    groups = group_by_context(misses)
+    stats["groups"] = len(groups)
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(generate(group)) for group in groups]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            group, answers, calls = await finished
+            stats["llm_calls"] += calls
+            if isinstance(answers, Exception):
+                yield "error", ([index for question in group for index in question.indexes], answers)
+                continue
+            for question, answer in zip(group, answers):
+                sources = _unique_sources(question.docs)
+                if cache is not None:
+                    cache.put(question.text, question.vector, {"answer": answer, "sources": sources})
+                for event in answer_events(question, answer, sources):
+                    yield event
+    finally:
+        # The client went away: stop generating for it
+        for task in tasks:
+            task.cancel()
+    # Not a `with stage()`: the block would straddle yields to the client
+    record_stage("generate", start, timings)
+    timings["total_ms"] = _elapsed_ms(start_total)
+    yield "done", {**stats, "timings": timings}
@@ -0,0 +1,107 @@
+"""Throughput of /chat/batch against a sequential /chat loop over the same checklist.
+
+Runs the real app in-process with fake backends (see benchmark.py). The
+checklist asks the same few questions about each of a set of doors, like
+a submittal review does. Both runs start from an empty answer cache.
+
+    python bench_batch.py
+    python bench_batch.py --doors 25 --llm-latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmark import local_app
+
+CHECKLIST = [
+    "What is the fire rating of door D-{mark}?",
+    "What hardware set does door D-{mark} use?",
+    "What is the frame material of door D-{mark}?",
+    "What are the width and height of door D-{mark}?",
+]
+
+
+def read_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def sequential(client, questions):
+    answers = []
+    for question in questions:
+        response = await client.post("/chat", json={"query": question})
+        answers.append(response.json()["answer"])
+    return answers
+
+
+async def batched(client, questions):
+    response = await client.post("/chat/batch", json={"questions": questions})
+    answers, done = {}, {}
+    for event, data in read_events(response.text):
+        if event == "answer":
+            answers[data["index"]] = data["answer"]
+        elif event == "done":
+            done = data
+    return answers, done
+
+
+async def run(args):
+    # Fake embeddings are random per text, so questions only share their keyword hits
+    # (2 of 5 chunks); real embeddings of questions about one door overlap more.
+    os.environ["BATCH_GROUP_OVERLAP"] = str(args.group_overlap)
+    questions = [question.format(mark=100 + door) for door in range(1, args.doors + 1) for question in CHECKLIST]
+    with tempfile.TemporaryDirectory() as workdir:
+        app = local_app(args, workdir)
+        async with app.router.lifespan_context(app):
+            await app.state.warm_up
+            state = app.state
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+                results = {}
+                for name in ("sequential", "batch"):
+                    state.answer_cache.invalidate()
+                    llm_before, embed_before = state.llm.calls, state.embeddings.calls
+                    start = time.perf_counter()
+                    if name == "sequential":
+                        answers, done = await sequential(client, questions), {}
+                    else:
+                        answers, done = await batched(client, questions)
+                    seconds = time.perf_counter() - start
+                    results[name] = {
+                        "answered": len(answers), "seconds": seconds,
+                        "llm_calls": state.llm.calls - llm_before, "embedding_calls": state.embeddings.calls - embed_before,
+                        "groups": done.get("groups"),
+                    }
+    return len(questions), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doors", type=int, default=25, help=f"doors in the checklist ({len(CHECKLIST)} questions each)")
+    parser.add_argument("--chunks", type=int, default=2000, help="fake corpus size")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.03)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--group-overlap", type=float, default=0.4, help="BATCH_GROUP_OVERLAP for the batch run")
+    args = parser.parse_args()
+
+    count, results = asyncio.run(run(args))
+    print(f"\n📋 {count} checklist questions")
+    for name, r in results.items():
+        groups = f" in {r['groups']} groups" if r["groups"] is not None else ""
+        print(f"   {name:<10} {r['answered']} answers in {r['seconds']:6.2f}s ({r['answered'] / r['seconds']:5.1f} q/s), "
+              f"{r['embedding_calls']} embedding calls, {r['llm_calls']} LLM calls{groups}")
+    speedup = results["sequential"]["seconds"] / results["batch"]["seconds"]
+    print(f"   /chat/batch is {speedup:.1f}x the throughput of the /chat loop")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import statistics
+import time
+
+from langchain_core.documents import Document
+
+from clients import build_llm, build_qa_chain
+from fakes import FakeChatModel
+
+# Per-request client setup cost, before (build everything per request) vs after
+# (built once in the lifespan hook). Generation itself is stubbed so only the
+# overhead is measured; construction uses the real Gemini client class.
+REQUESTS = 200
+CONTEXT = [Document(page_content="D-101 Lobby 900 x 2100 HM 1 HR", metadata={"source": "specs.pdf", "page": 0})]
+STUB_LLM = FakeChatModel(latency=0.0)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def per_request_setup():
+    # Old behaviour: new ChatGoogleGenerativeAI + prompt + chain on every call
+    build_llm(os.getenv("GOOGLE_API_KEY") or "bench-key")
+    qa_chain = build_qa_chain(STUB_LLM)
+    return await qa_chain.ainvoke({"input": "fire rating?", "context": CONTEXT})
+
+
+async def pooled(qa_chain):
+    return await qa_chain.ainvoke({"input": "fire rating?", "context": CONTEXT})
+
+
+async def measure(label, make_call):
+    samples = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        await make_call()
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<28} p50 {statistics.median(samples):6.2f} ms | p95 {percentile(samples, 95):6.2f} ms")
+    return statistics.median(samples)
+
+
+async def main():
+    print(f"🚀 Per-request overhead over {REQUESTS} requests (stubbed LLM)\n")
+    before = await measure("build per request (before)", per_request_setup)
+    shared_chain = build_qa_chain(STUB_LLM)
+    after = await measure("built at startup (after)", lambda: pooled(shared_chain))
+    print(f"\n📊 Saved {before - after:.2f} ms per request at p50")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Startup cost: import time of main.py, time to ready, first vs warm request.
+
+Import time is measured in fresh interpreters (the number Render's cold
+start pays), next to the time the provider SDKs take to import - which
+main.py paid eagerly before the clients moved into the background warm-up.
+Time to ready and request latencies use the in-process app with fake
+backends from benchmark.py.
+
+    python bench_startup.py
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SDK_IMPORTS = "import langchain_google_genai, pinecone, langchain_pinecone, langchain.chains.combine_documents"
+
+
+def import_seconds(statement, runs):
+    env = {**os.environ, "GOOGLE_API_KEY": "bench-key", "PINECONE_API_KEY": "bench-key"}
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+async def first_requests(args):
+    from benchmark import local_app
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = local_app(args, workdir)
+        start = time.perf_counter()
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                serving = time.perf_counter() - start
+                early = await client.get("/readyz")
+                await app.state.warm_up
+                ready = time.perf_counter() - start
+
+                latencies = []
+                for i in range(args.requests):
+                    request_start = time.perf_counter()
+                    response = await client.post("/chat", json={"query": f"Fire rating of door D-{101 + i}?"})
+                    response.raise_for_status()
+                    latencies.append((time.perf_counter() - request_start) * 1000)
+    return serving, early.status_code, ready, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.03)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"🚀 Import time (median of {args.runs} fresh interpreters)\n")
+    main_s = import_seconds("import main", args.runs)
+    sdk_s = import_seconds(SDK_IMPORTS, args.runs)
+    print(f"   import main              {main_s * 1000:7.0f} ms")
+    print(f"   provider SDKs (deferred) {sdk_s * 1000:7.0f} ms  <- now paid in the background warm-up")
+
+    serving, early_status, ready, latencies = asyncio.run(first_requests(args))
+    print("\n🚀 Startup with fake backends\n")
+    print(f"   serving HTTP after   {serving * 1000:7.1f} ms (/readyz -> {early_status} while warming up)")
+    print(f"   ready after          {ready * 1000:7.1f} ms")
+    print(f"   first /chat          {latencies[0]:7.1f} ms")
+    if len(latencies) > 1:
+        print(f"   later /chat (median) {statistics.median(latencies[1:]):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
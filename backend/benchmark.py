@@ -0,0 +1,266 @@
+"""Load test for the API: concurrency, request mix, p50/p95/p99 and per-stage timings.
+
+By default it runs the real FastAPI app in-process with fake embedding,
+vector store and LLM backends (see fakes.py), so results only depend on
+our own code and the simulated latencies. --url points it at a live
+deployment instead. Results are written as JSON; --compare prints the
+change against an earlier run.
+
+    python benchmark.py --requests 500 --concurrency 16
+    python benchmark.py --mix chat_miss=1 --compare bench_results/<earlier>.json
+    python benchmark.py --url https://project-brain-yzjp.onrender.com --requests 20 --concurrency 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+DEFAULT_MIX = "chat_miss=0.6,chat_hit=0.3,extract=0.1"
+RESULTS_DIR = "bench_results"
+# Questions that repeat across requests, so the answer cache can serve them
+HOT_QUESTIONS = [
+    "What is the fire rating for door D-101?",
+    "List the hardware set for the Lobby door.",
+    "What is the height of door 105?",
+    "Who is the manufacturer of the wood doors?",
+    "Does the roof have a warranty?",
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples):
+    if not samples:
+        return None
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 2),
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("chat_miss", "chat_hit", "extract"):
+            raise SystemExit(f"Unknown request kind '{kind}' (use chat_miss, chat_hit, extract)")
+        weights[kind] = float(weight or 1)
+    return weights
+
+
+def build_request(kind, i):
+    if kind == "extract":
+        return "POST", "/extract", None
+    if kind == "chat_hit":
+        return "POST", "/chat", {"query": HOT_QUESTIONS[i % len(HOT_QUESTIONS)]}
+    # Unique wording per request: misses the answer cache
+    return "POST", "/chat", {"query": f"What is the fire rating and frame material of door D-{100 + i}? (run {i})"}
+
+
+async def run_load(client, plan, concurrency):
+    results = []
+    queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            i, kind = queue.get_nowait()
+            method, path, body = build_request(kind, i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                data = response.json()
+                ok = response.status_code == 200 and "Internal Server Error" not in str(data.get("answer", ""))
+            except Exception as e:
+                data, ok = {"error": str(e)}, False
+            results.append({
+                "kind": kind,
+                "ok": ok,
+                "latency_ms": (time.perf_counter() - start) * 1000,
+                "timings": data.get("timings") or {},
+                "cache": data.get("cache"),
+            })
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return results, time.perf_counter() - start
+
+
+def report(results, seconds, args):
+    ok = [r for r in results if r["ok"]]
+    stages = {}
+    for r in ok:
+        for stage, ms in r["timings"].items():
+            stages.setdefault(stage, []).append(ms)
+    by_kind = {}
+    for r in ok:
+        by_kind.setdefault(r["kind"], []).append(r["latency_ms"])
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "target": args.url or "local (fake backends)",
+            "requests": len(results),
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "latencies_s": None if args.url else {"embed": args.embed_latency, "search": args.search_latency, "llm": args.llm_latency},
+        },
+        "overall": {
+            **(summarize([r["latency_ms"] for r in ok]) or {}),
+            "errors": len(results) - len(ok),
+            "throughput_rps": round(len(results) / seconds, 2),
+            "seconds": round(seconds, 2),
+            "cache_hits": sum(1 for r in ok if r["cache"]),
+        },
+        "by_kind": {kind: summarize(samples) for kind, samples in sorted(by_kind.items())},
+        "stages": {stage: summarize(samples) for stage, samples in sorted(stages.items())},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(result, previous=None):
+    def delta(section, key, field):
+        if not previous:
+            return ""
+        before = (previous.get(section, {}).get(key) or {}).get(field)
+        after = (result[section].get(key) or {}).get(field)
+        if not before or after is None:
+            return ""
+        return f" ({(after - before) / before * 100:+.0f}%)"
+
+    overall = result["overall"]
+    print(f"\n📊 {result['meta']['requests']} requests @ concurrency {result['meta']['concurrency']} "
+          f"-> {overall['throughput_rps']} req/s, {overall['errors']} errors, {overall['cache_hits']} cache hits")
+    if "p50_ms" in overall:
+        print(f"   overall     p50 {overall['p50_ms']:8.1f} ms | p95 {overall['p95_ms']:8.1f} ms | p99 {overall['p99_ms']:8.1f} ms")
+    for section in ("by_kind", "stages"):
+        for key, stats in result[section].items():
+            print(f"   {key:<11} p50 {stats['p50_ms']:8.1f} ms{delta(section, key, 'p50_ms')} | "
+                  f"p95 {stats['p95_ms']:8.1f} ms{delta(section, key, 'p95_ms')} | p99 {stats['p99_ms']:8.1f} ms")
+    if previous:
+        before = previous["overall"]["throughput_rps"]
+        print(f"   throughput vs {previous['meta'].get('commit')}: {(overall['throughput_rps'] - before) / before * 100:+.0f}%")
+
+
+def local_app(args, workdir):
+    """Import main with fake backends and state files in a scratch directory."""
+    os.environ.update({
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY") or "bench-key",
+        "PINECONE_API_KEY": os.getenv("PINECONE_API_KEY") or "bench-key",
+        "PDF_FOLDER_PATH": os.path.join(workdir, "no-pdfs"),
+        "SCHEDULE_DB_PATH": os.path.join(workdir, "schedule.sqlite3"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.json"),
+        "CHUNK_DB_PATH": os.path.join(workdir, "chunks.sqlite3"),
+        "INDEX_VERSION_FILE": os.path.join(workdir, ".index_version"),
+    })
+    import main as api
+    from chunk_store import ChunkStore
+    from fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+    from ingest_pipeline import vector_metadata
+    from lexical import LexicalIndex
+
+    embeddings = FakeEmbeddings(size=64, latency=args.embed_latency)
+    vectorstore = FakeVectorStore(embeddings, latency=args.search_latency)
+    lexical = LexicalIndex()
+    rng = random.Random(0)
+    texts, metadatas, ids = [], [], []
+    for i in range(args.chunks):
+        mark = 100 + i % 200
+        texts.append(f"D-{mark} {rng.choice(['Lobby', 'Corridor', 'Stair', 'Office'])} {rng.choice([900, 1000])} x 2100 "
+                     f"{rng.choice(['HM', 'Wood', 'Alum'])} {rng.choice(['1 HR', '45 min', 'None'])} hardware set {i % 12}")
+        metadatas.append({"source": f"Documents/spec-{i % 5}.pdf", "page": i // 10, "start_index": 0})
+        ids.append(f"chunk-{i}")
+    # Laid out like ingest.py leaves it: vectors and BM25 postings without text, text in the chunk store
+    vectorstore.add_embeddings(
+        [("", vector) for vector in embeddings.embed_documents(texts)],
+        metadatas=[vector_metadata(metadata) for metadata in metadatas], ids=ids,
+    )
+    for id_, text, metadata in zip(ids, texts, metadatas):
+        lexical.add(id_, text, vector_metadata(metadata))
+    lexical.save()
+    ChunkStore().put_many(zip(ids, texts, metadatas))
+
+    api.build_embeddings = lambda **kwargs: embeddings
+    api.build_vectorstore = lambda *a, **kwargs: vectorstore
+    api.build_llm = lambda *a: FakeChatModel(latency=args.llm_latency)
+    return api.app
+
+
+async def run(args):
+    weights = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    plan = list(enumerate(rng.choices(list(weights), weights=list(weights.values()), k=args.requests)))
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            return await run_load(client, plan, args.concurrency)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = local_app(args, workdir)
+        async with app.router.lifespan_context(app):
+            await app.state.warm_up
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+                return await run_load(client, plan, args.concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a live deployment instead of a local app with fake backends")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"request kinds and weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--chunks", type=int, default=2000, help="fake corpus size (local mode)")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="simulated seconds per embedding call")
+    parser.add_argument("--search-latency", type=float, default=0.03, help="simulated seconds per vector search")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="simulated seconds per LLM call")
+    parser.add_argument("--output", help=f"result file (default {RESULTS_DIR}/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    args = parser.parse_args()
+
+    print(f"🚀 Benchmarking {args.url or 'local app with fake backends'}: "
+          f"{args.requests} requests, concurrency {args.concurrency}, mix {args.mix}")
+    results, seconds = asyncio.run(run(args))
+    result = report(results, seconds, args)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(result, previous)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Chat model wrapper that routes every Gemini call through the LLM limiter."""
+import os
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from embed_engine import is_rate_limit_error
+from ratelimit import estimate_tokens
+
+# Completion tokens charged up front, before the real count is known
+LLM_OUTPUT_TOKENS = int(os.getenv("LLM_OUTPUT_TOKENS", "500"))
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """Waits on an RPM/TPM limiter (clients.LLM_LIMITER) before each call to `model`.
+
+    Provider 429s shrink the limiter's rate (and are re-raised); successful
+    calls slowly grow it back. Callbacks attached to this wrapper see the
+    wrapped model's results, usage metadata included.
+    """
+
+    model: BaseChatModel
+    limiter: Any
+    output_tokens: int = LLM_OUTPUT_TOKENS
+
+    @property
+    def _llm_type(self):
+        return f"rate-limited-{self.model._llm_type}"
+
+    def _cost(self, messages):
+        return estimate_tokens([str(message.content) for message in messages]) + self.output_tokens
+
+    def _report(self, error):
+        if is_rate_limit_error(error):
+            self.limiter.on_rate_limited()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.limiter.acquire(self._cost(messages))
+        try:
+            result = self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except Exception as e:
+            self._report(e)
+            raise
+        self.limiter.on_success()
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await self.limiter.aacquire(self._cost(messages))
+        try:
+            result = await self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except Exception as e:
+            self._report(e)
+            raise
+        self.limiter.on_success()
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.limiter.acquire(self._cost(messages))
+        try:
+            yield from self.model._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except Exception as e:
+            self._report(e)
+            raise
+        self.limiter.on_success()
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await self.limiter.aacquire(self._cost(messages))
+        try:
+            async for chunk in self.model._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+        except Exception as e:
+            self._report(e)
+            raise
+        self.limiter.on_success()
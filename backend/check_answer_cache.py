@@ -0,0 +1,55 @@
+"""Check that a near-duplicate answer cache hit never crosses identifiers.
+
+Questions that differ only in a door mark or a section number embed
+above the similarity threshold; the cache must still keep them apart.
+The vectors are made up to sit above the threshold, so the check does
+not depend on any embedding model. Checks that:
+  - "fire rating for door D-101" does not answer "... door D-102";
+  - "section 08 71 00" does not answer "section 08 71 10";
+  - a rephrasing that names the same door still hits.
+
+    python check_answer_cache.py
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+SIZE = 64
+
+
+def near(vector, rng, noise=0.01):
+    """A vector with cosine similarity ~0.99 to `vector`."""
+    return vector + rng.normal(0, noise, vector.shape)
+
+
+def main():
+    from answer_cache import ANSWER_CACHE_THRESHOLD, AnswerCache
+    from check_tables import report
+
+    results = []
+    rng = np.random.default_rng(7)
+    with tempfile.TemporaryDirectory() as workdir:
+        cache = AnswerCache(version_path=os.path.join(workdir, ".index_version"))
+        cases = [
+            ("What is the fire rating for door D-101?", "fire rating for door D-102", False),
+            ("Hardware for section 08 71 00", "hardware for section 08 71 10", False),
+            ("What is the fire rating for door D-101?", "fire rating of door d101", True),
+        ]
+        for stored, asked, should_hit in cases:
+            vector = rng.normal(0, 1, SIZE)
+            cache.put(stored, vector, {"answer": stored, "sources": []})
+            similar = near(vector, rng)
+            cosine = similar @ vector / np.linalg.norm(similar) / np.linalg.norm(vector)
+            hit = cache.get_similar(asked, similar)
+            results.append(report(
+                cosine >= ANSWER_CACHE_THRESHOLD and (hit is not None) == should_hit
+                and (hit is None or hit["answer"] == stored),
+                f"{asked!r} after {stored!r} (cosine {cosine:.3f}): {'hit' if hit else 'miss'}",
+            ))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
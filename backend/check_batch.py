@@ -0,0 +1,36 @@
+"""Check that a grouped generation's reply is parsed into its answers.
+
+The model is asked for {"answers": [...]} but may wrap it in a code fence
+or add prose around it, and that prose may hold braces of its own.
+Checks that:
+  - a bare, fenced or commented reply gives its answers;
+  - braces before or after the object do not break it;
+  - a reply with the wrong number of answers, or none, gives None.
+
+    python check_batch.py
+"""
+import sys
+
+
+def main():
+    from batch import parse_answers
+    from check_tables import report
+
+    answers = ["1 HR", "Set 12"]
+    cases = [
+        ('{"answers": ["1 HR", "Set 12"]}', 2, answers),
+        ('```json\n{"answers": ["1 HR", "Set 12"]}\n```', 2, answers),
+        ('{"answers": ["1 HR", "Set 12"]}\nNote: see {hardware} on sheet A-602.', 2, answers),
+        ('Answers for {D-101} and {D-102}:\n{"answers": ["1 HR", "Set 12"]} (from {A-602})', 2, answers),
+        ('{"answers": ["1 HR"]}', 2, None),
+        ("The documents do not say.", 2, None),
+    ]
+    results = []
+    for content, count, expected in cases:
+        parsed = parse_answers(content, count)
+        results.append(report(parsed == expected, f"{content!r}: {parsed}"))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
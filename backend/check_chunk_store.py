@@ -0,0 +1,151 @@
+"""Check the compact vector payload and the chunk store end to end.
+
+Ingests a generated door schedule and spec book (see check_tables.py)
+with fake embeddings and vector store. Checks that:
+  - vectors carry only their ID, page and filter fields; text and full
+    metadata are in the chunk store, and the BM25 index keeps no text;
+  - retrieval returns the same chunks, with the same text and metadata,
+    as the old layout with the text on every vector;
+  - a search moves far fewer bytes: candidate IDs, then the text of the
+    k chunks left after fusion, instead of every candidate's text;
+  - an index written by the old layout is rewritten once on the next ingest.
+
+    python check_chunk_store.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+QUERIES = ["door hardware requirements", "fire rating of door D-105", "hollow metal door frames", "D-131 hardware set"]
+LINES_PER_PAGE = 20
+
+
+def spec_book(sections, pages_per_section=4):
+    """Spec pages with a page's worth of prose each, so chunks are full-size (~1000 characters)."""
+    pages = []
+    for number, title in sections:
+        for n in range(1, pages_per_section + 1):
+            runs = [(40, 1160, 12, f"SECTION {number} - {title}")]
+            runs += [
+                (40, 1140 - 14 * line, 9, f"{n}.{line} Provide {title.lower()} as scheduled; submit product data, "
+                                          f"shop drawings and samples for review before fabrication.")
+                for line in range(1, LINES_PER_PAGE + 1)
+            ]
+            runs.append((40, 40, 8, f"{number} - {n}"))
+            pages.append(runs)
+    return pages
+
+
+def payload_bytes(docs):
+    """What a search response carries per hit: ID, score and metadata (with the text, if stored)."""
+    total = 0
+    for doc in docs:
+        metadata = {**doc.metadata, "text": doc.page_content} if doc.page_content else doc.metadata
+        total += len(json.dumps({"id": doc.id, "score": 0.0, "metadata": metadata}))
+    return total
+
+
+async def main():
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        folder = os.path.join(workdir, "Documents")
+        os.environ.update({
+            "GOOGLE_API_KEY": "check-key",
+            "PINECONE_API_KEY": "check-key",
+            "PDF_FOLDER_PATH": folder,
+            "CHUNK_DB_PATH": os.path.join(workdir, "chunks.sqlite3"),
+            "PAGE_STORE_PATH": os.path.join(workdir, "page_store"),
+            "SCHEDULE_DB_PATH": os.path.join(workdir, "schedule.sqlite3"),
+            "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.json"),
+            "INDEX_VERSION_FILE": os.path.join(workdir, ".index_version"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "ingest_manifest.json"),
+            "INGEST_CHECKPOINT_PATH": os.path.join(workdir, "ingest_checkpoint.jsonl"),
+        })
+        # Imported after the environment is set: modules read their paths at import time
+        from check_tables import prose_page, report, schedule_page, write_pdf
+        import ingest
+        from chunk_store import ChunkStore
+        from embed_engine import RateLimitedEmbeddings
+        from embedding_cache import CachedEmbeddings, EmbeddingStore
+        from fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+        from ingest_pipeline import VECTOR_FIELDS
+        from lexical import LexicalIndex
+        from pipeline import HYBRID_CANDIDATES, HYBRID_K, aretrieve, asearch_by_vector
+
+        os.makedirs(folder)
+        write_pdf(os.path.join(folder, "A-601 Door Schedule.pdf"), [schedule_page(), prose_page()])
+        write_pdf(os.path.join(folder, "Specifications.pdf"), spec_book([
+            ("08 71 00", "DOOR HARDWARE"), ("08 11 13", "HOLLOW METAL DOORS"), ("09 91 23", "INTERIOR PAINTING"),
+        ]))
+
+        embeddings = CachedEmbeddings(
+            RateLimitedEmbeddings(FakeEmbeddings(size=64)), EmbeddingStore(os.path.join(workdir, "embeddings.sqlite3"))
+        )
+        store = FakeVectorStore(embeddings)
+        ingest.build_embeddings = lambda **kwargs: embeddings
+        ingest.build_vectorstore = lambda *a, **kwargs: store
+        ingest.build_llm = lambda *a: FakeChatModel(response='{"doors": []}')
+        ingest.ingest_docs()
+
+        chunks = ChunkStore()
+        lexical = LexicalIndex()
+        vectors = [doc for doc, _ in store._entries.values()]
+        stored = chunks.get_many([doc.id for doc in vectors])
+        with open(os.environ["LEXICAL_INDEX_PATH"]) as f:
+            postings = json.load(f)["chunks"]
+        results.append(report(
+            vectors and all(not doc.page_content and set(doc.metadata) <= set(VECTOR_FIELDS) for doc in vectors)
+            and len(stored) == len(vectors) and all("source" in metadata for _, metadata in stored.values())
+            and not any("text" in chunk for chunk in postings.values()),
+            f"{len(vectors)} vectors carry only {sorted(VECTOR_FIELDS)}; {len(stored)} chunk texts in the chunk store, "
+            f"none in the BM25 index",
+        ))
+
+        # The old layout: every vector holds its chunk's text and full metadata
+        legacy = FakeVectorStore(embeddings)
+        ids = list(stored)
+        texts = [stored[id_][0] for id_ in ids]
+        legacy.add_embeddings(
+            zip(texts, embeddings.embed_documents(texts)), metadatas=[stored[id_][1] for id_ in ids], ids=ids,
+        )
+        same, compact_bytes, legacy_bytes = 0, 0, 0
+        for query in QUERIES:
+            new = await aretrieve(query, embeddings, store, HYBRID_K, {}, lexical=lexical, chunks=chunks)
+            old = await aretrieve(query, embeddings, legacy, HYBRID_K, {}, lexical=lexical)
+            same += [(d.id, d.page_content, d.metadata) for d in new] == [(d.id, d.page_content, d.metadata) for d in old]
+            vector = await embeddings.aembed_query(query)
+            compact_hits = [doc for doc, _ in await asearch_by_vector(store, vector, HYBRID_CANDIDATES, ids_only=True)]
+            legacy_hits = [doc for doc, _ in await asearch_by_vector(legacy, vector, HYBRID_CANDIDATES)]
+            # Pinecone's ids_only query returns no metadata at all; the fake still returns the filter fields
+            compact_bytes += payload_bytes(compact_hits) + sum(len(doc.page_content.encode()) for doc in new)
+            legacy_bytes += payload_bytes(legacy_hits)
+        results.append(report(
+            same == len(QUERIES),
+            f"{same}/{len(QUERIES)} queries retrieve the same chunks, text and metadata as the old layout",
+        ))
+        results.append(report(
+            compact_bytes < legacy_bytes / 2,
+            f"bytes per query: {compact_bytes // len(QUERIES)} ({HYBRID_CANDIDATES} candidates' fields + {HYBRID_K} "
+            f"hydrated texts), old layout {legacy_bytes // len(QUERIES)} ({HYBRID_CANDIDATES} candidates with text)",
+        ))
+
+        # An index from before the chunk store: the next ingest rewrites every vector without its text
+        store._entries = dict(legacy._entries)
+        with open(os.environ["INGEST_MANIFEST_PATH"]) as f:
+            manifest = json.load(f)
+        manifest["schema"] = 1
+        with open(os.environ["INGEST_MANIFEST_PATH"], "w") as f:
+            json.dump(manifest, f)
+        ingest.ingest_docs()
+        rewritten = [doc for doc, _ in store._entries.values()]
+        results.append(report(
+            len(rewritten) == len(vectors) and not any(doc.page_content for doc in rewritten),
+            f"old-layout index: {len(rewritten)} vectors rewritten without text by the next ingest",
+        ))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
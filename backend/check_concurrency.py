@@ -0,0 +1,61 @@
+import asyncio
+import sys
+import time
+
+from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.prompts import ChatPromptTemplate
+
+from fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore, SyncOnlyFakeEmbeddings
+from pipeline import aanswer_question
+
+# Simulated round trips (seconds) - roughly the shape of embed / Pinecone / Gemini
+EMBED_LATENCY = 0.05
+SEARCH_LATENCY = 0.05
+LLM_LATENCY = 0.5
+CONCURRENT_REQUESTS = 8
+
+SAMPLE_CHUNKS = [
+    "DOOR SCHEDULE D-101 Lobby 900 x 2100 HM 1 HR",
+    "D-105 Corridor 1000 x 2400 Wood 45 min",
+    "Section 08 71 00 Door Hardware: lever sets by Allegion",
+]
+
+
+def build_backends(embeddings_cls):
+    embeddings = embeddings_cls(size=64, latency=EMBED_LATENCY)
+    vectorstore = FakeVectorStore(embeddings, latency=SEARCH_LATENCY)
+    vectorstore.add_texts(SAMPLE_CHUNKS, metadatas=[{"source": "specs.pdf", "page": i} for i in range(len(SAMPLE_CHUNKS))])
+    prompt = ChatPromptTemplate.from_messages([("system", "Context: {context}"), ("human", "{input}")])
+    qa_chain = create_stuff_documents_chain(FakeChatModel(latency=LLM_LATENCY), prompt)
+    return embeddings, vectorstore, qa_chain
+
+
+async def timed_batch(n, embeddings, vectorstore, qa_chain):
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        aanswer_question(f"What is the fire rating for door D-{100 + i}?", embeddings, vectorstore, qa_chain, k=2)
+        for i in range(n)
+    ])
+    return time.perf_counter() - start
+
+
+async def check(label, embeddings_cls):
+    backends = build_backends(embeddings_cls)
+    single = await timed_batch(1, *backends)
+    many = await timed_batch(CONCURRENT_REQUESTS, *backends)
+    ok = many < single * 2
+    print(f"{'✅' if ok else '❌'} {label}: 1 request {single:.2f}s | {CONCURRENT_REQUESTS} concurrent {many:.2f}s")
+    return ok
+
+
+async def main():
+    print(f"🚀 Checking that {CONCURRENT_REQUESTS} concurrent /chat requests overlap...\n")
+    results = [
+        await check("native async backends", FakeEmbeddings),
+        await check("sync-only embeddings (thread-pool fallback)", SyncOnlyFakeEmbeddings),
+    ]
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
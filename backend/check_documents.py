@@ -0,0 +1,262 @@
+"""Check PUT /documents and the background ingest jobs end to end.
+
+Runs the API in-process with fake embeddings (slowed down, so a job takes
+a few seconds) and fake vector store, and uploads generated spec books
+(see check_chunk_store.py). Checks that:
+  - an upload answers right away, with the body's sha256, and its job
+    streams progress up to done;
+  - a new project's pages are found by /chat while its job is still running;
+  - /chat latency while a job runs stays close to the idle latency;
+  - jobs run by priority, and uploads to a queued project join its job;
+  - a cancelled job stops early, and the next job resumes from its checkpoint;
+  - chunks a cancelled job already stored are deleted with its file, leaving
+    nothing in the vector store, chunk store or keyword index that the
+    manifest does not know of;
+  - bad uploads and unknown jobs are refused.
+
+    python check_documents.py
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+TENANT = "acme"
+# Per embedding request of the ingest side: what makes a job slow enough to watch
+INGEST_EMBED_LATENCY = 0.15
+CHAT_REQUESTS = 20
+
+
+def spec_pdf(title, sections=3):
+    from check_chunk_store import spec_book
+    from check_tables import write_pdf
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload.pdf")
+        write_pdf(path, spec_book([(f"08 {n:02d} 00", f"{title} PART {n}") for n in range(1, sections + 1)]))
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def wait_for(client, job_id, statuses=("done", "failed", "cancelled"), timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = (await client.get(f"/documents/jobs/{job_id}")).json()
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"job {job_id} still not {statuses}")
+
+
+async def chat_ms(client, project, file, query):
+    # A filter skips the answer cache, so every request really searches
+    body = {"query": query, "project": project, "tenant": TENANT if project else None, "filters": {"files": [file]}}
+    start = time.perf_counter()
+    response = (await client.post("/chat", json=body)).json()
+    return (time.perf_counter() - start) * 1000, response["sources"]
+
+
+async def main():
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        folder = os.path.join(workdir, "Documents")
+        os.makedirs(folder)
+        os.environ.update({
+            "GOOGLE_API_KEY": "check-key",
+            "PINECONE_API_KEY": "check-key",
+            "PDF_FOLDER_PATH": folder,
+            "INGEST_EMBED_BATCH": "8",
+            "CHUNK_DB_PATH": os.path.join(workdir, "chunks.sqlite3"),
+            "PAGE_STORE_PATH": os.path.join(workdir, "page_store"),
+            "SCHEDULE_DB_PATH": os.path.join(workdir, "schedule.sqlite3"),
+            "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.json"),
+            "INDEX_VERSION_FILE": os.path.join(workdir, ".index_version"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "ingest_manifest.json"),
+            "INGEST_CHECKPOINT_PATH": os.path.join(workdir, "ingest_checkpoint.jsonl"),
+        })
+        # Imported after the environment is set: modules read their paths at import time
+        from check_tables import report
+        import ingest
+        import main as api
+        from embed_engine import RateLimitedEmbeddings
+        from embedding_cache import CachedEmbeddings, EmbeddingStore
+        from fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+        from projects import Scope
+
+        def embeddings(latency):
+            return CachedEmbeddings(
+                RateLimitedEmbeddings(FakeEmbeddings(size=64, latency=latency)),
+                EmbeddingStore(os.path.join(workdir, f"embeddings.{latency}.sqlite3")),
+            )
+
+        store = FakeVectorStore(embeddings(0.0))
+        llm = FakeChatModel(response='{"doors": []}')
+        # Same vectors on both sides; only the ingest side is slow
+        ingest.build_embeddings = lambda **kwargs: embeddings(INGEST_EMBED_LATENCY)
+        api.build_embeddings = lambda **kwargs: embeddings(0.0)
+        for module in (ingest, api):
+            module.build_vectorstore = lambda *a, **kwargs: store
+            module.build_llm = lambda *a: llm
+        tower = spec_pdf("DOOR HARDWARE")
+
+        async with api.app.router.lifespan_context(api.app):
+            await api.app.state.warm_up
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+                # A file in the default project, so /chat has something to search before any upload
+                base = (await client.put("/documents/Base Specs.pdf", content=spec_pdf("PAINTING"))).json()["job"]
+                await wait_for(client, base["id"])
+                idle = []
+                for n in range(CHAT_REQUESTS):
+                    idle.append((await chat_ms(client, None, "Base Specs.pdf", f"painting part {n}"))[0])
+
+                start = time.perf_counter()
+                upload = await client.put(
+                    "/documents/Tower Specs.pdf", content=tower, params={"project": "tower", "tenant": TENANT},
+                )
+                upload_ms = (time.perf_counter() - start) * 1000
+                job_id = upload.json()["job"]["id"]
+
+                # Search the new project while its job runs; meanwhile time /chat on the default project
+                found_while_running = None
+                busy = []
+                while True:
+                    job = (await client.get(f"/documents/jobs/{job_id}")).json()
+                    if job["status"] != "running":
+                        if job["status"] in ("done", "failed", "cancelled"):
+                            break
+                        await asyncio.sleep(0.02)
+                        continue
+                    _, sources = await chat_ms(client, "tower", "Tower Specs.pdf", "door hardware part 1 submittals")
+                    busy.append((await chat_ms(client, None, "Base Specs.pdf", f"painting part {len(busy)}"))[0])
+                    if sources and found_while_running is None:
+                        found_while_running = job["progress"]
+                events = sse_events((await client.get(f"/documents/jobs/{job_id}/events")).text)
+                final = events[-1][1]
+                progress = final["progress"]
+                results.append(report(
+                    upload.status_code == 202 and upload.json()["sha256"] == hashlib.sha256(tower).hexdigest()
+                    and final["status"] == "done" and events[-1][0] == "done"
+                    and progress["pages_parsed"] == progress["pages_total"] == 12
+                    and progress["chunks_embedded"] == progress["vectors_upserted"] == progress["chunks"] > 0,
+                    f"upload answered in {upload_ms:.0f} ms; job done: {progress}",
+                ))
+                results.append(report(
+                    found_while_running is not None
+                    and found_while_running["vectors_upserted"] < progress["vectors_upserted"],
+                    f"new project found by /chat mid-job, at "
+                    f"{found_while_running and found_while_running['vectors_upserted']}/{progress['vectors_upserted']} "
+                    f"vectors upserted",
+                ))
+                idle_ms, busy_ms = statistics.median(idle), statistics.median(busy) if busy else float("inf")
+                results.append(report(
+                    busy and busy_ms < max(3 * idle_ms, idle_ms + 20),
+                    f"/chat median {idle_ms:.1f} ms idle, {busy_ms:.1f} ms while the job runs ({len(busy)} requests)",
+                ))
+
+                # One worker: a running job, then a low and a high priority project queued behind it
+                running = (await client.put("/documents/Big.pdf", content=spec_pdf("PARTITIONS", 4), params={
+                    "project": "hotel", "tenant": TENANT,
+                })).json()["job"]
+                await wait_for(client, running["id"], ("running",))
+                low = (await client.put("/documents/Low.pdf", content=spec_pdf("SIGNAGE", 1), params={
+                    "project": "school", "tenant": TENANT, "priority": "low",
+                })).json()["job"]
+                joined = (await client.put("/documents/Low 2.pdf", content=spec_pdf("LOCKERS", 1), params={
+                    "project": "school", "tenant": TENANT,
+                })).json()["job"]
+                high = (await client.put("/documents/High.pdf", content=spec_pdf("GLAZING", 1), params={
+                    "project": "clinic", "tenant": TENANT, "priority": "high",
+                })).json()["job"]
+                low, high = await wait_for(client, low["id"]), await wait_for(client, high["id"])
+                results.append(report(
+                    high["started_at"] < low["started_at"] and joined["id"] == low["id"]
+                    and low["files"] == ["Low.pdf", "Low 2.pdf"] and low["progress"]["files_done"] == 2,
+                    f"high priority job started {low['started_at'] - high['started_at']:.2f}s before the low one; "
+                    f"2nd upload to the queued project joined its job: {low['files']}",
+                ))
+
+                # Cancel mid-run, then resume
+                revised = spec_pdf("PARTITIONS REV 1", 6)
+                hotel = (await client.put("/documents/Big.pdf", content=revised, params={
+                    "project": "hotel", "tenant": TENANT,
+                })).json()["job"]
+                await wait_for(client, hotel["id"], ("running",))
+                while (await client.get(f"/documents/jobs/{hotel['id']}")).json()["progress"]["vectors_upserted"] == 0:
+                    await asyncio.sleep(0.02)
+                await client.delete(f"/documents/jobs/{hotel['id']}")
+                cancelled = await wait_for(client, hotel["id"])
+                resumed = (await client.put("/documents/Big.pdf", content=revised, params={
+                    "project": "hotel", "tenant": TENANT,
+                })).json()["job"]
+                resumed = await wait_for(client, resumed["id"])
+                results.append(report(
+                    cancelled["status"] == "cancelled" and cancelled["progress"]["files_done"] == 0
+                    and resumed["status"] == "done"
+                    and 0 < resumed["progress"]["chunks_embedded"] < resumed["progress"]["chunks"],
+                    f"cancelled at {cancelled['progress']['vectors_upserted']}/{resumed['progress']['chunks']} "
+                    f"vectors; next job embedded only the other {resumed['progress']['chunks_embedded']}",
+                ))
+
+                # Cancel a new file mid-run, then remove it: none of its chunks may stay behind
+                addendum = (await client.put("/documents/Addendum.pdf", content=spec_pdf("ADDENDUM", 6), params={
+                    "project": "hotel", "tenant": TENANT,
+                })).json()["job"]
+                await wait_for(client, addendum["id"], ("running",))
+                while (await client.get(f"/documents/jobs/{addendum['id']}")).json()["progress"]["vectors_upserted"] == 0:
+                    await asyncio.sleep(0.02)
+                await client.delete(f"/documents/jobs/{addendum['id']}")
+                addendum = await wait_for(client, addendum["id"])
+                hotel_scope = Scope("hotel", TENANT)
+                os.remove(os.path.join(hotel_scope.pdf_folder, "Addendum.pdf"))
+                # Any job of the project notices the file is gone
+                cleanup = (await client.put("/documents/Big.pdf", content=revised, params={
+                    "project": "hotel", "tenant": TENANT,
+                })).json()["job"]
+                await wait_for(client, cleanup["id"])
+                with open(hotel_scope.path(os.environ["INGEST_MANIFEST_PATH"])) as f:
+                    recorded = {cid for entry in json.load(f)["files"].values() for cid in entry["chunks"]}
+                with sqlite3.connect(hotel_scope.path(os.environ["CHUNK_DB_PATH"])) as conn:
+                    stored = {row[0] for row in conn.execute("SELECT id FROM chunks")}
+                vectors = set(store._namespace(hotel_scope.namespace)._entries)
+                keywords = set(api.app.state.projects[hotel_scope.namespace].lexical._chunks)
+                orphans = (stored | vectors | keywords) - recorded
+                results.append(report(
+                    addendum["status"] == "cancelled" and addendum["progress"]["vectors_upserted"] > 0
+                    and recorded and not orphans,
+                    f"cancelled at {addendum['progress']['vectors_upserted']} vectors, then removed: "
+                    f"{len(orphans)} orphaned chunks in {len(vectors)} vectors, {len(stored)} stored, "
+                    f"{len(keywords)} keyword-indexed",
+                ))
+
+                not_pdf = await client.put("/documents/notes.pdf", content=b"just some notes")
+                bad_name = await client.put("/documents/notes.txt", content=tower)
+                bad_priority = await client.put("/documents/a.pdf", content=tower, params={"priority": "urgent"})
+                unknown = await client.get("/documents/jobs/nope")
+                leftovers = [name for name in os.listdir(folder) if name.endswith(".upload") or name == "notes.pdf"]
+                results.append(report(
+                    (not_pdf.status_code, bad_name.status_code, bad_priority.status_code, unknown.status_code)
+                    == (415, 400, 400, 404) and not leftovers,
+                    f"not a PDF -> {not_pdf.status_code}, bad name -> {bad_name.status_code}, bad priority -> "
+                    f"{bad_priority.status_code}, unknown job -> {unknown.status_code}; no partial files left",
+                ))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
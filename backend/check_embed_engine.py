@@ -0,0 +1,147 @@
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Short backoff so the check finishes in seconds (read at import time)
+os.environ.setdefault("EMBED_BACKOFF_BASE", "0.05")
+os.environ.setdefault("EMBED_BACKOFF_MAX", "0.5")
+
+from langchain_core.embeddings import Embeddings
+
+import ingest
+import ingest_pipeline
+from embed_engine import RateLimitedEmbeddings
+from embedding_cache import CachedEmbeddings, EmbeddingStore
+from fakes import FakeChatModel, FakeVectorStore, _fake_vector
+from ratelimit import RateLimiter
+
+SAMPLE_PDF_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "documents")
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    """Local stand-in for the embedding API: randomly answers 429, and can
+    be told to start failing hard to simulate an interrupted run."""
+
+    def __init__(self, reject_rate=0.3, fail_after=None):
+        super().__init__(("127.0.0.1", 0), FakeEmbeddingHandler)
+        self.reject_rate = reject_rate
+        self.fail_after = fail_after
+        self.served = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/embed"
+
+
+class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            if server.fail_after is not None and server.served >= server.fail_after:
+                status = 503
+            elif random.random() < server.reject_rate:
+                status = 429
+                server.rejected += 1
+            else:
+                status = 200
+                server.served += 1
+        if status != 200:
+            self.send_response(status)
+            self.end_headers()
+            return
+        payload = json.dumps({"vectors": [_fake_vector(t, 16) for t in body["texts"]]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpEmbeddings(Embeddings):
+    def __init__(self, url):
+        self.url = url
+        self.model = "fake-http-embedding"
+
+    def embed_documents(self, texts):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"texts": list(texts)}).encode(), headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())["vectors"]
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"{e.code} {e.reason}") from None
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_retries():
+    server = start(FakeEmbeddingServer(reject_rate=0.3))
+    client = RateLimitedEmbeddings(HttpEmbeddings(server.url), limiter=RateLimiter(rpm=6000, tpm=10_000_000))
+    batches = [[f"chunk {b}-{i}" for i in range(16)] for b in range(40)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(client.embed_documents, batches))
+    server.shutdown()
+
+    ok = all(len(r) == 16 for r in results)
+    print(f"{'✅' if ok else '❌'} 40 batches through a server rejecting 30%: "
+          f"{server.rejected} x 429 absorbed, {client.stats['rate_limited']} retries, 0 failures")
+    return ok
+
+
+def check_resume():
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    shutil.copytree(SAMPLE_PDF_DIR, os.path.join(workdir, "Documents"))
+    os.chdir(workdir)
+    ingest_pipeline.EMBED_BATCH_SIZE = 4
+    store = FakeVectorStore(None)
+    try:
+        counts = []
+        for fail_after in (2, None):  # first run dies after 2 batches, second resumes
+            server = start(FakeEmbeddingServer(reject_rate=0.2, fail_after=fail_after))
+            embeddings = CachedEmbeddings(
+                RateLimitedEmbeddings(HttpEmbeddings(server.url), max_retries=3), EmbeddingStore(f"emb-{len(counts)}.sqlite3")
+            )
+            ingest.build_embeddings = lambda: embeddings
+            ingest.build_vectorstore = lambda emb: store
+            ingest.build_llm = lambda: FakeChatModel(response='{"doors": []}')
+            ingest.ingest_docs()
+            server.shutdown()
+            counts.append(embeddings.misses)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    total = len(store._entries)
+    # The resumed run must only embed what the interrupted one did not upsert
+    ok = 0 < counts[1] < total
+    print(f"{'✅' if ok else '❌'} Interrupted run embedded {counts[0]} chunks, resumed run {counts[1]}, "
+          f"{total} vectors in the index")
+    return ok
+
+
+if __name__ == "__main__":
+    print("🚀 Checking the embedding engine against a local fake embedding server...\n")
+    results = [check_retries(), check_resume()]
+    sys.exit(0 if all(results) else 1)
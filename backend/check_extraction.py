@@ -0,0 +1,195 @@
+"""Check the map-reduce door schedule extraction and POST /extract/stream.
+
+Writes a PDF of schedule pages with no table to read (so every page goes
+to the LLM) and extracts it with a fake model that streams its reply word
+by word. Checks that:
+  - shards run side by side: wall-clock time is about one shard's, not
+    the sum, and the first rows arrive long before the last shard ends;
+  - a malformed row is skipped, and a failed shard loses only its own
+    pages, which the next refresh retries alone;
+  - a refresh of several files runs all their shards side by side, not
+    one file after another;
+  - /extract/stream sends rows then `done`, and ends in the same table as
+    /extract: a door listed on two pages is one row whose later page wins,
+    and the same mark in another drawing set stays a row of its own.
+
+    python check_extraction.py
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+import httpx
+
+PAGES = 8
+# About two pages per shard
+SHARD_CHARS = 300
+# Per LLM call, spread over the streamed words
+LLM_LATENCY = 0.4
+_ROW = re.compile(r"door (D-\d+) (?:at (Room \d+)|fire rating ([\w ]+))")
+
+
+def schedule_pages():
+    pages = []
+    for n in range(1, PAGES + 1):
+        doors = ", ".join(f"door D-{n}{i:02d} at Room {n}{i:02d}" for i in range(1, 4))
+        notes = "door D-2?? illegible" if n == 2 else "fire rating per plan"
+        if n == PAGES:
+            # An addendum: adds D-101's rating and moves D-102
+            notes = "door D-101 fire rating 1 HR, door D-102 at Room 112"
+        pages.append([(40, 1160, 12, f"DOOR SCHEDULE ADDENDUM {n}"), (40, 1140, 9, f"Schedule: {doors}; {notes}.")])
+    return pages
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def main():
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        folder = os.path.join(workdir, "Documents")
+        os.makedirs(folder)
+        os.environ.update({
+            "GOOGLE_API_KEY": "check-key",
+            "PINECONE_API_KEY": "check-key",
+            "PDF_FOLDER_PATH": folder,
+            "SCHEDULE_SHARD_CHARS": str(SHARD_CHARS),
+            "CHUNK_DB_PATH": os.path.join(workdir, "chunks.sqlite3"),
+            "PAGE_STORE_PATH": os.path.join(workdir, "page_store"),
+            "SCHEDULE_DB_PATH": os.path.join(workdir, "schedule.sqlite3"),
+            "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.json"),
+            "INDEX_VERSION_FILE": os.path.join(workdir, ".index_version"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "ingest_manifest.json"),
+            "INGEST_CHECKPOINT_PATH": os.path.join(workdir, "ingest_checkpoint.jsonl"),
+        })
+        # Imported after the environment is set: modules read their settings at import time
+        from check_tables import report, write_pdf
+        import door_schedule
+        import main as api
+        from fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+        from schedule_store import ScheduleStore
+
+        class ScheduleModel(FakeChatModel):
+            """Replies with the doors named on each page of the prompt; fails on `fail_page`'s shard."""
+
+            fail_page: int = 0
+
+            def _reply(self, messages):
+                prompt = str(messages[-1].content)
+                if self.fail_page and f"=== PAGE {self.fail_page} ===" in prompt:
+                    raise RuntimeError("model unavailable")
+                rows = []
+                for page, text in re.findall(r"=== PAGE (\d+) ===\n(.*?)(?=\n\n===|\s*$)", prompt, re.DOTALL):
+                    for mark, location, rating in _ROW.findall(text):
+                        rows.append(json.dumps({"mark": mark, "location": location, "fire_rating": rating, "page": page}))
+                    if "illegible" in text:
+                        rows.append('{"mark": "D-2??", "location": smudged, "page": "' + page + '"}')
+                return '```json\n{"doors": [' + ", ".join(rows) + "]}\n```"
+
+        path = os.path.join(folder, "A-602 Door Schedule Addenda.pdf")
+        write_pdf(path, schedule_pages())
+        expected = 3 * PAGES + 2
+
+        llm = ScheduleModel(latency=LLM_LATENCY)
+        timings = {}
+        for concurrency in (1, door_schedule.EXTRACT_CONCURRENCY):
+            door_schedule.EXTRACT_CONCURRENCY = concurrency
+            store = ScheduleStore(os.path.join(workdir, f"schedule.{concurrency}.sqlite3"))
+            arrivals = []
+            llm.calls = 0
+            start = time.perf_counter()
+            door_schedule.refresh_file(
+                llm, store, path, on_rows=lambda file_name, doors: arrivals.append((time.perf_counter(), len(doors))),
+            )
+            timings[concurrency] = (time.perf_counter() - start, arrivals[0][0] - start, sum(n for _, n in arrivals))
+        (sequential, _, _), (parallel, first, streamed) = timings[1], timings[door_schedule.EXTRACT_CONCURRENCY]
+        results.append(report(
+            llm.calls > 1 and parallel < sequential / 2 and first < parallel / 2 and streamed == len(store.doors())
+            == expected,
+            f"{llm.calls} shards: {parallel:.2f}s side by side, {sequential:.2f}s one at a time; "
+            f"first rows after {first:.2f}s, {streamed} rows streamed",
+        ))
+
+        # Page 3's shard fails; the malformed row on page 2 is skipped either way
+        store = ScheduleStore(os.path.join(workdir, "schedule.retry.sqlite3"))
+        llm.fail_page = 3
+        door_schedule.refresh_file(llm, store, path)
+        kept = {door["page"] for door in store.doors()}
+        llm.fail_page, llm.calls = 0, 0
+        retried = door_schedule.refresh_file(llm, store, path)
+        results.append(report(
+            3 not in kept and 4 not in kept and len(kept) == PAGES - 2 and retried == 2 and llm.calls == 1
+            and len(store.doors()) == expected and not any("?" in door["mark"] for door in store.doors()),
+            f"failed shard: rows of pages {sorted(kept)} kept; the next refresh re-extracted its {retried} pages in "
+            f"{llm.calls} call; malformed row skipped",
+        ))
+
+        # Another drawing set with its own D-101
+        other = os.path.join(folder, "B-601 Door Schedule.pdf")
+        write_pdf(other, [[
+            (40, 1160, 12, "DOOR SCHEDULE"), (40, 1140, 9, "Schedule: door D-101 at Room 901; fire rating per plan."),
+        ]])
+        # Room for every shard of both files at once
+        door_schedule.EXTRACT_CONCURRENCY = PAGES + 1
+        start = time.perf_counter()
+        for pdf in (path, other):
+            door_schedule.refresh_file(llm, ScheduleStore(os.path.join(workdir, "schedule.files.sqlite3")), pdf)
+        one_by_one = time.perf_counter() - start
+        store = ScheduleStore(os.path.join(workdir, "schedule.shared.sqlite3"))
+        llm.calls = 0
+        start = time.perf_counter()
+        door_schedule.refresh_schedule(llm, store, folder)
+        shared = time.perf_counter() - start
+        results.append(report(
+            shared < one_by_one * 0.75 and llm.calls > 2
+            and {door["file"] for door in store.doors()} == {os.path.basename(path), os.path.basename(other)},
+            f"both files in one refresh: {llm.calls} shards in {shared:.2f}s, {one_by_one:.2f}s file by file",
+        ))
+
+        embeddings = FakeEmbeddings(size=64)
+        api.build_embeddings = lambda **kwargs: embeddings
+        api.build_vectorstore = lambda *a, **kwargs: FakeVectorStore(embeddings)
+        api.build_llm = lambda *a: llm
+
+        async def check_api():
+            async with api.app.router.lifespan_context(api.app):
+                await api.app.state.warm_up
+                transport = httpx.ASGITransport(app=api.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+                    events = sse_events((await client.post("/extract/stream", params={"refresh": True})).text)
+                    table = (await client.post("/extract")).json()["doors"]
+                    page_two = (await client.post("/extract/stream", params={"page_from": 2, "page_to": 2})).text
+            return events, table, sse_events(page_two)
+
+        events, table, page_two = asyncio.run(check_api())
+        streamed = {}
+        for name, data in events:
+            if name == "row":
+                streamed[data["file"], data["mark"]] = data
+        by_key = {(door["file"], door["mark"]): door for door in table}
+        file_name = os.path.basename(path)
+        merged, moved = by_key.get((file_name, "D-101"), {}), by_key.get((file_name, "D-102"), {})
+        results.append(report(
+            events[-1][0] == "done" and events[-1][1]["count"] == len(table) == len(by_key) == 3 * PAGES + 1
+            and streamed == by_key and events[-1][1]["doors"] == table and merged.get("pages") == [1, PAGES]
+            and merged.get("location") == "Room 101" and merged.get("fire_rating") == "1 HR"
+            and moved.get("location") == "Room 112" and by_key.get(("B-601 Door Schedule.pdf", "D-101"))
+            and [data["page"] for name, data in page_two if name == "row"] == [2, 2, 2],
+            f"/extract/stream: {len(events) - 1} row events, done with {events[-1][1].get('count')} doors, "
+            f"same as /extract; D-101 from pages 1 and {PAGES} merged: {merged}; D-102 moved to "
+            f"{moved.get('location')} by page {PAGES}; B-601's D-101 kept apart",
+        ))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,180 @@
+"""Check the page store and GET /source/{file}/{page} end to end.
+
+Ingests a generated door schedule and spec book (see check_tables.py)
+with fake embeddings and vector store, then runs the API in-process.
+Checks that:
+  - every indexed chunk, prose or table, is the exact span of the stored
+    page text that its start_index points at;
+  - /chat sources carry that span and /source returns it as the highlight;
+  - /source answers from the page store, without the PDF, far faster than
+    re-parsing the page does;
+  - replacing a file swaps its pages and the dead bytes are compacted away,
+    keeping only the previous data file for readers still on the old index;
+  - a reader whose data file was compacted away rereads the index instead
+    of failing;
+  - a page that does not exist is a 404 and an out-of-range span a 400.
+
+    python check_page_store.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from langchain_core.documents import Document
+
+REQUESTS = 200
+# Enough for two compactions, so the oldest data file is removed
+REVISIONS = 7
+
+
+def median_ms(seconds):
+    return statistics.median(seconds) * 1000
+
+
+async def main():
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        folder = os.path.join(workdir, "Documents")
+        os.environ.update({
+            "GOOGLE_API_KEY": "check-key",
+            "PINECONE_API_KEY": "check-key",
+            "PDF_FOLDER_PATH": folder,
+            "PAGE_STORE_PATH": os.path.join(workdir, "page_store"),
+            "SCHEDULE_DB_PATH": os.path.join(workdir, "schedule.sqlite3"),
+            "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.json"),
+            "CHUNK_DB_PATH": os.path.join(workdir, "chunks.sqlite3"),
+            "INDEX_VERSION_FILE": os.path.join(workdir, ".index_version"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "ingest_manifest.json"),
+            "INGEST_CHECKPOINT_PATH": os.path.join(workdir, "ingest_checkpoint.jsonl"),
+        })
+        # Imported after the environment is set: modules read their paths at import time
+        from check_projects import spec_pages
+        from check_tables import prose_page, report, schedule_page, write_pdf
+        import ingest
+        import main as api
+        from chunk_store import ChunkStore
+        from embed_engine import RateLimitedEmbeddings
+        from embedding_cache import CachedEmbeddings, EmbeddingStore
+        from fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+        from ingest_pipeline import is_table, parse_pages
+        from page_store import PageStore
+
+        os.makedirs(folder)
+        schedule = os.path.join(folder, "A-601 Door Schedule.pdf")
+        specs = os.path.join(folder, "Specifications.pdf")
+        write_pdf(schedule, [schedule_page(), prose_page()])
+        write_pdf(specs, spec_pages([("08 71 00", "DOOR HARDWARE"), ("08 11 13", "HOLLOW METAL DOORS")]))
+
+        embeddings = CachedEmbeddings(
+            RateLimitedEmbeddings(FakeEmbeddings(size=64)), EmbeddingStore(os.path.join(workdir, "embeddings.sqlite3"))
+        )
+        store = FakeVectorStore(embeddings)
+        llm = FakeChatModel(response='{"doors": []}')
+        for module in (ingest, api):
+            module.build_embeddings = lambda **kwargs: embeddings
+            module.build_vectorstore = lambda *a, **kwargs: store
+            module.build_llm = lambda *a: llm
+        ingest.ingest_docs()
+
+        pages = PageStore(os.environ["PAGE_STORE_PATH"])
+        docs = ChunkStore().hydrate([Document(id=id_, page_content="") for id_ in store._entries])
+        mismatched = [
+            doc for doc in docs
+            if (pages.text(doc.metadata["file"], doc.metadata["page"]) or "")[
+                doc.metadata["start_index"]:doc.metadata["start_index"] + len(doc.page_content)
+            ] != doc.page_content
+        ]
+        tables = sum(1 for doc in docs if is_table(doc))
+        results.append(report(
+            docs and tables and not mismatched,
+            f"{len(docs) - len(mismatched)}/{len(docs)} chunks ({tables} tables) match their span of the stored page",
+        ))
+
+        async with api.app.router.lifespan_context(api.app):
+            await api.app.state.warm_up
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+                sources = (await client.post("/chat", json={"query": "door schedule fire rating"})).json()["sources"]
+                previews = []
+                for source in sources:
+                    preview = (await client.get(f"/source/{source['file']}/{source['page']}", params={
+                        "start": source["start"], "end": source["end"], "context": 40,
+                    })).json()
+                    full = pages.text(source["file"], source["page"] - 1)
+                    highlight = preview["highlight"]
+                    previews.append(
+                        preview["text"][highlight["start"]:highlight["end"]] == full[source["start"]:source["end"]]
+                        and len(preview["text"]) <= source["end"] - source["start"] + 80
+                    )
+                results.append(report(
+                    sources and all(previews),
+                    f"/source highlights the cited passage of {sum(previews)}/{len(sources)} /chat sources (40 chars context)",
+                ))
+
+                # The API never needs the PDF again
+                os.rename(schedule, schedule + ".moved")
+                timings = []
+                for _ in range(REQUESTS):
+                    start = time.perf_counter()
+                    response = await client.get("/source/A-601 Door Schedule.pdf/1")
+                    timings.append(time.perf_counter() - start)
+                os.rename(schedule + ".moved", schedule)
+                parse = []
+                for _ in range(5):
+                    start = time.perf_counter()
+                    parse_pages(schedule, 0, 1)
+                    parse.append(time.perf_counter() - start)
+                body = response.json()
+                results.append(report(
+                    response.status_code == 200 and "D-140" in body["text"] and body["total_pages"] == 2
+                    and median_ms(timings) < median_ms(parse),
+                    f"/source without the PDF: {median_ms(timings):.2f} ms median over {REQUESTS} requests "
+                    f"(re-parsing the page: {median_ms(parse):.1f} ms)",
+                ))
+
+                # A reader that loaded the index but has not mapped its data file yet
+                reader = PageStore(pages.path)
+                reader.text("Specifications.pdf", 0)
+                # Re-issue the spec book: old pages are swapped out and compacted away
+                for revision in range(REVISIONS):
+                    write_pdf(specs, spec_pages([("08 71 00", f"DOOR HARDWARE REV {revision}")]))
+                    ingest.ingest_docs()
+                page = (await client.get("/source/Specifications.pdf/1")).json()
+                gone = await client.get("/source/Specifications.pdf/9")
+                data_files = sorted(name for name in os.listdir(pages.path) if name.startswith("data."))
+                current = PageStore(pages.path)
+                size = os.path.getsize(current._data_path)
+                live = current._live_bytes()
+                results.append(report(
+                    f"REV {REVISIONS - 1}" in page["text"] and page["total_pages"] == 8 and gone.status_code == 404
+                    and len(data_files) == 2 and current._index["data"] in data_files and size - live <= size / 2,
+                    f"after {REVISIONS} revisions: current text served, {current._index['data']} holds {size} bytes "
+                    f"({live} live), data files kept: {data_files}",
+                ))
+
+                # As if index.json's mtime had not moved and the old file was never mapped
+                was_on = reader._index["data"]
+                reader._index_mtime = os.stat(reader._index_path).st_mtime_ns
+                reader._map.close()
+                reader._map = None
+                text = reader.text("Specifications.pdf", 0)
+                results.append(report(
+                    was_on not in data_files and text and f"REV {REVISIONS - 1}" in text,
+                    f"reader on the removed {was_on} reread the index and got the current page",
+                ))
+
+                missing = await client.get("/source/Nope.pdf/1")
+                bad_span = await client.get("/source/Specifications.pdf/1", params={"start": 5, "end": 10**6})
+                results.append(report(
+                    missing.status_code == 404 and bad_span.status_code == 400,
+                    f"unknown file -> {missing.status_code}, span past the page -> {bad_span.status_code}",
+                ))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,163 @@
+"""Check project namespaces and metadata pre-filters end to end.
+
+Ingests two projects of one tenant from generated PDFs (see
+check_tables.py) with fake embeddings and vector store, then runs the API
+in-process. Checks that:
+  - each project's chunks land in its own namespace and state files;
+  - /chat for one project only cites that project's files;
+  - a section or page-range filter is applied inside the search: all k
+    results match it, where filtering a corpus-wide top k leaves a few;
+  - /extract serves each project's own door schedule, narrowed by file;
+  - unknown or malformed project names are refused.
+
+    python check_projects.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+import httpx
+
+TENANT = "acme"
+PAGES_PER_SECTION = 8
+K = 5
+
+
+def spec_pages(sections):
+    """PAGES_PER_SECTION pages per CSI section, each with the section's page footer."""
+    pages = []
+    for number, title in sections:
+        for n in range(1, PAGES_PER_SECTION + 1):
+            pages.append([
+                (40, 1160, 12, f"SECTION {number} - {title}"),
+                (40, 1140, 9, f"Part {n}: {title.lower()} requirements, submittals and installation for all doors."),
+                (40, 40, 8, f"{number} - {n}"),
+            ])
+    return pages
+
+
+def write_projects(root):
+    from check_tables import schedule_page, write_pdf
+
+    tower = os.path.join(root, TENANT, "tower")
+    school = os.path.join(root, TENANT, "school")
+    for folder in (tower, school):
+        os.makedirs(folder)
+    write_pdf(os.path.join(tower, "A-601 Door Schedule.pdf"), [schedule_page()])
+    write_pdf(os.path.join(tower, "Tower Specifications.pdf"), spec_pages([
+        ("08 71 00", "DOOR HARDWARE"), ("09 91 23", "INTERIOR PAINTING"), ("08 11 13", "HOLLOW METAL DOORS"),
+    ]))
+    write_pdf(os.path.join(school, "School Specifications.pdf"), spec_pages([
+        ("08 71 00", "DOOR HARDWARE"), ("08 14 16", "FLUSH WOOD DOORS"),
+    ]))
+
+
+async def main():
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update({
+            "GOOGLE_API_KEY": "check-key",
+            "PINECONE_API_KEY": "check-key",
+            "PDF_FOLDER_PATH": os.path.join(workdir, "Documents"),
+            "PAGE_STORE_PATH": os.path.join(workdir, "page_store"),
+            "SCHEDULE_DB_PATH": os.path.join(workdir, "schedule.sqlite3"),
+            "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.json"),
+            "CHUNK_DB_PATH": os.path.join(workdir, "chunks.sqlite3"),
+            "INDEX_VERSION_FILE": os.path.join(workdir, ".index_version"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "ingest_manifest.json"),
+            "INGEST_CHECKPOINT_PATH": os.path.join(workdir, "ingest_checkpoint.jsonl"),
+        })
+        # Imported after the environment is set: modules read their paths at import time
+        from check_tables import report
+        write_projects(os.path.join(workdir, "Documents"))
+        import ingest
+        import main as api
+        from embed_engine import RateLimitedEmbeddings
+        from embedding_cache import CachedEmbeddings, EmbeddingStore
+        from fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+        from pipeline import aretrieve
+        from projects import Scope, build_filter
+
+        embeddings = CachedEmbeddings(
+            RateLimitedEmbeddings(FakeEmbeddings(size=64)), EmbeddingStore(os.path.join(workdir, "embeddings.sqlite3"))
+        )
+        store = FakeVectorStore(embeddings)
+        llm = FakeChatModel(response='{"doors": []}')
+        for module in (ingest, api):
+            module.build_embeddings = lambda **kwargs: embeddings
+            module.build_vectorstore = lambda *a, **kwargs: store
+            module.build_llm = lambda *a: llm
+        ingest.ingest_docs(Scope("tower", TENANT))
+        ingest.ingest_docs(Scope("school", TENANT))
+
+        sizes = {ns: len(child._entries) for ns, child in store._namespaces.items()}
+        results.append(report(
+            set(sizes) == {"acme__tower", "acme__school"} and not store._entries
+            and os.path.exists(os.path.join(workdir, "lexical_index.acme__tower.json")),
+            f"namespaces: {sizes}, default namespace empty ({len(store._entries)} vectors)",
+        ))
+
+        async with api.app.router.lifespan_context(api.app):
+            await api.app.state.warm_up
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+                body = {"query": "door hardware requirements", "project": "school", "tenant": TENANT}
+                sources = (await client.post("/chat", json=body)).json()["sources"]
+                files = {source["file"] for source in sources}
+                results.append(report(
+                    files == {"School Specifications.pdf"},
+                    f"/chat for acme/school cites only {files}",
+                ))
+
+                tower = await api.open_project("tower", TENANT)
+                section = build_filter(sections=["08 71 00"])
+                unscoped = await aretrieve(
+                    "door hardware requirements", embeddings, store, K, {}, namespace="acme__tower",
+                )
+                post_filtered = [doc for doc in unscoped if doc.metadata.get("section") == "087100"]
+                scoped = await aretrieve(
+                    "door hardware requirements", embeddings, store, K, {}, lexical=tower.lexical,
+                    namespace="acme__tower", filter=section,
+                )
+                results.append(report(
+                    len(scoped) == K and all(doc.metadata["section"] == "087100" for doc in scoped),
+                    f"section 08 71 00 pre-filter: {len(scoped)}/{K} results in the section "
+                    f"(filtering the unfiltered top {K} afterwards keeps {len(post_filtered)})",
+                ))
+
+                pages = build_filter(files=["Tower Specifications.pdf"], page_from=9, page_to=12)
+                body = {"query": "painting", "project": "tower", "tenant": TENANT,
+                        "filters": {"files": ["Tower Specifications.pdf"], "page_from": 9, "page_to": 12}}
+                sources = (await client.post("/chat", json=body)).json()["sources"]
+                scoped = await aretrieve(
+                    "painting", embeddings, store, K, {}, lexical=tower.lexical, namespace="acme__tower", filter=pages,
+                )
+                results.append(report(
+                    sources and all(9 <= source["page"] <= 12 for source in sources)
+                    and all(doc.metadata["discipline"] == "specifications" for doc in scoped),
+                    f"page range 9-12 filter: cited pages {sorted({source['page'] for source in sources})}",
+                ))
+
+                doors = (await client.post("/extract", params={"project": "tower", "tenant": TENANT})).json()["doors"]
+                other = (await client.post("/extract", params={"project": "school", "tenant": TENANT})).json()["doors"]
+                narrowed = (await client.post("/extract", params={
+                    "project": "tower", "tenant": TENANT, "file": "Tower Specifications.pdf",
+                })).json()["doors"]
+                results.append(report(
+                    len(doors) == 40 and not other and not narrowed,
+                    f"/extract: acme/tower {len(doors)} doors, acme/school {len(other)}, "
+                    f"acme/tower in the spec book only {len(narrowed)}",
+                ))
+
+                unknown = await client.post("/chat", json={"query": "doors", "project": "hospital", "tenant": TENANT})
+                invalid = await client.post("/extract", params={"project": "../tower"})
+                results.append(report(
+                    unknown.status_code == 404 and invalid.status_code == 400,
+                    f"unknown project -> {unknown.status_code}, malformed name -> {invalid.status_code}",
+                ))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,121 @@
+"""Check the outbound limiter against a fake provider that enforces a quota.
+
+The provider allows PROVIDER_RPS calls per rolling second and answers 429
+beyond that. Scenarios, all with real (short) timings:
+  1. a burst straight at the provider: most calls fail;
+  2. the same burst through the limiter: none fail, steady throughput;
+  3. chat calls queued behind an ingest backlog are served first;
+  4. chat calls that would wait past their bound get Overloaded at once;
+  5. a limiter configured above the real quota adapts after the first 429s.
+
+    python check_rate_limiter.py
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from chat_model import RateLimitedChatModel
+from fakes import FakeChatModel
+from ratelimit import CHAT, EXTRACT, INGEST, Overloaded, RateLimiter, priority
+
+PROVIDER_RPS = 10
+# Configure the limiter a little under the real quota, as in production
+QUOTA_RPM = PROVIDER_RPS * 60 * 0.9
+BURST = 40
+LLM_LATENCY = 0.05
+
+
+class QuotaChatModel(FakeChatModel):
+    """Answers 429 when more than PROVIDER_RPS calls started in the last second."""
+
+    def _admit(self):
+        now = time.monotonic()
+        started = self.__dict__.setdefault("_started", deque())
+        while started and now - started[0] > 1.0:
+            started.popleft()
+        if len(started) >= PROVIDER_RPS:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        started.append(now)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._admit()
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+
+def limited(rpm, max_wait=None):
+    limiter = RateLimiter(rpm, 10_000_000, name="llm", burst_seconds=0.2,
+                          max_wait=max_wait or {CHAT: 60.0, EXTRACT: 60.0, INGEST: None})
+    return RateLimitedChatModel(model=QuotaChatModel(latency=LLM_LATENCY), limiter=limiter, output_tokens=0)
+
+
+async def call(model, level, started):
+    with priority(level):
+        try:
+            await model.ainvoke("What is the fire rating for door D-101?")
+            return "ok", time.perf_counter() - started
+        except Overloaded:
+            return "overloaded", time.perf_counter() - started
+        except Exception:
+            return "429", time.perf_counter() - started
+
+
+async def burst(model, n, level=INGEST):
+    start = time.perf_counter()
+    results = await asyncio.gather(*[call(model, level, start) for _ in range(n)])
+    return [outcome for outcome, _ in results], time.perf_counter() - start
+
+
+def report(ok, label):
+    print(f"{'✅' if ok else '❌'} {label}")
+    return ok
+
+
+async def main():
+    print(f"🚀 Fake provider quota: {PROVIDER_RPS} calls per second\n")
+    results = []
+
+    outcomes, _ = await burst(QuotaChatModel(latency=LLM_LATENCY), BURST)
+    failed = outcomes.count("429")
+    results.append(report(failed > BURST / 2, f"no limiter: {BURST} calls -> {failed} failed with 429"))
+
+    outcomes, seconds = await burst(limited(QUOTA_RPM), BURST)
+    failed = outcomes.count("429")
+    results.append(report(failed == 0, f"limiter at quota: {BURST} calls -> {failed} failed, "
+                                       f"{BURST / seconds:.1f} calls/s over {seconds:.1f}s"))
+
+    model = limited(QUOTA_RPM)
+    start = time.perf_counter()
+    backlog = [asyncio.create_task(call(model, INGEST, start)) for _ in range(30)]
+    await asyncio.sleep(0.2)
+    chats = await asyncio.gather(*[call(model, CHAT, start) for _ in range(5)])
+    ingest = await asyncio.gather(*backlog)
+    chat_done = max(elapsed for _, elapsed in chats)
+    ingest_after = sum(1 for _, elapsed in ingest if elapsed > chat_done)
+    results.append(report(ingest_after >= 20, f"priority: 5 chat calls done at {chat_done:.1f}s, "
+                                              f"{ingest_after}/30 earlier-queued ingest calls finished after them"))
+
+    model = limited(QUOTA_RPM, max_wait={CHAT: 1.0, EXTRACT: 1.0, INGEST: None})
+    start = time.perf_counter()
+    chats = await asyncio.gather(*[call(model, CHAT, start) for _ in range(BURST)])
+    rejected = [elapsed for outcome, elapsed in chats if outcome == "overloaded"]
+    served = sum(1 for outcome, _ in chats if outcome == "ok")
+    results.append(report(rejected and max(rejected) < 0.1 and served + len(rejected) == BURST,
+                          f"bounded wait (1s): {served} served, {len(rejected)} turned away "
+                          f"within {max(rejected or [0]) * 1000:.0f} ms"))
+
+    model = limited(QUOTA_RPM * 3)
+    outcomes, seconds = await burst(model, BURST * 2)
+    failed = outcomes.count("429")
+    results.append(report(failed < BURST, f"limiter 3x over quota: {BURST * 2} calls -> {failed} failed, "
+                                          f"rate scaled to {model.limiter.scale:.2f}"))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,64 @@
+"""Check that identical concurrent requests share one LLM call.
+
+Runs the real app in-process with fake backends (see benchmark.py) and
+fires 50 identical /chat requests, then 50 identical /extract?refresh=true
+requests, counting calls to the fake LLM.
+
+    python check_single_flight.py
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+
+import httpx
+
+from benchmark import local_app
+
+CONCURRENT_REQUESTS = 50
+QUESTION = "What is the fire rating for door D-101?"
+
+
+async def burst(client, method, path, json=None):
+    responses = await asyncio.gather(*[
+        client.request(method, path, json=json) for _ in range(CONCURRENT_REQUESTS)
+    ])
+    return [response.json() for response in responses if response.status_code == 200]
+
+
+async def main():
+    args = argparse.Namespace(chunks=200, embed_latency=0.05, search_latency=0.03, llm_latency=0.5)
+    print(f"🚀 Sending {CONCURRENT_REQUESTS} identical concurrent requests per endpoint...\n")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        app = local_app(args, workdir)
+        async with app.router.lifespan_context(app):
+            await app.state.warm_up
+            llm = app.state.llm
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check", timeout=60) as client:
+                before = llm.calls
+                answers = await burst(client, "POST", "/chat", {"query": QUESTION})
+                calls = llm.calls - before
+                ok = calls == 1 and len(answers) == CONCURRENT_REQUESTS and len({a["answer"] for a in answers}) == 1
+                print(f"{'✅' if ok else '❌'} /chat: {len(answers)} answers from {calls} LLM call(s)")
+                results.append(ok)
+
+                # One refresh on its own sets the baseline (one call per schedule file)
+                before = llm.calls
+                await client.post("/extract", params={"refresh": "true"})
+                single = llm.calls - before
+                before = llm.calls
+                schedules = await asyncio.gather(*[
+                    client.post("/extract", params={"refresh": "true"}) for _ in range(CONCURRENT_REQUESTS)
+                ])
+                calls = llm.calls - before
+                ok = calls == single and all(r.status_code == 200 for r in schedules)
+                print(f"{'✅' if ok else '❌'} /extract?refresh=true: {len(schedules)} responses from {calls} LLM call(s) "
+                      f"(a single refresh makes {single})")
+                results.append(ok)
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
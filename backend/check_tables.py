@@ -0,0 +1,138 @@
+"""Check table-aware parsing on a generated door schedule PDF.
+
+Writes a small PDF: page 1 is a door schedule drawn cell by cell, with a
+two-line header and a wrapped location; page 2 mentions doors in prose
+only. Checks that:
+  - the table comes out whole, with headers, merged wrapped rows and page numbers;
+  - ingest indexes it as one chunk, where the old 1000-char splitter cut it up
+    and left most pieces without column headers;
+  - the door schedule is read locally and only the table-less page reaches the LLM;
+  - the same rows are read back from a retrieved table chunk.
+
+    python check_tables.py
+"""
+import os
+import sys
+import tempfile
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from door_schedule import refresh_file, refresh_from_chunks
+from fakes import FakeChatModel
+from ingest_pipeline import is_table, parse_pages
+from pdf_tables import parse_page
+from schedule_store import ScheduleStore
+
+COLUMNS = [40, 100, 250, 310, 370, 450, 530]
+DOORS = 40
+
+
+def write_pdf(path, pages):
+    """Minimal PDF with Helvetica text runs; pages = [[(x, y, size, text)]]."""
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    pages_id = 2 + 2 * len(pages)
+    kids = []
+    for runs in pages:
+        stream = "".join(f"BT /F1 {size} Tf {x} {y} Td ({text}) Tj ET\n" for x, y, size, text in runs).encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 842 1200] "
+                       b"/Resources << /Font << /F1 1 0 R >> >> /Contents %d 0 R >>" % (pages_id, len(objects)))
+        kids.append(b"%d 0 R" % len(objects))
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids)))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out, offsets = b"%PDF-1.4\n", []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def schedule_page():
+    runs = [(40, 1160, 14, "DOOR SCHEDULE"), (40, 1140, 9, "All doors per Section 08 11 13. Verify sizes on site.")]
+    runs += [(x, 1115, 8, text) for x, text in zip(COLUMNS, ["DOOR", "", "", "", "", "FIRE", "HARDWARE"]) if text]
+    runs += [(x, 1105, 8, text) for x, text in zip(COLUMNS, ["MARK", "LOCATION", "WIDTH", "HEIGHT", "MATERIAL", "RATING", "SET"])]
+    y = 1090
+    for i in range(DOORS):
+        location = "Corridor to" if i % 10 == 1 else f"Room {101 + i}"
+        row = [f"D-{101 + i}", location, "900", "2100", "Hollow Metal" if i % 3 else "Wood", "1 HR" if i % 2 else "None", f"HW-{i % 4 + 1}"]
+        for x, text in zip(COLUMNS, row):
+            if text == "Hollow Metal":  # two text runs, one cell
+                runs += [(x, y, 8, "Hollow"), (x + 27, y, 8, "Metal")]
+            else:
+                runs.append((x, y, 8, text))
+        y -= 12
+        if i % 10 == 1:
+            runs.append((COLUMNS[1], y, 8, "Stair 1"))
+            y -= 12
+    runs.append((40, y - 20, 9, "Provide closers at all rated doors."))
+    return runs
+
+
+def prose_page():
+    return [(40, 1160, 12, "DOOR HARDWARE NOTES"),
+            (40, 1140, 9, "Door schedule addendum: door D-201 Lobby 1000 x 2100 Alum, fire rating 45 min.")]
+
+
+def report(ok, label):
+    print(f"{'✅' if ok else '❌'} {label}")
+    return ok
+
+
+def main():
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "A-601 Door Schedule.pdf")
+        write_pdf(path, [schedule_page(), prose_page()])
+        reader = PdfReader(path)
+
+        _, tables = parse_page(reader.pages[0], 0)
+        table = tables[0] if len(tables) == 1 else None
+        wrapped = table and table.records()[1]
+        results.append(report(
+            table is not None and len(table.rows) == DOORS and table.header[0] == "DOOR MARK"
+            and wrapped["LOCATION"] == "Corridor to Stair 1" and wrapped["page"] == 0,
+            f"table found: {table and len(table.rows)} rows, header {table and table.header}",
+        ))
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        old_chunks = splitter.split_text(reader.pages[0].extract_text())
+        marks = [f"D-{101 + i}" for i in range(DOORS)]
+        headless = sum(1 for chunk in old_chunks if "MARK" not in chunk)
+        docs = parse_pages(path, 0, 2)
+        table_docs = [doc for doc in docs if is_table(doc)]
+        results.append(report(
+            len(table_docs) == 1 and all(mark in table_docs[0].page_content for mark in marks),
+            f"indexed as {len(table_docs)} table chunk with all {DOORS} rows "
+            f"(old splitter: {len(old_chunks)} chunks, {headless} of them without the column headers)",
+        ))
+
+        llm = FakeChatModel(response='{"doors": [{"mark": "D-201", "location": "Lobby", "page": "2"}]}')
+        store = ScheduleStore(os.path.join(workdir, "schedule.sqlite3"))
+        refresh_file(llm, store, path)
+        doors = store.doors()
+        first = doors[0] if doors else {}
+        results.append(report(
+            len(doors) == DOORS + 1 and llm.calls == 1 and first.get("mark") == "D-101" and first.get("page") == 1
+            and first.get("fire_rating") == "None" and first.get("material") == "Wood",
+            f"door schedule: {len(doors)} doors, {llm.calls} LLM call (the table-less page only)",
+        ))
+
+        llm.calls = 0
+        chunk_store = ScheduleStore(os.path.join(workdir, "from_chunks.sqlite3"))
+        refresh_from_chunks(llm, chunk_store, table_docs)
+        results.append(report(
+            len(chunk_store.doors()) == DOORS and llm.calls == 0,
+            f"from a retrieved table chunk: {len(chunk_store.doors())} doors, {llm.calls} LLM calls",
+        ))
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
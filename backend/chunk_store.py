@@ -0,0 +1,93 @@
+"""Chunk text and metadata, keyed by chunk ID, in one SQLite file per project.
+
+Vectors (Pinecone or the local index) only carry what the search itself
+needs: the chunk ID plus the filter fields (see
+ingest_pipeline.vector_metadata). A query
+gets back IDs; the BM25 index keeps no text either. Only the chunks that
+survive fusion are read from here (`hydrate`), so a query moves 5 chunk
+texts instead of 20-25 candidates over the wire, and the vector store
+holds a few bytes of metadata per chunk instead of the whole text.
+
+Text is stored zlib-compressed: spec prose and schedule tables repeat
+themselves a lot.
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+from langchain_core.documents import Document
+
+CHUNK_DB_PATH = os.getenv("CHUNK_DB_PATH", "chunks.sqlite3")
+# SQLite caps the number of "?" placeholders per statement
+_LOOKUP_BATCH = 500
+
+
+class ChunkStore:
+    """chunk ID -> (text, metadata). Written by ingest.py, read by the API."""
+
+    def __init__(self, path=CHUNK_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text BLOB NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None
+
+    def put_many(self, items):
+        """items: [(id, text, metadata)]"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                [(id_, zlib.compress(text.encode("utf-8")), json.dumps(metadata)) for id_, text, metadata in items],
+            )
+            self._conn.commit()
+
+    def remove(self, ids):
+        ids = list(ids)
+        with self._lock:
+            for i in range(0, len(ids), _LOOKUP_BATCH):
+                batch = ids[i:i + _LOOKUP_BATCH]
+                self._conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+
+    def get_many(self, ids):
+        found = {}
+        unique = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[i:i + _LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for id_, text, metadata in rows:
+                    found[id_] = (zlib.decompress(text).decode("utf-8"), json.loads(metadata))
+        return found
+
+    def hydrate(self, docs):
+        """Fill in text and full metadata of ID-only search hits, in one query.
+
+        Hits that already have text (an index written before the chunk
+        store existed) are kept as they are; IDs this store does not know
+        (deleted since the search) are dropped.
+        """
+        missing = [doc.id for doc in docs if not doc.page_content and doc.id]
+        found = self.get_many(missing) if missing else {}
+        hydrated = []
+        for doc in docs:
+            if doc.page_content:
+                hydrated.append(doc)
+            elif doc.id in found:
+                text, metadata = found[doc.id]
+                hydrated.append(Document(id=doc.id, page_content=text, metadata=metadata))
+        return hydrated
@@ -0,0 +1,108 @@
+"""Builders for the external clients.
+
+The provider SDKs (langchain_google_genai, pinecone, langchain.chains) take
+over a second to import, so each builder imports its own SDK. Importing
+this module, and main.py, stays cheap; the cost moves into the API's
+background warm-up.
+"""
+import os
+
+from embed_engine import MAX_RETRIES, RateLimitedEmbeddings
+from embedding_cache import CachedEmbeddings
+from observability import TokenUsageCallback
+from ratelimit import RateLimiter
+
+# Must match between ingest.py and main.py (768 dims)
+EMBEDDING_MODEL = "models/text-embedding-004"
+CHAT_MODEL = "gemini-2.0-flash"
+# gemini-2.0-flash free tier; raise to the project's paid quota
+LLM_RPM = int(os.getenv("LLM_RPM", "15"))
+LLM_TPM = int(os.getenv("LLM_TPM", "1000000"))
+# One quota per process, shared by /chat, /extract and the schedule refresh
+LLM_LIMITER = RateLimiter(LLM_RPM, LLM_TPM, name="llm")
+# Threads behind Pinecone's pooled urllib3 connections (sync calls / async_req upserts)
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "8"))
+# "pinecone" (serverless, shared) or "local" (memory-mapped index on this machine)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+
+SYSTEM_PROMPT = (
+    "You are a construction AI. Answer based ONLY on the context provided. "
+    "If the answer is not in the context, say 'I cannot find that information'. "
+    "Context: {context}"
+)
+
+
+def build_embeddings(max_retries=MAX_RETRIES):
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    # Persistent (model, text hash) cache in front of a rate-limited, 429-retrying API client
+    return CachedEmbeddings(
+        RateLimitedEmbeddings(GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL), max_retries=max_retries)
+    )
+
+
+def build_vectorstore(embeddings, index_name=None):
+    index_name = index_name or os.getenv("PINECONE_INDEX_NAME")
+    if VECTOR_BACKEND == "local":
+        from vectorstores import LocalVectorStore
+
+        return LocalVectorStore(os.path.join(LOCAL_INDEX_DIR, index_name or "default"), embeddings)
+    if VECTOR_BACKEND != "pinecone":
+        raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}' (expected 'pinecone' or 'local')")
+    from pinecone import Pinecone
+
+    from pinecone_store import PineconeStore
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"), pool_threads=PINECONE_POOL_THREADS)
+    return PineconeStore(index=pc.Index(index_name), embedding=embeddings)
+
+
+# One generation for several questions that share their retrieved context (see batch.py)
+BATCH_SYSTEM_PROMPT = (
+    "You are a construction AI. Answer each numbered question based ONLY on the context provided. "
+    "If an answer is not in the context, answer 'I cannot find that information' for that question. "
+    'Return ONLY a JSON object {{"answers": ["answer to 1", "answer to 2", ...]}} with one answer per question, in order. '
+    "Context: {context}"
+)
+
+
+def build_llm(google_key=None):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    from chat_model import RateLimitedChatModel
+
+    gemini = ChatGoogleGenerativeAI(
+        model=CHAT_MODEL,
+        temperature=0,
+        google_api_key=google_key or os.getenv("GOOGLE_API_KEY"),
+    )
+    # Every call waits its turn on the shared RPM/TPM limiter (chat before extract before ingest)
+    return RateLimitedChatModel(
+        model=gemini,
+        limiter=LLM_LIMITER,
+        # Prompt/completion token counters for /metrics
+        callbacks=[TokenUsageCallback()],
+    )
+
+
+def build_qa_chain(llm):
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("human", "{input}"),
+    ])
+    return create_stuff_documents_chain(llm, prompt)
+
+
+def build_batch_chain(llm):
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", BATCH_SYSTEM_PROMPT),
+        ("human", "{input}"),
+    ])
+    return create_stuff_documents_chain(llm, prompt)
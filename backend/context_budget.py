@@ -0,0 +1,99 @@
+"""Fit retrieved chunks into a token budget before they reach the LLM.
+
+The splitter's 200-character overlap means neighbouring chunks from one
+page repeat each other. Packing merges them back into one passage, drops
+near-duplicates (e.g. the same spec clause on two sheets) and stops at
+CONTEXT_TOKEN_BUDGET, keeping retrieval rank order.
+"""
+import os
+import re
+
+from langchain_core.documents import Document
+
+from ratelimit import estimate_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+# Word-set Jaccard similarity above which a lower-ranked passage is dropped
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9"))
+# Don't bother sending a truncated passage shorter than this
+MIN_PARTIAL_TOKENS = 50
+
+_WORD = re.compile(r"\w+")
+
+
+def _span(doc):
+    start = doc.metadata.get("start_index")
+    return None if start is None else (start, start + len(doc.page_content))
+
+
+def _merge_overlapping(docs):
+    """Merge chunks of the same page whose character ranges touch or overlap.
+
+    Returns [(best rank, Document)], one entry per merged passage.
+    """
+    groups = {}  # (source, page) -> [[start, end, text, best rank, metadata]]
+    passages = []
+    for rank, doc in enumerate(docs):
+        span = _span(doc)
+        if span is None:
+            passages.append((rank, doc))
+            continue
+        groups.setdefault((doc.metadata.get("source"), doc.metadata.get("page")), []).append(
+            [span[0], span[1], doc.page_content, rank, doc.metadata]
+        )
+
+    for spans in groups.values():
+        spans.sort()
+        merged = [spans[0]]
+        for start, end, text, rank, metadata in spans[1:]:
+            current = merged[-1]
+            if start <= current[1]:
+                if end > current[1]:
+                    current[2] += text[current[1] - start:]
+                    current[1] = end
+                current[3] = min(current[3], rank)
+            else:
+                merged.append([start, end, text, rank, metadata])
+        for start, _end, text, rank, metadata in merged:
+            passages.append((rank, Document(page_content=text, metadata={**metadata, "start_index": start})))
+
+    passages.sort(key=lambda passage: passage[0])
+    return passages
+
+
+def _is_near_duplicate(words, kept_words):
+    for other in kept_words:
+        union = len(words | other)
+        if union and len(words & other) / union >= NEAR_DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def pack_context(docs, budget=CONTEXT_TOKEN_BUDGET):
+    """Returns (packed docs, report). Docs must be in retrieval rank order."""
+    tokens_in = estimate_tokens([doc.page_content for doc in docs]) if docs else 0
+    packed, kept_words, used = [], [], 0
+    for _rank, doc in _merge_overlapping(docs):
+        words = set(_WORD.findall(doc.page_content.lower()))
+        if _is_near_duplicate(words, kept_words):
+            continue
+        tokens = estimate_tokens([doc.page_content])
+        if used + tokens > budget:
+            remaining = budget - used
+            if remaining >= MIN_PARTIAL_TOKENS:
+                # ~4 chars per token, same estimate as the rate limiter
+                packed.append(Document(page_content=doc.page_content[:remaining * 4], metadata=doc.metadata))
+                used += remaining
+            break
+        packed.append(doc)
+        kept_words.append(words)
+        used += tokens
+
+    report = {
+        "chunks_in": len(docs),
+        "passages_out": len(packed),
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "tokens_saved": max(tokens_in - used, 0),
+    }
+    return packed, report
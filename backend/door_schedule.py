@@ -0,0 +1,477 @@
+"""Door schedule extraction, run when documents change instead of per click.
+
+Door schedules that pdf_tables.py recognizes as tables are read locally,
+column by column. Only schedule-looking pages without such a table are sent
+to the LLM, and only when their text changed since the last extraction.
+Results live in the ScheduleStore, which /extract serves directly.
+
+LLM extraction is a map-reduce: the pages are cut into shards of a few
+pages, extracted by concurrent streaming calls, and each row is parsed
+the moment its JSON object closes (`DoorRowParser`), so rows reach
+`on_rows` (and /extract/stream) while the model is still writing. A
+malformed row, or a failed shard, costs only itself. `DoorMerger` reduces
+the rows to one per door mark and file, later pages overriding earlier ones.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from observability import logger, stage
+from pdf_tables import parse_page, parse_table_text
+
+# One page sends at most this much text to the LLM
+MAX_CONTEXT_CHARS = int(os.getenv("SCHEDULE_MAX_CONTEXT_CHARS", "25000"))
+# Page text per LLM call: shards run side by side, so the slowest shard sets the wall-clock time
+SHARD_CHARS = int(os.getenv("SCHEDULE_SHARD_CHARS", "8000"))
+# Concurrent extraction calls; the LLM limiter still decides when each one starts
+EXTRACT_CONCURRENCY = int(os.getenv("SCHEDULE_EXTRACT_CONCURRENCY", "4"))
+SCHEDULE_QUERY = "door schedule list hardware openings frame material width height fire rating"
+_DOOR_MARK = re.compile(r"\b[A-Z]{0,2}-?\d{2,4}[A-Z]?\b")
+# Header words for each door field, most specific first
+COLUMN_ALIASES = {
+    "mark": ("mark", "door no", "door number", "door #", "opening", "number", "no."),
+    "location": ("location", "room", "space", "area"),
+    "width_mm": ("width", "wd"),
+    "height_mm": ("height", "ht"),
+    "fire_rating": ("fire", "rating", "label"),
+    "material": ("material", "matl", "mat'l"),
+}
+_SIZE = re.compile(r"(\d[\d'\"\-. ]*?)\s*[xX×]\s*(\d[\d'\"\-. ]*)")
+
+EXTRACTION_PROMPT = """
+        You are a smart data extraction AI.
+        Your goal is to extract the DOOR SCHEDULE table from the messy text below.
+        Each page starts with a "=== PAGE n ===" marker.
+        Return ONLY a valid JSON object.
+
+        The JSON structure must strictly follow this format:
+        {{
+            "doors": [
+                {{
+                    "mark": "Door Number (e.g. D-101)",
+                    "location": "Room Name or Location",
+                    "width_mm": "Width (e.g. 900)",
+                    "height_mm": "Height (e.g. 2100)",
+                    "fire_rating": "Rating (e.g. 1 HR, 45 min, or None)",
+                    "material": "Material (e.g. HM, Wood, Alum)",
+                    "page": "Page number from the marker the row was found on"
+                }}
+            ]
+        }}
+
+        MESSY TEXT CONTENT:
+        {context_text}
+        """
+
+
+def page_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def is_schedule_page(text):
+    lowered = text.lower()
+    if "door" not in lowered:
+        return False
+    keywords = sum(word in lowered for word in ("schedule", "hardware", "frame", "fire rating", "opening"))
+    return keywords >= 2 or (keywords >= 1 and len(_DOOR_MARK.findall(text)) >= 3)
+
+
+class DoorRowParser:
+    """Incremental parser for the model's {"doors": [...]} reply, fed as it streams.
+
+    Every object in the first array is returned by `feed` as soon as its
+    closing brace arrives. Text around the array (```json fences, prose)
+    is ignored; a row that is not valid JSON is counted in `bad` and
+    skipped, and a reply cut off mid-row keeps the rows before it.
+    """
+
+    def __init__(self):
+        self.bad = 0
+        self._in_array = False
+        self._row = []  # characters of the row being read
+        self._depth = 0  # brace/bracket nesting inside that row
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        rows = []
+        for char in text:
+            if not self._depth:
+                if char == "[":
+                    self._in_array = True
+                elif char == "{" and self._in_array:
+                    self._row, self._depth = ["{"], 1
+                elif char == "]":
+                    self._in_array = False
+                continue
+            self._row.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if not self._depth:
+                    row = self._parse("".join(self._row))
+                    if row is not None:
+                        rows.append(row)
+        return rows
+
+    def _parse(self, text):
+        try:
+            row = json.loads(text)
+        except json.JSONDecodeError:
+            row = None
+        if not isinstance(row, dict):
+            self.bad += 1
+            return None
+        return row
+
+
+# Which door a row is and where it comes from, rather than what it says: not merged field by field
+_ROW_KEYS = ("file", "mark", "page", "pages")
+
+
+def mark_key(mark):
+    """'D-101', 'd101' and 'D 101' are the same door."""
+    return re.sub(r"[^A-Z0-9]", "", str(mark or "").upper())
+
+
+class DoorMerger:
+    """Reduce step: one row per door mark and file, in first-seen order.
+
+    A schedule continued on the next sheet, or an addendum page, lists a
+    door again. For each field the value read from the latest page wins,
+    so a revised sheet corrects the earlier one, but an empty value never
+    erases one. `pages` lists every page the door was read from, `page`
+    is the first. The same mark in two files (two drawing sets) stays two
+    rows; rows without a mark are kept as they are. Rows are in the API
+    shape (see schedule_store.door_row).
+    """
+
+    def __init__(self):
+        self.rows = []
+        self._by_key = {}  # (file, mark) -> (row, {field: page its value was read from})
+
+    def add(self, door):
+        """Merge one row; returns the merged row if it is new or changed, else None."""
+        mark = mark_key(door.get("mark"))
+        if not mark:
+            row = dict(door)
+            self.rows.append(row)
+            return row
+        page = door["page"]
+        values = {
+            field: value for field, value in door.items() if field not in _ROW_KEYS and value not in (None, "")
+        }
+        key = (door.get("file"), mark)
+        if key not in self._by_key:
+            row = {**door, "pages": [page]}
+            self.rows.append(row)
+            self._by_key[key] = (row, dict.fromkeys(values, page))
+            return row
+        row, sources = self._by_key[key]
+        changed = page not in row["pages"]
+        if changed:
+            row["pages"] = sorted(row["pages"] + [page])
+            row["page"] = row["pages"][0]
+        for field, value in values.items():
+            if sources.get(field, page) > page:
+                continue  # read from a later page already
+            sources[field] = page
+            if row.get(field) != value:
+                row[field] = value
+                changed = True
+        return row if changed else None
+
+
+def merge_doors(doors):
+    merger = DoorMerger()
+    for door in doors:
+        merger.add(door)
+    return merger.rows
+
+
+def door_columns(header):
+    """Map door fields to column indexes, or None if this is not a door schedule table."""
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for i, name in enumerate(header):
+            name = name.lower()
+            # "FRAME MATERIAL" / "FRAME WIDTH" describe the frame, not the door leaf
+            if i not in columns.values() and "frame" not in name and any(alias in name for alias in aliases):
+                columns[field] = i
+                break
+    if "mark" not in columns:
+        door = [i for i, name in enumerate(header) if name.lower().strip() == "door" and i not in columns.values()]
+        if door:
+            columns["mark"] = door[0]
+    if "width_mm" not in columns and "height_mm" not in columns:
+        size = [i for i, name in enumerate(header) if "size" in name.lower()]
+        if size:
+            columns["size"] = size[0]
+    fields = {field for field in columns if field != "mark"}
+    return columns if "mark" in columns and len(fields) >= 2 else None
+
+
+def door_rows(header, rows, page):
+    """Door dicts (0-based page) from one table's rows; [] if it is not a door schedule."""
+    columns = door_columns(header)
+    if columns is None:
+        return []
+    doors = []
+    for row in rows:
+        mark = row[columns["mark"]] if columns["mark"] < len(row) else ""
+        if not _DOOR_MARK.search(mark.upper()):
+            continue  # section headings, totals, blank lines
+        door = {field: row[i] if i < len(row) else "" for field, i in columns.items() if field != "size"}
+        if "size" in columns and columns["size"] < len(row):
+            match = _SIZE.search(row[columns["size"]])
+            if match:
+                door["width_mm"], door["height_mm"] = match.group(1).strip(), match.group(2).strip()
+        door["page"] = page
+        doors.append(door)
+    return doors
+
+
+def _page_groups(pages, size=SHARD_CHARS):
+    """Pack (page, text) pairs into shards of about `size` characters; a longer page is a shard of its own."""
+    group, total = [], 0
+    for page, text in pages:
+        text = text[:MAX_CONTEXT_CHARS]
+        if group and total + len(text) > size:
+            yield group
+            group, total = [], 0
+        group.append((page, text))
+        total += len(text)
+    if group:
+        yield group
+
+
+def _extract_group(llm, group, on_rows=None):
+    """Map step: stream one shard's extraction and parse rows as they arrive."""
+    context_text = "\n\n".join(f"=== PAGE {page + 1} ===\n{text}" for page, text in group)
+    known_pages = {page for page, _ in group}
+    parser = DoorRowParser()
+    doors = []
+    with stage("extract"):
+        for chunk in llm.stream(EXTRACTION_PROMPT.format(context_text=context_text)):
+            rows = parser.feed(chunk.content)
+            for door in rows:
+                try:
+                    page = int(str(door.get("page", "")).strip()) - 1
+                except ValueError:
+                    page = -1
+                door["page"] = page if page in known_pages else group[0][0]
+            if rows:
+                doors.extend(rows)
+                if on_rows:
+                    on_rows(rows)
+    if parser.bad:
+        logger.warning("door schedule rows skipped", extra={"fields": {
+            "pages": sorted(page + 1 for page in known_pages), "bad_rows": parser.bad, "rows": len(doors),
+        }})
+    return doors
+
+
+def _submit(pool, llm, groups, on_rows=None):
+    """Queue shards on `pool`: [(group, future)]."""
+    # Each call keeps the caller's limiter priority and trace
+    return [(group, pool.submit(contextvars.copy_context().run, _extract_group, llm, group, on_rows)) for group in groups]
+
+
+def _gather(shards):
+    """(doors, failed pages, errors) of finished shards. A failed shard is logged and its pages reported."""
+    doors, failed, errors = [], [], []
+    for group, future in shards:
+        try:
+            doors.extend(future.result())
+        except Exception as e:
+            logger.warning("door schedule shard failed", extra={"fields": {
+                "pages": [page + 1 for page, _ in group], "error": str(e),
+            }})
+            failed.extend(page for page, _ in group)
+            errors.append(e)
+    return doors, failed, errors
+
+
+def extract_doors(llm, pages, on_rows=None):
+    """pages: [(0-based page, text)]. Returns (door dicts tagged with their 0-based page, pages that failed).
+
+    Shards run EXTRACT_CONCURRENCY at a time. A shard whose call fails is
+    logged and its pages reported back, so the caller can retry them
+    later; only if every shard fails is the error raised.
+    """
+    groups = list(_page_groups(pages))
+    if len(groups) == 1:
+        return _extract_group(llm, groups[0], on_rows), []
+    with ThreadPoolExecutor(max_workers=min(EXTRACT_CONCURRENCY, len(groups))) as pool:
+        shards = _submit(pool, llm, groups, on_rows)
+    doors, failed, errors = _gather(shards)
+    if len(errors) == len(groups):
+        raise errors[0]
+    return doors, failed
+
+
+class _FileRefresh:
+    """One PDF's changed schedule pages: rows read from its tables, and the pages left for the LLM."""
+
+    def __init__(self, file_name, hashes, doors, unparsed):
+        self.file_name = file_name
+        self.hashes = hashes  # changed page -> text hash
+        self.doors = doors
+        self.unparsed = unparsed  # [(page, text)]
+        self.shards = []
+
+
+def _plan_file(store, path, force=False, on_rows=None):
+    """Read a PDF's schedule pages and their door tables. Returns a _FileRefresh, or None if no page changed."""
+    from pypdf import PdfReader
+
+    file_name = os.path.basename(path)
+    reader = PdfReader(path)
+    candidates, tables = {}, {}
+    for i, page in enumerate(reader.pages):
+        text, page_tables = parse_page(page, i)
+        text = "\n".join([text, *(chunk for table in page_tables for _, chunk in table.chunks())])
+        if is_schedule_page(text):
+            candidates[i] = text
+            tables[i] = page_tables
+
+    stored = store.page_hashes(file_name)
+    hashes = {page: page_hash(text) for page, text in candidates.items()}
+    changed = [page for page in sorted(candidates) if force or stored.get(page) != hashes[page]]
+    dropped = [page for page in stored if page not in candidates]
+
+    if dropped:
+        store.remove_pages(file_name, dropped)
+    if not changed:
+        return None
+    doors = []
+    for page in changed:
+        doors.extend(row for table in tables[page] for row in door_rows(table.header, table.rows, page))
+    if doors and on_rows:
+        on_rows(file_name, doors)
+    # The LLM only sees schedule pages that had no door table to read
+    parsed = {door["page"] for door in doors}
+    unparsed = [(page, candidates[page]) for page in changed if page not in parsed]
+    return _FileRefresh(file_name, {page: hashes[page] for page in changed}, doors, unparsed)
+
+
+def _store_file(store, refresh, extracted, failed):
+    refresh.doors.extend(extracted)
+    logger.info("door schedule pages", extra={"fields": {
+        "file": refresh.file_name, "parsed_locally": len(refresh.hashes) - len(refresh.unparsed),
+        "llm": len(refresh.unparsed), "failed": len(failed),
+    }})
+    # Pages of a failed shard keep their old rows and hash, so the next refresh retries them
+    store.replace_pages(
+        refresh.file_name, {page: digest for page, digest in refresh.hashes.items() if page not in failed}, refresh.doors,
+    )
+
+
+def refresh_file(llm, store, path, force=False, on_rows=None):
+    """Re-extract the schedule pages of one PDF whose text changed. Returns pages re-extracted.
+
+    `on_rows(file_name, doors)` sees the rows as they are read or
+    extracted (0-based pages), before the store is updated.
+    """
+    refresh = _plan_file(store, path, force, on_rows)
+    if refresh is None:
+        return 0
+    extracted, failed = [], []
+    if refresh.unparsed:
+        extracted, failed = extract_doors(llm, refresh.unparsed, _for_file(on_rows, refresh.file_name))
+    _store_file(store, refresh, extracted, failed)
+    return len(refresh.hashes)
+
+
+def _for_file(on_rows, file_name):
+    return (lambda doors: on_rows(file_name, doors)) if on_rows else None
+
+
+def refresh_schedule(llm, store, folder, files=None, force=False, on_rows=None):
+    """Bring the store in line with the PDFs in `folder`.
+
+    `files` limits the work to those PDFs (e.g. what ingest just changed);
+    `force` re-extracts every schedule page even if its text is unchanged.
+    `on_rows` is as for refresh_file.
+
+    The shards of every file share one pool, so a file's calls start while
+    an earlier file's are still running, and each file is stored as soon
+    as its own shards are done. Only if every shard fails is the error raised.
+    """
+    pdf_files = sorted(f for f in os.listdir(folder) if f.lower().endswith(".pdf"))
+    for file_name in store.files():
+        if file_name not in pdf_files:
+            store.remove_file(file_name)
+
+    refreshed, errors, shard_count = 0, [], 0
+    pending, left = {}, {}  # shard future -> its file; file -> shards still running
+
+    def finish(refresh):
+        nonlocal refreshed
+        extracted, failed, file_errors = _gather(refresh.shards)
+        errors.extend(file_errors)
+        _store_file(store, refresh, extracted, failed)
+        logger.info("door schedule re-extracted", extra={"fields": {"file": refresh.file_name, "pages": len(refresh.hashes)}})
+        refreshed += len(refresh.hashes)
+
+    with ThreadPoolExecutor(max_workers=EXTRACT_CONCURRENCY) as pool:
+        # Shards are queued as each file is read, so the LLM calls start before the last PDF is parsed
+        for file_name in (pdf_files if files is None else [f for f in files if f in pdf_files]):
+            refresh = _plan_file(store, os.path.join(folder, file_name), force, on_rows)
+            if refresh is None:
+                continue
+            refresh.shards = _submit(pool, llm, _page_groups(refresh.unparsed), _for_file(on_rows, file_name))
+            shard_count += len(refresh.shards)
+            if not refresh.shards:
+                finish(refresh)
+            left[file_name] = len(refresh.shards)
+            for _, future in refresh.shards:
+                pending[future] = refresh
+        for future in as_completed(pending):
+            refresh = pending[future]
+            left[refresh.file_name] -= 1
+            if not left[refresh.file_name]:
+                finish(refresh)
+    if shard_count and len(errors) == shard_count:
+        raise errors[0]
+    store.mark_refreshed()
+    return refreshed
+
+
+def refresh_from_chunks(llm, store, docs, on_rows=None):
+    """Fallback when the PDFs are not on this host: extract from retrieved chunks."""
+    by_file = {}
+    for doc in docs:
+        file_name = doc.metadata.get("source", "Unknown").split("/")[-1]
+        page = int(doc.metadata.get("page", 0))
+        pages, doors = by_file.setdefault(file_name, ({}, []))
+        pages[page] = pages.get(page, "") + "\n" + doc.page_content
+        if doc.metadata.get("kind") == "table":
+            doors.extend(door_rows(*parse_table_text(doc.page_content), page))
+
+    for file_name, (pages, doors) in by_file.items():
+        if doors and on_rows:
+            on_rows(file_name, doors)
+        parsed = {door["page"] for door in doors}
+        unparsed = [(page, text) for page, text in sorted(pages.items()) if page not in parsed and is_schedule_page(text)]
+        failed = []
+        if unparsed or not doors:
+            extracted, failed = extract_doors(llm, unparsed or sorted(pages.items()), _for_file(on_rows, file_name))
+            doors.extend(extracted)
+        store.replace_pages(
+            file_name, {page: page_hash(text) for page, text in pages.items() if page not in failed}, doors,
+        )
+    store.mark_refreshed()
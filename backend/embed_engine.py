@@ -0,0 +1,169 @@
+import inspect
+import json
+import os
+import random
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from observability import RATE_LIMITED, logger
+from ratelimit import Overloaded, RateLimiter, estimate_tokens
+
+# text-embedding-004 free/paid tier limits; override per project quota
+EMBED_RPM = int(os.getenv("EMBED_RPM", "1500"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "8"))
+BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("EMBED_BACKOFF_MAX", "60.0"))
+CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", "ingest_checkpoint.jsonl")
+# One quota per process: the API's query embeddings and ingest share it
+EMBED_LIMITER = RateLimiter(EMBED_RPM, EMBED_TPM, name="embedding")
+# Google's task type for search queries (embed_query's default; embed_documents uses RETRIEVAL_DOCUMENT)
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
+
+
+def is_rate_limit_error(error):
+    if isinstance(error, Overloaded):
+        return False  # our own admission control: retrying would only queue again
+    error_msg = str(error)
+    return (
+        type(error).__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError")
+        or "429" in error_msg or "Quota" in error_msg or "quota" in error_msg or "ResourceExhausted" in error_msg
+    )
+
+
+def embed_query_batch(client, texts):
+    """Query embeddings for many texts in one API call.
+
+    embed_query takes one text per request. Google's embed_documents takes a
+    task type, so a batch of queries goes through it embedded as queries;
+    clients without task types embed queries and documents alike.
+    """
+    if hasattr(client, "embed_queries"):
+        return client.embed_queries(texts)
+    if "task_type" in inspect.signature(client.embed_documents).parameters:
+        return client.embed_documents(texts, task_type=QUERY_TASK_TYPE)
+    return client.embed_documents(texts)
+
+
+def with_retries(fn, *args, max_retries=MAX_RETRIES, base=BACKOFF_BASE, cap=BACKOFF_MAX, on_retry=None, **kwargs):
+    """Call fn, retrying rate-limit errors with full-jitter exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            delay = random.uniform(0, min(cap, base * 2 ** attempt))
+            if on_retry:
+                on_retry(e, delay)
+            time.sleep(delay)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Wraps the raw API client: every real call waits its turn on the
+    shared RPM/TPM limiter and 429s are retried with backoff.
+
+    Sits *under* CachedEmbeddings, so cache hits never spend quota.
+    """
+
+    def __init__(self, underlying, limiter=None, max_retries=MAX_RETRIES):
+        self.underlying = underlying
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+        self.limiter = limiter or EMBED_LIMITER
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0}
+
+    def _count_retry(self, error, delay):
+        with self._lock:
+            self.stats["rate_limited"] += 1
+        RATE_LIMITED.inc(backend="embedding")
+        self.limiter.on_rate_limited()
+        logger.warning("embedding rate limited", extra={"fields": {"retry_in_s": round(delay, 1)}})
+
+    def _call(self, fn, texts):
+        def attempt():
+            self.limiter.acquire(estimate_tokens(texts))
+            with self._lock:
+                self.stats["requests"] += 1
+            result = fn()
+            self.limiter.on_success()
+            return result
+
+        return with_retries(attempt, max_retries=self.max_retries, on_retry=self._count_retry)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        return self._call(lambda: self.underlying.embed_documents(texts), texts)
+
+    def embed_query(self, text):
+        return self._call(lambda: self.underlying.embed_query(text), [text])
+
+    def embed_queries(self, texts):
+        texts = list(texts)
+        return self._call(lambda: embed_query_batch(self.underlying, texts), texts)
+
+
+class EmbeddingEngine:
+    """Embed + upsert calls for the ingest pipeline's worker threads.
+
+    Concurrency comes from the pipeline's embed workers (bounded by
+    INGEST_EMBED_WORKERS); rate limiting lives in RateLimitedEmbeddings.
+    Upserts get the same 429 retry treatment and go to `namespace`
+    ('' is the default one).
+    """
+
+    def __init__(self, embeddings, vectorstore, max_retries=MAX_RETRIES, namespace=""):
+        self.embeddings = embeddings
+        self.vectorstore = vectorstore
+        self.max_retries = max_retries
+        self.namespace = namespace
+
+    def embed(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def upsert(self, text_embeddings, metadatas, ids):
+        return with_retries(
+            self.vectorstore.add_embeddings, text_embeddings, metadatas=metadatas, ids=ids,
+            namespace=self.namespace or None, max_retries=self.max_retries,
+        )
+
+
+class Checkpoint:
+    """Append-only log of upserted chunk IDs, so an interrupted run resumes.
+
+    Entries are tied to the file's content hash: if the PDF changed since
+    the interrupted run, its old progress is ignored.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = {}  # (file name, sha256) -> set of chunk IDs
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash
+                    self._done.setdefault((entry["file"], entry["sha256"]), set()).update(entry["ids"])
+
+    def done_ids(self, file_name, sha256):
+        return self._done.get((file_name, sha256), set())
+
+    def record(self, file_name, sha256, ids):
+        with self._lock:
+            self._done.setdefault((file_name, sha256), set()).update(ids)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"file": file_name, "sha256": sha256, "ids": list(ids)}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        with self._lock:
+            self._done.clear()
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embed_engine import embed_query_batch
+from pipeline import aembed_query, run_blocking
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+# SQLite caps the number of "?" placeholders per statement
+_LOOKUP_BATCH = 500
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """(model, text hash) -> float32 vector, persisted in SQLite."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[i:i + _LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items],
+            )
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """Read-through cache around any LangChain embeddings client.
+
+    Documents and queries are cached separately because providers such as
+    Google embed them with different task types.
+    """
+
+    def __init__(self, underlying, store=None, model_name=None):
+        self.underlying = underlying
+        self.store = store or EmbeddingStore()
+        self.model_name = model_name or getattr(underlying, "model", type(underlying).__name__)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, kind, texts):
+        model = f"{self.model_name}:{kind}"
+        hashes = [text_hash(t) for t in texts]
+        found = self.store.get_many(model, hashes)
+        # Indexes of the first occurrence of each uncached text
+        missing = list({h: i for i, h in reversed(list(enumerate(hashes))) if h not in found}.values())
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return model, hashes, found, missing
+
+    def _merge(self, model, hashes, found, missing, new_vectors):
+        # Round-trip through float32 so fresh and cached vectors are identical
+        new_vectors = [np.asarray(v, dtype=np.float32).tolist() for v in new_vectors]
+        self.store.put_many(model, [(hashes[i], v) for i, v in zip(missing, new_vectors)])
+        found.update({hashes[i]: v for i, v in zip(missing, new_vectors)})
+        return [found[h] for h in hashes]
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        model, hashes, found, missing = self._lookup("document", texts)
+        new_vectors = self.underlying.embed_documents([texts[i] for i in missing]) if missing else []
+        return self._merge(model, hashes, found, missing, new_vectors)
+
+    def embed_query(self, text):
+        model, hashes, found, missing = self._lookup("query", [text])
+        new_vectors = [self.underlying.embed_query(text)] if missing else []
+        return self._merge(model, hashes, found, missing, new_vectors)[0]
+
+    def embed_queries(self, texts):
+        """Query embeddings for many questions; the uncached ones in a single API call."""
+        texts = list(texts)
+        model, hashes, found, missing = self._lookup("query", texts)
+        new_vectors = embed_query_batch(self.underlying, [texts[i] for i in missing]) if missing else []
+        return self._merge(model, hashes, found, missing, new_vectors)
+
+    async def aembed_documents(self, texts):
+        return await run_blocking(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        # SQLite reads and writes can wait on an ingest job's lock: keep them off the event loop
+        model, hashes, found, missing = await run_blocking(self._lookup, "query", [text])
+        new_vectors = [await aembed_query(self.underlying, text)] if missing else []
+        return (await run_blocking(self._merge, model, hashes, found, missing, new_vectors))[0]
@@ -0,0 +1,197 @@
+"""Offline stand-ins for the embedding, vector-store and chat backends.
+
+Each fake sleeps for a configurable latency so concurrency checks and
+benchmarks behave like the real network round trips, without API keys.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import VectorStore
+
+from projects import matches
+
+
+def _fake_vector(text, size):
+    seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(size)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hash-seeded vectors with simulated API latency."""
+
+    def __init__(self, size=768, latency=0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [_fake_vector(t, self.size) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [_fake_vector(t, self.size) for t in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class SyncOnlyFakeEmbeddings(FakeEmbeddings):
+    """Like the Google client: blocking API only, no native async."""
+
+    aembed_documents = Embeddings.aembed_documents
+    aembed_query = Embeddings.aembed_query
+
+
+class FakeVectorStore(VectorStore):
+    """Brute-force cosine search (one numpy product) over an in-memory dict keyed by ID.
+
+    Namespaces and metadata filters behave like Pinecone's.
+    """
+
+    def __init__(self, embedding, latency=0.0):
+        self._embedding = embedding
+        self.latency = latency
+        self._entries = {}  # id -> (Document, vector)
+        self._matrix = None  # stacked vectors, rebuilt after writes
+        self._namespaces = {}
+
+    def _namespace(self, namespace):
+        if not namespace:
+            return self
+        if namespace not in self._namespaces:
+            self._namespaces[namespace] = FakeVectorStore(self._embedding, latency=self.latency)
+        return self._namespaces[namespace]
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, ids=None, namespace=None, **kwargs):
+        if namespace:
+            return self._namespace(namespace).add_texts(texts, metadatas=metadatas, ids=ids)
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(len(self._entries) + i) for i in range(len(texts))]
+        for text, metadata, id_, vector in zip(texts, metadatas, ids, self._embedding.embed_documents(texts)):
+            self._entries[id_] = (Document(id=id_, page_content=text, metadata=dict(metadata)), vector)
+        self._matrix = None
+        return ids
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, namespace=None, **kwargs):
+        if namespace:
+            return self._namespace(namespace).add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        text_embeddings = list(text_embeddings)
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        for (text, vector), metadata, id_ in zip(text_embeddings, metadatas, ids):
+            self._entries[id_] = (Document(id=id_, page_content=text, metadata=dict(metadata)), vector)
+        self._matrix = None
+        return ids
+
+    def delete(self, ids=None, namespace=None, **kwargs):
+        if namespace:
+            return self._namespace(namespace).delete(ids=ids)
+        for id_ in ids or []:
+            self._entries.pop(id_, None)
+        self._matrix = None
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        store = cls(embedding, latency=kwargs.get("latency", 0.0))
+        store.add_texts(texts, metadatas)
+        return store
+
+    def _rank(self, embedding, k, filter=None, namespace=None):
+        if namespace:
+            return self._namespace(namespace)._rank(embedding, k, filter)
+        if not self._entries:
+            return []
+        if self._matrix is None:
+            # One snapshot: an ingest job may be adding entries from another thread
+            entries = list(self._entries.values())
+            self._matrix = (entries, np.array([v for _, v in entries]))
+        entries, matrix = self._matrix
+        scores = matrix @ np.asarray(embedding)
+        if filter:
+            scores = np.where([matches(doc.metadata, filter) for doc, _ in entries], scores, -np.inf)
+        top = [i for i in np.argsort(-scores)[:k] if scores[i] > -np.inf]
+        return [(entries[i][0], float(scores[i])) for i in top]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, namespace=None, **kwargs):
+        time.sleep(self.latency)
+        return self._rank(embedding, k, filter, namespace)
+
+    async def asimilarity_search_by_vector_with_score(self, embedding, k=4, filter=None, namespace=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._rank(embedding, k, filter, namespace)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        vector = self._embedding.embed_query(query)
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(vector, k=k)]
+
+
+class FakeChatModel(BaseChatModel):
+    """Returns a canned answer after `latency` seconds; streams it word by word.
+
+    A grouped /chat/batch prompt gets the canned answer once per numbered
+    question, in the JSON shape batch.py asks for.
+    """
+
+    response: str = "The fire rating for door D-101 is 1 HR."
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _reply(self, messages):
+        if "numbered question" not in str(messages[0].content):
+            return self.response
+        count = len(re.findall(r"^\d+\. ", str(messages[-1].content), re.MULTILINE))
+        return json.dumps({"answers": [self.response] * count})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        words = self._reply(messages).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            token = word if i == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        words = self.response.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            token = word if i == len(words) - 1 else word + " "
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,22 @@
+import os
+import time
+
+# ingest.py bumps this file whenever it changes the index; anything cached
+# from the old index (answers, schedules) compares against it. Named
+# projects each have their own (see projects.Scope.path).
+INDEX_VERSION_FILE = os.getenv("INDEX_VERSION_FILE", ".index_version")
+
+
+def read_index_version(path=INDEX_VERSION_FILE):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_index_version(path=INDEX_VERSION_FILE):
+    version = str(time.time_ns())
+    with open(path, "w") as f:
+        f.write(version)
+    return version
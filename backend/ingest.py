@@ -64,56 +64,286 @@
 # if __name__ == "__main__":
 #     ingest_docs()
 
+import argparse
+import hashlib
+import json
 import os
 from dotenv import load_dotenv
-# Use standard PDF loader
-from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-# CHANGED: Use Google Embeddings (768 dims)
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+# CHANGED: Use Google Embeddings (768 dims), behind the local embedding cache
+from chunk_store import CHUNK_DB_PATH, ChunkStore
+from clients import VECTOR_BACKEND, build_embeddings, build_llm, build_vectorstore
+from door_schedule import refresh_schedule
+from embed_engine import CHECKPOINT_PATH, Checkpoint, EmbeddingEngine
+from index_version import INDEX_VERSION_FILE, bump_index_version
+from ingest_pipeline import FILTER_FIELDS, IngestPipeline, is_table, vector_metadata
+from lexical import LEXICAL_INDEX_PATH, LexicalIndex
+from observability import configure_logging, logger
+from page_store import PAGE_STORE_PATH, PAGE_THUMBNAILS, PageStore, page_text, render_thumbnails
+from projects import Scope
+from schedule_store import SCHEDULE_DB_PATH, ScheduleStore
 
 load_dotenv()
 
-def ingest_docs():
-    # 1. Load PDFs
-    # Make sure your PDFs are in a folder named "Documents" inside backend
-    pdf_folder_path = "Documents"
+# Which file/chunk versions are already in the index (see ingest_docs)
+# One manifest per vector backend: switching backends re-ingests into the new one
+MANIFEST_PATH = os.getenv(
+    "INGEST_MANIFEST_PATH", "ingest_manifest.json" if VECTOR_BACKEND == "pinecone" else f"ingest_manifest.{VECTOR_BACKEND}.json"
+)
+# Bumped when chunk metadata changes: every file is re-parsed once and the
+# embedding cache keeps that free (1 = file/discipline/section filter fields,
+# 2 = vectors without text: every chunk is re-upserted once, text to the chunk store)
+MANIFEST_SCHEMA = 2
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id(file_name, page, offset):
+    # Deterministic: re-ingesting the same chunk overwrites its vector instead of duplicating it
+    return hashlib.sha1(f"{file_name}|{page}|{offset}".encode("utf-8")).hexdigest()
+
+def chunk_offset(doc):
+    # Table chunks have no character offset; key them by table and first row
+    if is_table(doc):
+        return f"table{doc.metadata['table']}.{doc.metadata['row_start']}"
+    return doc.metadata.get("start_index", 0)
+
+def chunk_hash(doc):
+    # Filter fields are part of the chunk: a re-tagged chunk must be re-upserted
+    key = "|".join([doc.page_content, *(str(doc.metadata.get(field, "")) for field in FILTER_FIELDS)])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"files": {}, "schema": MANIFEST_SCHEMA}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+def ingest_docs(scope=None, pdf_folder_path=None, lexical=None, on_progress=None, cancel=None, **pipeline_options):
+    """Incremental ingest: only new or changed PDFs are split, embedded and upserted.
+
+    The manifest records each file's hash and the hash of every chunk it
+    produced. Chunks whose text did not change are skipped, and vectors of
+    removed files (or chunks that no longer exist) are deleted.
+
+    `scope` picks the project: its vectors go to the project's namespace and
+    its manifest, checkpoint, keyword index, chunk store, page store and
+    schedule to its own files.
+
+    The API's ingest jobs (see jobs.py) pass the project's live `lexical`
+    index, so keyword search sees chunks as they are added, plus the
+    pipeline's `on_progress` and `cancel` hooks. Returns the pipeline
+    stats, or None when there was nothing to do.
+    """
+    scope = scope or Scope()
+    manifest_path = scope.path(MANIFEST_PATH)
+    namespace = scope.namespace or None
+    # 1. Find PDFs
+    pdf_folder_path = pdf_folder_path or scope.pdf_folder
     
     if not os.path.exists(pdf_folder_path):
-        print(f"❌ Error: Folder '{pdf_folder_path}' not found. Please create it and add PDFs.")
+        logger.error("ingest folder not found", extra={"fields": {"folder": pdf_folder_path}})
         return
 
-    print(f"📂 Loading PDFs from '{pdf_folder_path}'...")
-    loader = PyPDFDirectoryLoader(pdf_folder_path)
-    raw_docs = loader.load()
-    
-    if not raw_docs:
-        print("⚠️ No documents found to ingest.")
+    pdf_files = sorted(f for f in os.listdir(pdf_folder_path) if f.lower().endswith(".pdf"))
+    manifest = load_manifest(manifest_path)
+    known = manifest["files"]
+
+    current = {name: file_sha256(os.path.join(pdf_folder_path, name)) for name in pdf_files}
+    changed = [name for name in pdf_files if known.get(name, {}).get("sha256") != current[name]]
+    # Keyword index for hybrid retrieval; built from scratch if missing (unchanged chunks are not re-embedded)
+    if lexical is None:
+        lexical = LexicalIndex(scope.path(LEXICAL_INDEX_PATH), scope.path(INDEX_VERSION_FILE))
+    # Chunk text and metadata, read by the API for the chunks a search returns
+    chunk_store = ChunkStore(scope.path(CHUNK_DB_PATH))
+    if (not len(lexical) or chunk_store.empty()) and known:
+        changed = pdf_files
+    if manifest.get("schema") != MANIFEST_SCHEMA:
+        changed = pdf_files
+        # Forget the chunk hashes (not the IDs, stale ones are still deleted) so every vector is rewritten
+        for entry in known.values():
+            entry["chunks"] = dict.fromkeys(entry["chunks"])
+    # Page texts for citation previews; indexed files missing from it are re-parsed once
+    page_store = PageStore(scope.path(PAGE_STORE_PATH))
+    changed = [name for name in pdf_files if name in changed or not page_store.has(name)]
+    manifest["schema"] = MANIFEST_SCHEMA
+    removed = [name for name in known if name not in current]
+
+    logger.info("ingest started", extra={"fields": {
+        "project": scope.namespace, "folder": pdf_folder_path, "pdfs": len(pdf_files), "changed": len(changed),
+        "removed": len(removed),
+    }})
+    if not changed and not removed:
+        logger.info("index already up to date", extra={"fields": {"project": scope.namespace}})
         return
-        
-    print(f"   - Found {len(raw_docs)} pages.")
 
-    # 2. Split Text
-    print("✂️ Splitting text...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    docs = text_splitter.split_documents(raw_docs)
-    print(f"   - Created {len(docs)} chunks.")
+    # Must match the model used in main.py. Unchanged chunks are served
+    # from the local embedding cache, so re-ingesting costs no API calls.
+    embeddings = build_embeddings()
+    logger.info("syncing index", extra={"fields": {"backend": VECTOR_BACKEND, "index": os.getenv("PINECONE_INDEX_NAME")}})
+    vectorstore = build_vectorstore(embeddings)
 
-    # 3. Embed & Store
-    print(f"💾 Uploading to Pinecone Index: {os.getenv('PINECONE_INDEX_NAME')}...")
-    
-    # Must match the model used in main.py
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-    
-    index_name = os.getenv("PINECONE_INDEX_NAME")
-    
-    PineconeVectorStore.from_documents(
-        docs, 
-        embeddings, 
-        index_name=index_name
+    # 2. Drop vectors of files that are gone
+    for name in removed:
+        stale_ids = list(known[name]["chunks"])
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids, namespace=namespace)
+            lexical.remove(stale_ids)
+            chunk_store.remove(stale_ids)
+        page_store.remove(name)
+        del known[name]
+        save_manifest(manifest, manifest_path)
+        logger.info("file removed from index", extra={"fields": {"file": name, "vectors_deleted": len(stale_ids)}})
+
+    # 3. Parse, split, embed & upsert new or changed files as one streaming pipeline
+    new_chunks = {name: {} for name in changed}
+    upserted = {name: 0 for name in changed}
+    finished = []
+    # Chunks an interrupted earlier run already upserted for the same file version
+    checkpoint = Checkpoint(scope.path(CHECKPOINT_PATH))
+
+    def on_pages(job, docs):
+        # The parsed pages, before splitting: prose plus tables, as parse_pages laid them out
+        pages = {}
+        for doc in docs:
+            pages.setdefault(doc.metadata["page"], []).append(doc.page_content)
+        page_store.put_pages(job.name, {page: page_text(texts[0], texts[1:])[0] for page, texts in pages.items()})
+
+    def on_chunks(job, docs):
+        # Called per group of pages: only chunks whose text changed get embedded
+        old_chunks = known.get(job.name, {}).get("chunks", {})
+        resumed = checkpoint.done_ids(job.name, current[job.name])
+        ids, stored = [], []
+        for doc in docs:
+            cid = chunk_id(job.name, doc.metadata.get("page", 0), chunk_offset(doc))
+            new_chunks[job.name][cid] = chunk_hash(doc)
+            lexical.add(cid, doc.page_content, vector_metadata(doc.metadata))
+            stored.append((cid, doc.page_content, doc.metadata))
+            if old_chunks.get(cid) == new_chunks[job.name][cid] or cid in resumed:
+                ids.append(None)
+            else:
+                upserted[job.name] += 1
+                ids.append(cid)
+        # Before the vectors are upserted: a search may return them right away
+        chunk_store.put_many(stored)
+        return ids
+
+    def on_done(job):
+        # Every batch of this file is upserted: drop its stale chunks and record it
+        old_chunks = known.get(job.name, {}).get("chunks", {})
+        stale_ids = [cid for cid in old_chunks if cid not in new_chunks[job.name]]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids, namespace=namespace)
+            lexical.remove(stale_ids)
+            chunk_store.remove(stale_ids)
+        known[job.name] = {"sha256": current[job.name], "chunks": new_chunks[job.name]}
+        save_manifest(manifest, manifest_path)
+        if PAGE_THUMBNAILS:
+            pngs = render_thumbnails(job.path)
+            if pngs is None:
+                logger.warning("PAGE_THUMBNAILS=1 needs PyMuPDF (pip install pymupdf); storing page text only")
+            else:
+                page_store.put_thumbnails(job.name, pngs)
+        page_store.commit(job.name, job.num_pages)
+        finished.append(job.name)
+        logger.info("file indexed", extra={"fields": {
+            "file": job.name, "chunks": len(new_chunks[job.name]), "upserted": upserted[job.name],
+            "stale_deleted": len(stale_ids),
+        }})
+
+    def on_upserted(job, ids):
+        checkpoint.record(job.name, current[job.name], ids)
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+    engine = EmbeddingEngine(embeddings, vectorstore, namespace=scope.namespace)
+    pipeline = IngestPipeline(
+        engine, text_splitter, on_chunks, on_done, on_upserted, on_pages,
+        on_progress=on_progress, cancel=cancel, **pipeline_options,
     )
-    print("✅ Success! Documents are indexed with Google Embeddings (768 dims).")
+    stats = pipeline.run([os.path.join(pdf_folder_path, name) for name in changed])
+    # A cancelled or failed file may already have chunks in the stores: record their IDs, without
+    # hashes, so the next run re-upserts them and removing the file still deletes them
+    partial = [name for name in changed if name not in finished and new_chunks[name]]
+    for name in partial:
+        entry = known.setdefault(name, {"sha256": None, "chunks": {}})
+        entry["chunks"] = {**entry["chunks"], **dict.fromkeys(new_chunks[name])}
+    if partial:
+        save_manifest(manifest, manifest_path)
+
+    api_stats = embeddings.underlying.stats
+    logger.info("ingest pipeline finished", extra={"fields": {
+        **{key: stats[key] for key in (
+            "pages", "tables", "chunks", "seconds", "pages_per_s", "chunks_per_s", "peak_rss_mb", "peak_worker_rss_mb",
+        )},
+        "embedding_cache_hits": embeddings.hits, "api_embeddings": embeddings.misses,
+        "embedding_requests": api_stats["requests"], "rate_limited_retries": api_stats["rate_limited"],
+    }})
+
+    lexical.save()
+    # Tell the API its cached answers (and keyword index) are stale
+    bump_index_version(scope.path(INDEX_VERSION_FILE))
+    if pipeline.cancelled or pipeline.errors:
+        # Only files that were fully indexed get their schedules rebuilt; the rest resume next run
+        if finished:
+            update_door_schedule(pdf_folder_path, finished, ScheduleStore(scope.path(SCHEDULE_DB_PATH)))
+    else:
+        update_door_schedule(pdf_folder_path, changed, ScheduleStore(scope.path(SCHEDULE_DB_PATH)))
+    if pipeline.cancelled:
+        logger.warning("ingest cancelled; rerun to resume from the checkpoint", extra={"fields": {
+            "project": scope.namespace, "files_done": len(finished), "files": len(changed),
+        }})
+        return stats
+    if pipeline.errors:
+        errors = [f"{stage}: {error}" for stage, error in pipeline.errors]
+        logger.warning("some files failed; rerun to resume from the checkpoint", extra={"fields": {
+            "project": scope.namespace, "errors": errors,
+        }})
+        return {**stats, "errors": errors}
+    checkpoint.clear()
+    logger.info("ingest finished", extra={"fields": {"project": scope.namespace, "files": len(changed)}})
+    return stats
+
+def update_door_schedule(pdf_folder_path, changed, store):
+    """Re-extract the door schedule for changed PDFs, so /extract never waits on the LLM."""
+    try:
+        pages = refresh_schedule(build_llm(), store, pdf_folder_path, files=changed)
+        logger.info("door schedule updated", extra={"fields": {"files": len(changed), "pages": pages}})
+    except Exception as e:
+        # The index is fine; the API can still refresh the schedule later
+        logger.warning("door schedule extraction failed", extra={"fields": {"error": str(e)}})
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the PDFs of one project.")
+    parser.add_argument("--project", help="project to ingest into its own namespace (default: the shared default index)")
+    parser.add_argument("--tenant", help="tenant that owns the project")
+    parser.add_argument("--folder", help="PDF folder (default: PDF_FOLDER_PATH[/<tenant>]/<project>)")
+    args = parser.parse_args()
+    try:
+        scope = Scope(args.project, args.tenant)
+    except ValueError as e:
+        parser.error(str(e))
+    folder = args.folder or scope.pdf_folder
+    if not os.path.exists(folder):
+        print(f"❌ Error: Folder '{folder}' not found. Please create it and add PDFs.")
+        return
+    configure_logging()
+    stats = ingest_docs(scope, folder)
+    if stats is None:
+        print("✅ Index is already up to date.")
+    elif stats.get("errors"):
+        print("⚠️ Some files failed; rerun to resume from the checkpoint.")
+    else:
+        print("✅ Success! Documents are indexed with Google Embeddings (768 dims).")
 
 if __name__ == "__main__":
-    ingest_docs()
\ No newline at end of file
+    main()
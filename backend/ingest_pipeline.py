@@ -0,0 +1,362 @@
+"""Staged, streaming ingestion: parse -> split -> embed -> upsert.
+
+PDF pages are parsed in a process pool a few pages at a time and flow
+through bounded queues, so memory stays flat no matter how big the spec
+book is, and parsing, embedding and upserting overlap instead of running
+one after another. Tables found on a page (see pdf_tables.py) skip the
+splitter and are indexed whole. Every chunk carries the filterable
+metadata from `page_metadata`; vectors are upserted with only those
+fields (and the page), their text is kept by the chunk store.
+"""
+import os
+import queue
+import re
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+
+from observability import logger
+from page_store import page_text
+from pdf_tables import parse_page
+
+# Make sure your PDFs are in a folder named "Documents" inside backend
+PDF_FOLDER_PATH = os.getenv("PDF_FOLDER_PATH", "Documents")
+PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+# Max items waiting between two stages - this is what bounds memory
+QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+# Metadata that search filters can use, besides the page number
+FILTER_FIELDS = ("file", "discipline", "section")
+# All a vector carries besides its ID; text and the rest go to the chunk store (see chunk_store.py)
+VECTOR_FIELDS = ("page", *FILTER_FIELDS)
+# "SECTION 08 71 00" headings and "08 71 00 - 3" page footers of CSI spec books
+_SPEC_SECTION = re.compile(r"\bSECTION\s+(\d{2}) ?(\d{2}) ?(\d{2})\b|\b(\d{2}) (\d{2}) (\d{2}) ?- ?\d+\b")
+_SHEET_PREFIX = re.compile(r"^([A-Z]{1,2})[-_ ]?\d")
+# Sheet-number prefixes of drawing files (US National CAD Standard): "A-101 Plans.pdf" is architectural
+DISCIPLINES = {
+    "A": "architectural", "S": "structural", "M": "mechanical", "E": "electrical", "P": "plumbing",
+    "FP": "fire protection", "F": "fire protection", "C": "civil", "L": "landscape", "I": "interiors",
+    "T": "telecommunications", "G": "general",
+}
+
+
+def count_pages(path):
+    from pypdf import PdfReader  # imported lazily: the API only needs PDF_FOLDER_PATH
+
+    return len(PdfReader(path).pages)
+
+
+def page_metadata(path, text):
+    """Filterable metadata for one page: file name, discipline and CSI section ("087100" or "")."""
+    file_name = os.path.basename(path)
+    match = _SPEC_SECTION.search(text)
+    section = "".join(part for part in match.groups() if part) if match else ""
+    prefix = _SHEET_PREFIX.match(file_name)
+    if prefix and prefix.group(1) in DISCIPLINES:
+        discipline = DISCIPLINES[prefix.group(1)]
+    elif section or "spec" in file_name.lower():
+        discipline = "specifications"
+    else:
+        discipline = "general"
+    return {"file": file_name, "discipline": discipline, "section": section}
+
+
+def vector_metadata(metadata):
+    return {field: metadata[field] for field in VECTOR_FIELDS if field in metadata}
+
+
+def parse_pages(path, start, end):
+    """Process-pool worker: documents for pages [start, end) of one PDF.
+
+    One prose document per page (its text outside tables) plus one per
+    table, or per row group of a long table (metadata kind="table"). A
+    table chunk's start_index is its offset in the page text the page
+    store keeps (see page_store.page_text).
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    total = len(reader.pages)
+    docs = []
+    for i in range(start, min(end, total)):
+        text, tables = parse_page(reader.pages[i], i)
+        metadata = {"source": path, "page": i, "total_pages": total, **page_metadata(path, text)}
+        docs.append(Document(page_content=text, metadata=metadata))
+        chunks = [(n, first_row, chunk) for n, table in enumerate(tables) for first_row, chunk in table.chunks()]
+        _, offsets = page_text(text, [chunk for _, _, chunk in chunks])
+        for (n, first_row, chunk), offset in zip(chunks, offsets):
+            docs.append(Document(page_content=chunk, metadata={
+                **metadata, "kind": "table", "table": n, "row_start": first_row, "start_index": offset,
+            }))
+    return docs
+
+
+def is_table(doc):
+    return doc.metadata.get("kind") == "table"
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own / 2**20, 1), round(workers / 2**20, 1)
+
+
+class FileJob:
+    """One PDF moving through the pipeline."""
+
+    def __init__(self, path, num_pages):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.num_pages = num_pages
+        self.tasks_total = max(1, -(-num_pages // PAGES_PER_TASK))
+        self.tasks_split = 0
+        self.batches_pending = 0
+        self.split_done = False
+
+
+class IngestPipeline:
+    """Wires the stages together with bounded queues.
+
+    `on_pages(job, pages)` sees each group of parsed pages before they are
+    split; `on_chunks(job, docs)` stores the chunks' text and returns one
+    ID per chunk, or None for chunks that do not need (re-)embedding; `on_upserted(job, ids)` runs
+    after every upsert batch (checkpointing) and `on_done(job)` once every
+    batch of the file has been upserted. `on_progress(stats)` gets a copy
+    of the counters whenever one moves. Setting `cancel` (a threading.Event)
+    stops the run like a failure does: unfinished files are not recorded.
+    """
+
+    def __init__(
+        self, engine, text_splitter, on_chunks, on_done, on_upserted=None, on_pages=None,
+        on_progress=None, cancel=None, parse_workers=PARSE_WORKERS, mp_context=None,
+    ):
+        self.engine = engine
+        self.text_splitter = text_splitter
+        self.on_chunks = on_chunks
+        self.on_done = on_done
+        self.on_upserted = on_upserted
+        self.on_pages = on_pages
+        self.on_progress = on_progress
+        self.cancel = cancel or threading.Event()
+        self.parse_workers = parse_workers
+        self.mp_context = mp_context
+
+        self.pages_q = queue.Queue(maxsize=QUEUE_SIZE)
+        self.embed_q = queue.Queue(maxsize=QUEUE_SIZE)
+        self.upsert_q = queue.Queue(maxsize=QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._finish_lock = threading.Lock()  # on_done callbacks run one at a time
+        self._abort = threading.Event()
+        self.errors = []
+        self.stats = {
+            "files": 0, "files_total": 0, "pages": 0, "pages_total": 0, "tables": 0, "chunks": 0, "embedded": 0,
+            "upserted": 0,
+        }
+
+    @property
+    def cancelled(self):
+        return self.cancel.is_set()
+
+    def _stopped(self):
+        return self._abort.is_set() or self.cancel.is_set()
+
+    # --- stages -----------------------------------------------------------
+
+    def _parse_stage(self, jobs):
+        tasks = [
+            (job, start)
+            for job in jobs
+            for start in range(0, max(job.num_pages, 1), PAGES_PER_TASK)
+        ]
+        with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=self.mp_context) as pool:
+            in_flight = deque()
+            for job, start in tasks:
+                if self._stopped():
+                    break
+                in_flight.append((job, pool.submit(parse_pages, job.path, start, start + PAGES_PER_TASK)))
+                # Only keep a window of tasks ahead of the consumer
+                if len(in_flight) >= self.parse_workers * 2:
+                    self._emit_parsed(*in_flight.popleft())
+            while in_flight and not self._stopped():
+                self._emit_parsed(*in_flight.popleft())
+            for _, future in in_flight:
+                future.cancel()
+        self.pages_q.put(None)
+
+    def _emit_parsed(self, job, future):
+        try:
+            pages = future.result()
+        except Exception as e:
+            self._fail("parse", e)
+            return
+        self.pages_q.put((job, pages))
+
+    def _split_stage(self):
+        batch = []
+        while True:
+            item = self.pages_q.get()
+            if item is None:
+                break
+            if self._stopped():
+                continue
+            job, pages = item
+            try:
+                if self.on_pages:
+                    self.on_pages(job, pages)
+                prose = [p for p in pages if not is_table(p)]
+                tables = [p for p in pages if is_table(p)]
+                # Tables go in whole; splitting them is what broke schedules apart
+                docs = self.text_splitter.split_documents([p for p in prose if p.page_content.strip()]) + tables
+                ids = self.on_chunks(job, docs)
+                with self._lock:
+                    self.stats["pages"] += len(prose)
+                    self.stats["tables"] += len(tables)
+                    self.stats["chunks"] += len(docs)
+                    job.tasks_split += 1
+                self._report()
+                for id_, doc in zip(ids, docs):
+                    if id_ is None:
+                        continue
+                    batch.append((job, id_, doc))
+                    if len(batch) >= EMBED_BATCH_SIZE:
+                        self._queue_batch(batch)
+                        batch = []
+                if job.tasks_split == job.tasks_total:
+                    # Flush so a finished file does not wait on the next one
+                    if batch:
+                        self._queue_batch(batch)
+                        batch = []
+                    self._mark_split_done(job)
+            except Exception as e:
+                self._fail("split", e)
+        if batch and not self._stopped():
+            self._queue_batch(batch)
+        for _ in range(EMBED_WORKERS):
+            self.embed_q.put(None)
+
+    def _queue_batch(self, batch):
+        with self._lock:
+            for job in {id(j): j for j, _, _ in batch}.values():
+                job.batches_pending += 1
+        self.embed_q.put(batch)
+
+    def _embed_stage(self):
+        while True:
+            batch = self.embed_q.get()
+            if batch is None:
+                break
+            if self._stopped():
+                continue
+            try:
+                vectors = self.engine.embed([doc.page_content for _, _, doc in batch])
+                with self._lock:
+                    self.stats["embedded"] += len(batch)
+                self._report()
+                self.upsert_q.put((batch, vectors))
+            except Exception as e:
+                self._fail("embed", e)
+        self.upsert_q.put(None)
+
+    def _upsert_stage(self):
+        finished_embedders = 0
+        while finished_embedders < EMBED_WORKERS:
+            item = self.upsert_q.get()
+            if item is None:
+                finished_embedders += 1
+                continue
+            if self._stopped():
+                continue
+            batch, vectors = item
+            try:
+                # ID and filter fields only: on_chunks has put the text in the chunk store
+                self.engine.upsert(
+                    [("", vector) for vector in vectors],
+                    metadatas=[vector_metadata(doc.metadata) for _, _, doc in batch],
+                    ids=[id_ for _, id_, _ in batch],
+                )
+                if self.on_upserted:
+                    for job in {id(j): j for j, _, _ in batch}.values():
+                        self.on_upserted(job, [id_ for j, id_, _ in batch if j is job])
+                done = []
+                with self._lock:
+                    self.stats["upserted"] += len(batch)
+                    for job in {id(j): j for j, _, _ in batch}.values():
+                        job.batches_pending -= 1
+                        if job.split_done and job.batches_pending == 0:
+                            done.append(job)
+                self._report()
+                for job in done:
+                    self._finish(job)
+            except Exception as e:
+                self._fail("upsert", e)
+
+    # --- bookkeeping ------------------------------------------------------
+
+    def _mark_split_done(self, job):
+        with self._lock:
+            job.split_done = True
+            finished = job.batches_pending == 0
+        if finished:
+            self._finish(job)
+
+    def _finish(self, job):
+        with self._finish_lock:
+            self.on_done(job)
+        with self._lock:
+            self.stats["files"] += 1
+        self._report()
+
+    def _report(self):
+        if self.on_progress:
+            with self._lock:
+                stats = dict(self.stats)
+            self.on_progress(stats)
+
+    def _fail(self, stage, error):
+        logger.error("ingest stage failed", extra={"fields": {"stage": stage, "error": str(error)}})
+        self.errors.append((stage, error))
+        self._abort.set()
+
+    def run(self, paths):
+        start = time.perf_counter()
+        jobs = []
+        for path in paths:
+            try:
+                jobs.append(FileJob(path, count_pages(path)))
+            except Exception as e:
+                # A corrupt or encrypted PDF fails on its own; the other files still go through
+                name = os.path.basename(path)
+                logger.error("ingest stage failed", extra={"fields": {"stage": "parse", "file": name, "error": str(e)}})
+                self.errors.append(("parse", f"{name}: {e}"))
+        self.stats["files_total"] = len(jobs)
+        self.stats["pages_total"] = sum(job.num_pages for job in jobs)
+        self._report()
+
+        threads = [threading.Thread(target=self._parse_stage, args=(jobs,), name="ingest-parse"),
+                   threading.Thread(target=self._split_stage, name="ingest-split"),
+                   threading.Thread(target=self._upsert_stage, name="ingest-upsert")]
+        threads += [threading.Thread(target=self._embed_stage, name=f"ingest-embed-{i}") for i in range(EMBED_WORKERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        elapsed = time.perf_counter() - start
+        own_mb, workers_mb = peak_rss_mb()
+        self.stats.update({
+            "seconds": round(elapsed, 2),
+            "pages_per_s": round(self.stats["pages"] / elapsed, 1) if elapsed else 0.0,
+            "chunks_per_s": round(self.stats["chunks"] / elapsed, 1) if elapsed else 0.0,
+            "peak_rss_mb": own_mb,
+            "peak_worker_rss_mb": workers_mb,
+        })
+        return self.stats
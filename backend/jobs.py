@@ -0,0 +1,217 @@
+"""Background ingest jobs for documents uploaded through the API.
+
+PUT /documents/{file} writes a PDF into its project's folder and queues a
+job; a small pool of worker threads runs ingest.ingest_docs next to the
+API, at the limiters' ingest priority, so /chat keeps its quota and its
+event loop. Jobs run by priority, then arrival. One project is ingested
+by one job at a time (they share its manifest and indexes), and an upload
+for a project whose job is still queued joins that job.
+
+Progress (files, pages parsed, chunks embedded, vectors upserted) can be
+polled or streamed; a job can be cancelled while queued or running. Jobs
+live in memory only: the uploaded files are on disk, so after a restart
+the next job for the project (or ingest.py) picks them up.
+"""
+import itertools
+import os
+import threading
+import time
+import uuid
+
+from observability import logger
+
+JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+# Parse processes per running job: the other cores stay with the API
+JOB_PARSE_WORKERS = int(os.getenv("INGEST_JOB_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Finished jobs kept for GET /documents/jobs
+JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+# How long shutdown waits for running jobs to stop at a batch boundary
+JOB_SHUTDOWN_SECONDS = float(os.getenv("INGEST_JOB_SHUTDOWN_SECONDS", "30"))
+# How often a progress stream checks its job for news
+JOB_POLL_SECONDS = 0.25
+# Lower value = run first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+# IngestPipeline stats -> the progress a job reports
+PROGRESS_FIELDS = {
+    "files": "files_done", "files_total": "files_total", "pages": "pages_parsed", "pages_total": "pages_total",
+    "chunks": "chunks", "embedded": "chunks_embedded", "upserted": "vectors_upserted",
+}
+
+
+class IngestJob:
+    """One ingest run for a project, and the uploaded files that asked for it."""
+
+    def __init__(self, scope, files, priority, arrival):
+        self.id = uuid.uuid4().hex[:12]
+        self.scope = scope
+        self.files = list(files)
+        self.priority = priority
+        self.arrival = arrival
+        self.status = QUEUED
+        self.error = None
+        self.progress = dict.fromkeys(PROGRESS_FIELDS.values(), 0)
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Checked by the pipeline's stages between batches
+        self.cancel = threading.Event()
+        # Bumped on every change, so a stream only sends news
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self.version += 1
+
+    def add_files(self, files):
+        self.update(files=self.files + [name for name in files if name not in self.files])
+
+    def report(self, stats):
+        """IngestPipeline's on_progress hook."""
+        self.update(progress={field: stats.get(key, 0) for key, field in PROGRESS_FIELDS.items()})
+
+    def start(self):
+        self.update(status=RUNNING, started_at=time.time())
+
+    def finish(self, status, error=None):
+        self.update(status=status, error=error, finished_at=time.time())
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "id": self.id, "project": self.scope.project, "tenant": self.scope.tenant, "files": list(self.files),
+                "priority": PRIORITY_NAMES[self.priority], "status": self.status,
+                "cancel_requested": self.cancel.is_set(), "progress": dict(self.progress), "error": self.error,
+                "created_at": self.created_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            }
+
+
+class JobQueue:
+    """Priority queue of ingest jobs and the worker threads that run them.
+
+    `run(job)` does the work: it should pass `job.report` and `job.cancel`
+    to the pipeline and raise if the run failed.
+    """
+
+    def __init__(self, run, workers=JOB_WORKERS):
+        self._run = run
+        self._cond = threading.Condition()
+        self._queue = []  # queued jobs, picked by (priority, arrival)
+        self._jobs = {}  # id -> IngestJob, oldest first
+        self._running = set()  # namespaces with a job running
+        self._arrivals = itertools.count()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ingest-job-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, scope, files, priority=PRIORITIES["normal"]):
+        """Queue an ingest of `scope` for `files`, or add them to its job that is still queued."""
+        with self._cond:
+            for job in self._queue:
+                if job.scope.namespace == scope.namespace:
+                    job.add_files(files)
+                    if priority < job.priority:
+                        job.update(priority=priority)
+                    return job
+            job = IngestJob(scope, files, priority, next(self._arrivals))
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._trim()
+            self._cond.notify_all()
+            return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self, namespace=None):
+        """Newest first; only `namespace`'s jobs if given."""
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if namespace is None or job.scope.namespace == namespace]
+
+    def cancel(self, job_id):
+        """Drop a queued job, or ask a running one to stop after its current batches."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel.set()
+            if job in self._queue:
+                self._queue.remove(job)
+                job.finish(CANCELLED)
+            else:
+                job.update()
+            return job
+
+    def stats(self):
+        with self._cond:
+            jobs = list(self._jobs.values())
+        counts = dict.fromkeys((QUEUED, RUNNING, *FINISHED), 0)
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
+
+    def close(self, timeout=None):
+        """Cancel every job and wait up to `timeout` seconds for the workers to stop."""
+        with self._cond:
+            self._closed = True
+            for job in self._jobs.values():
+                if not job.finished:
+                    job.cancel.set()
+            for job in self._queue:
+                job.finish(CANCELLED)
+            self._queue.clear()
+            self._cond.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def _next(self):
+        ready = [job for job in self._queue if job.scope.namespace not in self._running]
+        return min(ready, key=lambda job: (job.priority, job.arrival), default=None)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None and not self._closed:
+                    self._cond.wait()
+                    job = self._next()
+                if job is None:
+                    return
+                self._queue.remove(job)
+                self._running.add(job.scope.namespace)
+                job.start()
+            logger.info("ingest job started", extra={"fields": {"job": job.id, "project": job.scope.namespace}})
+            try:
+                self._run(job)
+                job.finish(CANCELLED if job.cancel.is_set() else DONE)
+            except Exception as e:
+                logger.exception("ingest job failed", extra={"fields": {"job": job.id}})
+                job.finish(FAILED, error=str(e))
+            finally:
+                with self._cond:
+                    self._running.discard(job.scope.namespace)
+                    self._trim()
+                    self._cond.notify_all()
+            logger.info("ingest job finished", extra={"fields": {
+                "job": job.id, "status": job.status, **job.progress,
+                "seconds": round(job.finished_at - job.started_at, 2),
+            }})
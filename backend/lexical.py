@@ -0,0 +1,186 @@
+"""BM25 keyword index over chunk text, for exact identifiers dense search misses.
+
+Door marks (D-101, 105A), room numbers and CSI section numbers (08 71 00)
+are normalized so "door 105", "D105" and "D-105" all hit the same chunks.
+ingest.py keeps the index in sync with the vector store; the API loads it
+and reloads when the index version changes. Like the vectors, postings
+keep no chunk text: hits are hydrated from the chunk store after fusion.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from index_version import INDEX_VERSION_FILE, read_index_version
+from projects import matches
+
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index.json")
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal rank fusion constant from the original RRF paper
+RRF_K = 60
+
+_CSI_SECTION = re.compile(r"\b(\d{2})[ .-]?(\d{2})[ .-]?(\d{2})(?:\.(\d{2}))?\b")
+_TOKEN = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the this to was were what when where which "
+    "who with how does do there their its".split()
+)
+
+
+def tokenize(text):
+    """Words plus identifier variants: "D-101" -> d-101, d101, d, 101."""
+    text = text.lower()
+    tokens = ["".join(part for part in match.groups() if part) for match in _CSI_SECTION.finditer(text)]
+    for word in _TOKEN.findall(text):
+        if word in _STOPWORDS:
+            continue
+        variants = {word}
+        parts = re.split(r"[./-]", word)
+        if len(parts) > 1:
+            variants.update(part for part in parts if part not in _STOPWORDS)
+            if "." not in word:  # "d-101" == "d101", but "1.05" != "105"
+                variants.add("".join(parts))
+        if any(c.isdigit() for c in word) and any(c.isalpha() for c in word):
+            # "d101" / "105a": also index the number on its own
+            variants.update(re.findall(r"\d+", word))
+        tokens.extend(variants)
+    return tokens
+
+
+def identifiers(text):
+    """The tokens that name one thing: door marks, numbers, CSI sections ("d101", "101", "087100").
+
+    Spelled without dashes and slashes, so "D-101" and "d101" name the same door.
+    """
+    return frozenset(re.sub(r"[-/]", "", token) for token in tokenize(text) if any(c.isdigit() for c in token))
+
+
+def doc_key(doc):
+    """Identity shared by vector and keyword hits for the same chunk."""
+    if doc.id:
+        return doc.id
+    metadata = doc.metadata
+    return (metadata.get("source"), metadata.get("page"), metadata.get("start_index"))
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index, persisted as JSON. One per project."""
+
+    def __init__(self, path=LEXICAL_INDEX_PATH, version_path=INDEX_VERSION_FILE):
+        self.path = path
+        self.version_path = version_path
+        self._lock = threading.Lock()
+        self._index_version = None
+        self._load()
+
+    def _load(self):
+        self._chunks = {}  # id -> {"metadata", "tf"}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self._chunks = json.load(f)["chunks"]
+        self._index_version = read_index_version(self.version_path)
+        self._rebuild()
+
+    def _rebuild(self):
+        self._postings = {}  # term -> {id: term frequency}
+        self._lengths = {}
+        for id_, chunk in self._chunks.items():
+            self._index(id_, chunk["tf"])
+
+    def _index(self, id_, tf):
+        for term, count in tf.items():
+            self._postings.setdefault(term, {})[id_] = count
+        self._lengths[id_] = sum(tf.values())
+
+    def _unindex(self, id_):
+        chunk = self._chunks.pop(id_, None)
+        if chunk is None:
+            return
+        for term in chunk["tf"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(id_, None)
+                if not postings:
+                    del self._postings[term]
+        self._lengths.pop(id_, None)
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def add(self, id_, text, metadata):
+        tf = dict(Counter(tokenize(text)))
+        with self._lock:
+            self._unindex(id_)
+            self._chunks[id_] = {"metadata": metadata, "tf": tf}
+            self._index(id_, tf)
+
+    def remove(self, ids):
+        with self._lock:
+            for id_ in ids:
+                self._unindex(id_)
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"chunks": self._chunks}, f)
+            os.replace(tmp_path, self.path)
+
+    def reload_if_stale(self):
+        if read_index_version(self.version_path) != self._index_version:
+            with self._lock:
+                self._load()
+
+    def search(self, query, k, filter=None):
+        """Top-k (Document, BM25 score) for the query.
+
+        `filter` (see projects.matches) is applied to the postings, so
+        chunks outside it are never scored.
+        """
+        self.reload_if_stale()
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._chunks)
+            if not n or not terms:
+                return []
+            avg_len = sum(self._lengths.values()) / n
+            scores = Counter()
+            allowed = {} if filter else None  # id -> passes the filter, checked once per chunk
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id_, tf in postings.items():
+                    if allowed is not None:
+                        if id_ not in allowed:
+                            allowed[id_] = matches(self._chunks[id_]["metadata"], filter)
+                        if not allowed[id_]:
+                            continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[id_] / avg_len)
+                    scores[id_] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            hits = []
+            for id_, score in top:
+                chunk = self._chunks[id_]
+                # Index files written before the chunk store still have the text
+                hits.append((Document(id=id_, page_content=chunk.get("text", ""), metadata=dict(chunk["metadata"])), score))
+            return hits
+
+
+def reciprocal_rank_fusion(*ranked_lists, k):
+    """Fuse ranked Document lists; a chunk high in either list ranks high."""
+    scores = Counter()
+    docs = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked):
+            key = doc_key(doc)
+            scores[key] += 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+    return [docs[key] for key, _ in scores.most_common(k)]
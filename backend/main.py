@@ -147,29 +147,163 @@
 
 import os
 import json
-import re
+import time
+import hashlib
+import uuid
+import asyncio
+import multiprocessing
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from google.api_core.exceptions import ResourceExhausted
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings 
-from langchain_pinecone import PineconeVectorStore
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional
+from urllib.parse import quote, urlencode
+from answer_cache import AnswerCache, normalize_query
+from chunk_store import CHUNK_DB_PATH, ChunkStore
+from batch import BATCH_MAX_QUESTIONS, abatch_answer
+from clients import (
+    LLM_LIMITER, VECTOR_BACKEND, build_batch_chain, build_embeddings, build_llm, build_qa_chain, build_vectorstore,
+)
+from door_schedule import SCHEDULE_QUERY, DoorMerger, merge_doors, refresh_from_chunks, refresh_schedule
+from index_version import INDEX_VERSION_FILE
+from lexical import LEXICAL_INDEX_PATH, LexicalIndex
+from page_store import PAGE_STORE_PATH, PageStore
+from embed_engine import EMBED_LIMITER, is_rate_limit_error
+from jobs import FINISHED, JOB_PARSE_WORKERS, JOB_POLL_SECONDS, JOB_SHUTDOWN_SECONDS, PRIORITIES, JobQueue
+from observability import (
+    ADMISSION_REJECTED, CACHE_HIT_RATIO, INGEST_JOBS, LIMITER_QUEUED, LIMITER_RATE_SCALE, TraceMiddleware,
+    configure_logging, logger, render_metrics,
+)
+from pipeline import aanswer_question, aembed_query, aretrieve, asearch_by_vector, astream_answer, run_blocking
+from projects import Scope, build_filter
+from ratelimit import CHAT, EXTRACT, Overloaded, priority
+from schedule_store import SCHEDULE_DB_PATH, ScheduleStore, door_row
+from singleflight import SingleFlight
 
 # 1. Load Environment Variables
 load_dotenv()
-app = FastAPI()
+configure_logging()
 
-# 2. Check Keys
+# 2. Check Keys - reported by /readyz instead of failing the import
 google_key = os.getenv("GOOGLE_API_KEY")
 pinecone_key = os.getenv("PINECONE_API_KEY")
 index_name = os.getenv("PINECONE_INDEX_NAME")
-
-if not google_key or not pinecone_key:
-    raise ValueError("❌ Missing API Keys. Please check your .env settings.")
+WARMUP_QUERY = "door schedule fire rating"
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+# Largest PDF PUT /documents accepts
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "500"))
+
+def missing_keys():
+    missing = [] if google_key else ["GOOGLE_API_KEY"]
+    if VECTOR_BACKEND == "pinecone" and not pinecone_key:
+        missing.append("PINECONE_API_KEY")
+    return missing
+
+# 3. Setup Models - once per process, in the background so the port opens right away
+async def warm_up(app, stack):
+    """Build the clients, then touch each one so the first request is not the slow one.
+
+    Runs as a task after startup; /readyz reports progress. Transient
+    failures (e.g. Pinecone unreachable) are retried; missing keys are not.
+    """
+    state = app.state
+    checks = state.checks
+    missing = missing_keys()
+    if missing:
+        checks["config"] = f"missing {', '.join(missing)}"
+        logger.error("missing API keys", extra={"fields": {"missing": missing}})
+        return
+    checks["config"] = "ok"
+
+    start = time.perf_counter()
+    while True:
+        step = "embeddings"
+        try:
+            # SDK imports and client construction block: keep them off the event loop.
+            # Interactive requests retry a 429 briefly instead of backing off for minutes
+            state.embeddings = await run_blocking(build_embeddings, max_retries=2)
+            # One real embedding; on later boots it comes from the local embedding cache
+            query_vector = await aembed_query(state.embeddings, WARMUP_QUERY)
+            checks[step] = "ok"
+
+            step = "vectorstore"
+            state.vectorstore = await run_blocking(build_vectorstore, state.embeddings, index_name)
+            if hasattr(state.vectorstore, "__aenter__"):
+                # Keep one async Pinecone HTTP session open instead of one per query
+                await stack.enter_async_context(state.vectorstore)
+            # A 1-result search opens the connection pool (and maps the local index)
+            await asearch_by_vector(state.vectorstore, query_vector, 1)
+            # BM25 side of hybrid retrieval, built by ingest.py
+            state.lexical = await run_blocking(LexicalIndex)
+            state.projects[""] = ProjectState(
+                Scope(), lexical=state.lexical, answer_cache=state.answer_cache, schedule_store=state.schedule_store
+            )
+            checks[step] = "ok"
+
+            step = "llm"
+            # Built, not called: a warm-up generation would spend quota
+            state.llm = await run_blocking(build_llm, google_key)
+            state.qa_chain = await run_blocking(build_qa_chain, state.llm)
+            state.batch_chain = await run_blocking(build_batch_chain, state.llm)
+            checks[step] = "ok"
+            break
+        except Exception as e:
+            checks[step] = f"error: {e}"
+            logger.exception("warm-up failed", extra={"fields": {"step": step, "retry_in_s": WARMUP_RETRY_SECONDS}})
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+    state.ready = True
+    logger.info("ready", extra={"fields": {"warm_up_ms": round((time.perf_counter() - start) * 1000, 1)}})
+    default = state.projects[""]
+    if os.path.isdir(default.scope.pdf_folder):
+        # Catch up on PDFs changed while the API was down; only changed pages hit the LLM
+        default.schedule_refresh = asyncio.create_task(refresh_door_schedule(default))
+
+class ProjectState:
+    """One project's keyword index, chunk store, answer cache, door schedule and page store.
+
+    The vector store is shared: a project's chunks are told apart by
+    namespace at search time. Named projects are opened on first request.
+    """
+
+    def __init__(self, scope, lexical=None, answer_cache=None, schedule_store=None):
+        self.scope = scope
+        version_path = scope.path(INDEX_VERSION_FILE)
+        if lexical is None:
+            lexical = LexicalIndex(scope.path(LEXICAL_INDEX_PATH), version_path)
+        self.lexical = lexical
+        self.chunk_store = ChunkStore(scope.path(CHUNK_DB_PATH))
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache(version_path=version_path)
+        self.schedule_store = schedule_store if schedule_store is not None else ScheduleStore(scope.path(SCHEDULE_DB_PATH))
+        self.page_store = PageStore(scope.path(PAGE_STORE_PATH))
+        self.schedule_refresh = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with AsyncExitStack() as stack:
+        state = app.state
+        state.ready = False
+        state.checks = {"config": "pending", "embeddings": "pending", "vectorstore": "pending", "llm": "pending"}
+        state.answer_cache = AnswerCache()
+        state.schedule_store = ScheduleStore()
+        # Namespace -> ProjectState; "" is the default project, added by warm_up
+        state.projects = {}
+        # Identical concurrent /chat and /extract calls share one computation
+        state.flights = SingleFlight()
+        # Uploaded documents are ingested by worker threads, next to the requests
+        state.loop = asyncio.get_running_loop()
+        state.jobs = JobQueue(run_ingest_job)
+        state.warm_up = asyncio.create_task(warm_up(app, stack))
+        yield
+        for task in (state.warm_up, *(project.schedule_refresh for project in state.projects.values())):
+            if task and not task.done():
+                task.cancel()
+        await run_blocking(state.jobs.close, JOB_SHUTDOWN_SECONDS)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TraceMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -178,139 +312,545 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class SearchFilters(BaseModel):
+    """Metadata pre-filters, applied inside the vector and keyword search. Pages are 1-based."""
+    files: list[str] = []
+    disciplines: list[str] = []
+    sections: list[str] = []
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+
 class ChatRequest(BaseModel):
     query: str
-
-# 3. Setup Models
-print("⏳ Connecting to Google Embeddings...")
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-
-print(f"⏳ Connecting to Pinecone Index: {index_name}...")
-vectorstore = PineconeVectorStore(
-    index_name=index_name, 
-    embedding=embeddings
-)
+    # Search only this project's namespace; omitted = the default project
+    project: Optional[str] = None
+    tenant: Optional[str] = None
+    filters: Optional[SearchFilters] = None
 
 # Root Route
 @app.get("/")
 def read_root():
-    return {"status": "✅ Project Brain API is Running!", "docs_url": "/docs"}
+    return {"status": "✅ Project Brain API is Running!", "ready": app.state.ready, "docs_url": "/docs"}
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return {"status": "ok"}
 
-@app.post("/chat")
+@app.get("/readyz")
+def readyz():
+    """Readiness: every client is built and has answered once."""
+    state = app.state
+    return JSONResponse({"ready": state.ready, "checks": state.checks}, status_code=200 if state.ready else 503)
+
+def require_ready():
+    if not app.state.ready:
+        raise HTTPException(status_code=503, detail="Warming up, try again shortly", headers={"Retry-After": "2"})
+
+async def open_project(project=None, tenant=None):
+    """The ProjectState for a request; 400 for a malformed name, 404 for a project never ingested."""
+    try:
+        scope = Scope(project, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    projects = app.state.projects
+    if scope.namespace not in projects:
+        if not os.path.exists(scope.path(LEXICAL_INDEX_PATH)) and not os.path.isdir(scope.pdf_folder):
+            raise HTTPException(status_code=404, detail=f"Unknown project '{scope.namespace}'")
+        # Loading the keyword index reads a file: once, and off the event loop
+        opened = await app.state.flights.do(("project", scope.namespace), run_blocking, ProjectState, scope)
+        projects.setdefault(scope.namespace, opened)
+    return projects[scope.namespace]
+
+def request_filter(filters):
+    return build_filter(**filters.model_dump()) if filters else None
+
+def filter_key(filter):
+    return json.dumps(filter, sort_keys=True) if filter else None
+
+QUOTA_MESSAGE = "⚠️ AI Overload: Google's free usage limit has been reached. Please wait 2-5 minutes and try again."
+ERROR_MESSAGE = "❌ Internal Server Error. Please check the backend logs."
+
+BUSY_MESSAGE = "⏳ Busy: the AI quota is fully booked right now. Please try again in {retry_after}s."
+
+def friendly_error(error):
+    if isinstance(error, Overloaded):
+        return BUSY_MESSAGE.format(retry_after=error.retry_after)
+    return QUOTA_MESSAGE if is_rate_limit_error(error) else ERROR_MESSAGE
+
+def admit(level):
+    """Turn a request away now, before any work, if its quota wait would be too long."""
+    EMBED_LIMITER.check(level)
+    LLM_LIMITER.check(level)
+
+def overloaded_response(endpoint, error, body):
+    ADMISSION_REJECTED.inc(endpoint=endpoint)
+    return JSONResponse(
+        {**body, "retry_after": error.retry_after}, status_code=429, headers={"Retry-After": str(error.retry_after)}
+    )
+
+@app.post("/chat", dependencies=[Depends(require_ready)])
 async def chat(request: ChatRequest):
+    project = await open_project(request.project, request.tenant)
+    filter = request_filter(request.filters)
     try:
-        # INCREASED k=25 (Read more pages to find the answer)
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 25})
-        
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash", 
-            temperature=0,
-            google_api_key=google_key
-        )
-
-        system_prompt = (
-            "You are a construction AI. Answer based ONLY on the context provided. "
-            "If the answer is not in the context, say 'I cannot find that information'. "
-            "Context: {context}"
+        state = app.state
+        # Single pass: embed once, hybrid search once, generate from the same docs.
+        # Concurrent copies of the same question wait for the first one's answer
+        result = await state.flights.do(
+            ("chat", project.scope.namespace, filter_key(filter), normalize_query(request.query)),
+            chat_answer, request.query, project, filter,
         )
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", "{input}"),
-        ])
+        logger.info("chat answered", extra={"fields": {
+            "cache": result["cache"], "passages": len(result["docs"]), "timings": result["timings"],
+            "context": result["context"],
+        }})
 
-        chain = create_retrieval_chain(retriever, create_stuff_documents_chain(llm, prompt))
-        print(f"🤔 Thinking about: {request.query}")
-        
-        # --- DEBUG: See what documents are actually retrieved ---
-        docs = retriever.invoke(request.query)
-        print(f"🔍 Retrieved {len(docs)} documents for context.")
-        if len(docs) > 0:
-            print(f"📄 First Doc Preview: {docs[0].page_content[:200]}...") # Show first 200 chars
-
-        response = chain.invoke({"input": request.query})
-
-        sources = []
-        if "context" in response:
-            for doc in response["context"]:
-                sources.append({
-                    "file": doc.metadata.get("source", "Unknown").split("/")[-1],
-                    "page": doc.metadata.get("page", 0) + 1
-                })
-
-        return {"answer": response["answer"], "sources": sources}
-    
-    except Exception as e:
-        error_msg = str(e)
-        print(f"❌ CRASH IN CHAT ENDPOINT: {error_msg}")
-        
-        if "429" in error_msg or "Quota" in error_msg or "quota" in error_msg or "ResourceExhausted" in error_msg:
-             return {
-                "answer": "⚠️ AI Overload: Google's free usage limit has been reached. Please wait 2-5 minutes and try again.", 
-                "sources": []
-            }
-            
         return {
-            "answer": "❌ Internal Server Error. Please check the backend logs.", 
-            "sources": []
+            "answer": result["answer"], "sources": result["sources"], "timings": result["timings"],
+            "cache": result["cache"], "context": result["context"],
         }
+    
+    except Overloaded as e:
+        logger.warning("chat rejected by limiter", extra={"fields": {"retry_after": e.retry_after}})
+        return overloaded_response("/chat", e, {"answer": friendly_error(e), "sources": []})
+    except Exception as e:
+        logger.exception("chat failed")
+        return {"answer": friendly_error(e), "sources": []}
+
+async def chat_answer(query, project, filter=None):
+    state = app.state
+    # Interactive: these LLM/embedding calls go ahead of extraction and ingest
+    with priority(CHAT):
+        return await aanswer_question(
+            query, state.embeddings, state.vectorstore, state.qa_chain,
+            # Cached answers were retrieved from the whole project: not valid for a narrower filter
+            cache=None if filter else project.answer_cache, lexical=project.lexical,
+            namespace=project.scope.namespace, filter=filter, chunks=project.chunk_store,
+        )
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-@app.post("/extract")
-async def extract_schedule():
+@app.post("/chat/stream", dependencies=[Depends(require_ready)])
+async def chat_stream(request: ChatRequest):
+    """Server-Sent Events version of /chat.
+
+    Events: `sources` (citation list, sent right after retrieval), `token`
+    (answer text as it is generated), `done` (timings, tokens saved) or `error`.
+    """
+    project = await open_project(request.project, request.tenant)
+    filter = request_filter(request.filters)
     try:
-        print("🔍 Searching for door schedule in documents...")
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 25}) # Increased here too
-        docs = retriever.invoke("door schedule list hardware openings frame material width height fire rating")
-        
-        context_text = "\n\n".join([d.page_content for d in docs])
-        print(f"📄 Found context length: {len(context_text)} characters")
+        # Headers go out before generation starts, so reject now rather than mid-stream
+        admit(CHAT)
+    except Overloaded as e:
+        return overloaded_response("/chat/stream", e, {"message": friendly_error(e)})
+
+    async def event_stream():
+        try:
+            state = app.state
+            with priority(CHAT):
+                async for event, data in astream_answer(
+                    request.query, state.embeddings, state.vectorstore, state.qa_chain,
+                    cache=None if filter else project.answer_cache, lexical=project.lexical,
+                    namespace=project.scope.namespace, filter=filter, chunks=project.chunk_store,
+                ):
+                    yield sse_event(event, data)
+        except Overloaded as e:
+            yield sse_event("error", {"message": friendly_error(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.exception("chat stream failed")
+            yield sse_event("error", {"message": friendly_error(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class BatchRequest(BaseModel):
+    questions: list[str] = Field(min_length=1, max_length=BATCH_MAX_QUESTIONS)
+    project: Optional[str] = None
+    tenant: Optional[str] = None
+    filters: Optional[SearchFilters] = None
+
+@app.post("/chat/batch", dependencies=[Depends(require_ready)])
+async def chat_batch(request: BatchRequest):
+    """Answer a list of questions (QA checklists, submittal reviews) as Server-Sent Events.
+
+    Events: `answer` ({index, question, answer, sources, cache}) as each
+    question is answered, in completion order; `error` ({indexes, message})
+    for questions that failed; `done` (LLM calls, groups, timings).
+    """
+    project = await open_project(request.project, request.tenant)
+    filter = request_filter(request.filters)
+    try:
+        # Bulk work: queued behind interactive /chat, like /extract
+        admit(EXTRACT)
+    except Overloaded as e:
+        return overloaded_response("/chat/batch", e, {"message": friendly_error(e)})
 
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash", 
-            temperature=0,
-            google_api_key=google_key
+    async def event_stream():
+        try:
+            state = app.state
+            with priority(EXTRACT):
+                async for event, data in abatch_answer(
+                    request.questions, state.embeddings, state.vectorstore, state.qa_chain, state.batch_chain,
+                    cache=None if filter else project.answer_cache, lexical=project.lexical,
+                    namespace=project.scope.namespace, filter=filter, chunks=project.chunk_store,
+                ):
+                    if event == "error":
+                        indexes, error = data
+                        logger.warning("batch group failed", extra={"fields": {"questions": indexes, "error": str(error)}})
+                        data = {"indexes": indexes, "message": friendly_error(error),
+                                "retry_after": getattr(error, "retry_after", None)}
+                    elif event == "done":
+                        logger.info("batch answered", extra={"fields": data})
+                    yield sse_event(event, data)
+        except Overloaded as e:
+            yield sse_event("error", {"message": friendly_error(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.exception("chat batch failed")
+            yield sse_event("error", {"message": friendly_error(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/cache/stats")
+def cache_stats():
+    return app.state.answer_cache.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format: latency histograms, tokens, 429s, cache hit ratios, limiter queues."""
+    state = app.state
+    CACHE_HIT_RATIO.set(state.answer_cache.stats()["hit_rate"], cache="answer")
+    for limiter in (EMBED_LIMITER, LLM_LIMITER):
+        stats = limiter.stats()
+        LIMITER_QUEUED.set(stats["queued"], limiter=limiter.name)
+        LIMITER_RATE_SCALE.set(stats["rate_scale"], limiter=limiter.name)
+    for status, count in state.jobs.stats().items():
+        INGEST_JOBS.set(count, status=status)
+    embeddings = getattr(state, "embeddings", None)
+    if hasattr(embeddings, "hits"):
+        lookups = embeddings.hits + embeddings.misses
+        CACHE_HIT_RATIO.set(round(embeddings.hits / lookups, 4) if lookups else 0.0, cache="embedding")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+async def refresh_door_schedule(project, force=False, on_rows=None):
+    state = app.state
+    folder = project.scope.pdf_folder
+    if os.path.isdir(folder):
+        await run_blocking(refresh_schedule, state.llm, project.schedule_store, folder, force=force, on_rows=on_rows)
+    else:
+        # PDFs are not on this host: extract from the index with the fixed schedule query
+        docs = await aretrieve(
+            SCHEDULE_QUERY, state.embeddings, state.vectorstore, k=25, timings={}, lexical=project.lexical,
+            namespace=project.scope.namespace, chunks=project.chunk_store,
         )
-        
-        prompt = f"""
-        You are a smart data extraction AI. 
-        Your goal is to extract the DOOR SCHEDULE table from the messy text below.
-        Return ONLY a valid JSON object.
-        
-        The JSON structure must strictly follow this format:
-        {{
-            "doors": [
-                {{
-                    "mark": "Door Number (e.g. D-101)",
-                    "location": "Room Name or Location",
-                    "width_mm": "Width (e.g. 900)",
-                    "height_mm": "Height (e.g. 2100)",
-                    "fire_rating": "Rating (e.g. 1 HR, 45 min, or None)",
-                    "material": "Material (e.g. HM, Wood, Alum)"
-                }}
-            ]
-        }}
-        
-        MESSY TEXT CONTENT:
-        {context_text}
-        """
-        
-        print("🤖 Asking AI to extract JSON...")
-        response = llm.invoke(prompt)
-        
-        clean_json = response.content.replace("```json", "").replace("```", "").strip()
-        
+        await run_blocking(refresh_from_chunks, state.llm, project.schedule_store, docs, on_rows=on_rows)
+
+async def ensure_schedule(scoped, refresh, on_rows=None):
+    """Extract the project's door schedule if asked to (`refresh`) or if nothing was extracted yet."""
+    store = scoped.schedule_store
+    if not refresh and store.updated_at() is not None:
+        return
+    if scoped.schedule_refresh and not scoped.schedule_refresh.done():
+        await asyncio.shield(scoped.schedule_refresh)
+    if refresh or store.updated_at() is None:
+        logger.info("extracting door schedule", extra={"fields": {
+            "force": refresh, "project": scoped.scope.namespace,
+        }})
+        admit(EXTRACT)
+        # Behind /chat in the limiter queue, ahead of ingest
+        with priority(EXTRACT):
+            await app.state.flights.do(
+                ("extract", scoped.scope.namespace, refresh), refresh_door_schedule, scoped,
+                force=refresh, on_rows=on_rows,
+            )
+
+@app.post("/extract", dependencies=[Depends(require_ready)])
+async def extract_schedule(
+    refresh: bool = False, project: Optional[str] = None, tenant: Optional[str] = None,
+    file: Optional[str] = None, page_from: Optional[int] = None, page_to: Optional[int] = None,
+):
+    """Serve the door schedule precomputed at ingest time.
+
+    The LLM only runs when `refresh=true` is passed (re-extract every
+    schedule page) or when nothing has been extracted yet. `file`,
+    `page_from` and `page_to` (1-based) narrow the rows returned. Rows
+    are merged by file and door mark (see door_schedule.DoorMerger).
+    """
+    scoped = await open_project(project, tenant)
+    try:
+        store = scoped.schedule_store
+        await ensure_schedule(scoped, refresh)
+        doors = merge_doors(store.doors(files=[file] if file else None, page_from=page_from, page_to=page_to))
+        return {"doors": doors, "updated_at": store.updated_at()}
+
+    except Overloaded as e:
+        logger.warning("extract rejected by limiter", extra={"fields": {"retry_after": e.retry_after}})
+        return overloaded_response("/extract", e, {"doors": []})
+    except Exception:
+        logger.exception("extract failed")
+        return {"doors": []}
+
+@app.post("/extract/stream", dependencies=[Depends(require_ready)])
+async def extract_schedule_stream(
+    refresh: bool = False, project: Optional[str] = None, tenant: Optional[str] = None,
+    file: Optional[str] = None, page_from: Optional[int] = None, page_to: Optional[int] = None,
+):
+    """Server-Sent Events version of /extract, to fill the table while extraction runs.
+
+    Events: `row` (a door, as soon as it is read from a table or parsed out
+    of the LLM's reply; a `row` for a file and mark already sent replaces
+    it), then `done` ({doors, count, updated_at}: the final merged table,
+    as /extract returns it) or `error`. Without `refresh`, a schedule
+    extracted before is streamed straight from the store.
+    """
+    scoped = await open_project(project, tenant)
+    store = scoped.schedule_store
+    if refresh or store.updated_at() is None:
         try:
-            data = json.loads(clean_json)
-        except json.JSONDecodeError:
-            match = re.search(r"\{.*\}", clean_json, re.DOTALL)
-            if match:
-                data = json.loads(match.group())
-            else:
-                return {"doors": []}
-
-        doors_list = data.get("doors", [])
-        print(f"✅ Extracted {len(doors_list)} doors!")
-        return {"doors": doors_list}
+            admit(EXTRACT)
+        except Overloaded as e:
+            return overloaded_response("/extract/stream", e, {"message": friendly_error(e)})
+
+    def wanted(door):
+        return (
+            (not file or door["file"] == file) and (page_from is None or door["page"] >= page_from)
+            and (page_to is None or door["page"] <= page_to)
+        )
 
-    except Exception as e:
-        print(f"❌ CRASH IN EXTRACT ENDPOINT: {e}")
-        return {"doors": []}
\ No newline at end of file
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        merger = DoorMerger()
+
+        def on_rows(file_name, doors):
+            # Called from the extraction threads
+            loop.call_soon_threadsafe(queue.put_nowait, [door_row(file_name, door) for door in doors])
+
+        try:
+            extraction = asyncio.ensure_future(ensure_schedule(scoped, refresh, on_rows))
+            extraction.add_done_callback(lambda _: queue.put_nowait(None))
+            while (doors := await queue.get()) is not None:
+                for door in doors:
+                    merged = merger.add(door) if wanted(door) else None
+                    if merged is not None:
+                        yield sse_event("row", merged)
+            await extraction
+            # The store has the last word: rows of pages that did not change, or of a refresh this one joined
+            stored = store.doors(files=[file] if file else None, page_from=page_from, page_to=page_to)
+            for door in stored:
+                merged = merger.add(door)
+                if merged is not None:
+                    yield sse_event("row", merged)
+            doors = merge_doors(stored)
+            yield sse_event("done", {"doors": doors, "count": len(doors), "updated_at": store.updated_at()})
+        except Overloaded as e:
+            yield sse_event("error", {"message": friendly_error(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.exception("extract stream failed")
+            yield sse_event("error", {"message": friendly_error(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/source/{file}/{page}", dependencies=[Depends(require_ready)])
+async def source_page(
+    file: str, page: int, project: Optional[str] = None, tenant: Optional[str] = None,
+    start: Optional[int] = None, end: Optional[int] = None, context: Optional[int] = None,
+):
+    """Text of a cited page, for a citation preview, read from the page store built at ingest.
+
+    `page` is 1-based like the chat sources. `start` and `end` (a source's
+    span) come back as the highlight; with `context`, only the highlighted
+    passage and `context` characters either side of it are returned.
+    """
+    scoped = await open_project(project, tenant)
+    store = scoped.page_store
+    text = store.text(file, page - 1)
+    if text is None:
+        raise HTTPException(status_code=404, detail=f"No stored text for '{file}' page {page}; re-run ingest.py")
+    if (start is None) != (end is None) or (start is not None and not 0 <= start <= end <= len(text)):
+        raise HTTPException(status_code=400, detail=f"start/end must be a span within the page's {len(text)} characters")
+
+    offset = 0
+    if context is not None:
+        context = max(context, 0)
+        offset = max(start - context, 0) if start is not None else 0
+        text = text[offset:end + context] if end is not None else text[:2 * context]
+    thumbnail = None
+    if store.has_thumbnail(file, page - 1):
+        query = urlencode({key: value for key, value in (("project", project), ("tenant", tenant)) if value})
+        thumbnail = f"/source/{quote(file)}/{page}/thumbnail" + (f"?{query}" if query else "")
+    return {
+        "file": file, "page": page, "total_pages": store.page_count(file), "offset": offset, "text": text,
+        "highlight": {"start": start - offset, "end": end - offset} if start is not None else None,
+        "thumbnail": thumbnail,
+    }
+
+@app.get("/source/{file}/{page}/thumbnail", dependencies=[Depends(require_ready)])
+async def source_thumbnail(file: str, page: int, project: Optional[str] = None, tenant: Optional[str] = None):
+    """PNG of a cited page, if ingest rendered thumbnails (PAGE_THUMBNAILS=1)."""
+    scoped = await open_project(project, tenant)
+    png = scoped.page_store.thumbnail(file, page - 1)
+    if png is None:
+        raise HTTPException(status_code=404, detail=f"No thumbnail for '{file}' page {page}")
+    return Response(png, media_type="image/png")
+
+
+def run_ingest_job(job):
+    """JobQueue worker: ingest the job's project into the same indexes the API searches.
+
+    The project's live keyword index is shared, so its new chunks are
+    searchable as soon as their vectors are upserted, not when the job ends.
+    """
+    # Imported here: the text splitter would slow the API's startup down
+    from ingest import ingest_docs
+
+    state = app.state
+    project = state.projects[job.scope.namespace]
+
+    def on_progress(stats):
+        upserted = job.progress["vectors_upserted"]
+        job.report(stats)
+        if job.progress["vectors_upserted"] != upserted:
+            # Answers cached before these pages were searchable may be missing them
+            state.loop.call_soon_threadsafe(project.answer_cache.invalidate)
+
+    stats = ingest_docs(
+        job.scope, lexical=project.lexical, on_progress=on_progress, cancel=job.cancel,
+        # The API process has threads running: a forked parse worker could inherit a held lock
+        parse_workers=JOB_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+    )
+    if stats and stats.get("errors"):
+        raise RuntimeError("; ".join(stats["errors"]))
+
+@app.put("/documents/{file}", status_code=202, dependencies=[Depends(require_ready)])
+async def upload_document(
+    file: str, request: Request, project: Optional[str] = None, tenant: Optional[str] = None, priority: str = "normal",
+):
+    """Store a PDF (the raw request body) in its project's folder and queue its ingest.
+
+    Answers as soon as the file is stored, with the ingest job (see
+    jobs.py): poll GET /documents/jobs/{id} or stream its /events. The
+    file's pages are searchable as they are upserted, before the job ends.
+    Re-uploading a file replaces it; only its changed chunks are re-embedded.
+    The response carries the body's sha256, hashed as it streams in.
+    """
+    try:
+        scope = Scope(project, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
+    if os.path.basename(file) != file or file.startswith(".") or not file.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail=f"'{file}' is not a PDF file name")
+
+    folder = scope.pdf_folder
+    os.makedirs(folder, exist_ok=True)
+    # Not a .pdf: an ingest running meanwhile does not see the partial file
+    tmp_path = os.path.join(folder, f".{file}.{uuid.uuid4().hex}.upload")
+    size, head, digest = 0, b"", hashlib.sha256()
+
+    def write(f, chunk):
+        f.write(chunk)
+        digest.update(chunk)
+
+    try:
+        # Uploads run to hundreds of MB: disk writes and hashing stay off the event loop
+        f = await run_blocking(open, tmp_path, "wb")
+        try:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > UPLOAD_MAX_MB * 2**20:
+                    raise HTTPException(status_code=413, detail=f"PDFs are limited to {UPLOAD_MAX_MB} MB")
+                if len(head) < 1024:
+                    head += chunk[:1024 - len(head)]
+                await run_blocking(write, f, chunk)
+        finally:
+            await run_blocking(f.close)
+        # The header may follow a little junk, but must be in the first 1 KB
+        if b"%PDF-" not in head:
+            raise HTTPException(status_code=415, detail=f"'{file}' is not a PDF")
+        await run_blocking(os.replace, tmp_path, os.path.join(folder, file))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    await open_project(project, tenant)
+    job = app.state.jobs.submit(scope, [file], PRIORITIES[priority])
+    logger.info("document uploaded", extra={"fields": {
+        "file": file, "bytes": size, "sha256": digest.hexdigest(), "project": scope.namespace, "job": job.id,
+    }})
+    return {"file": file, "bytes": size, "sha256": digest.hexdigest(), "job": job.snapshot()}
+
+def find_job(job_id):
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job
+
+@app.get("/documents/jobs")
+def list_jobs(project: Optional[str] = None, tenant: Optional[str] = None):
+    """Queued, running and recently finished ingest jobs, newest first; one project's if given."""
+    namespace = None
+    if project or tenant:
+        try:
+            namespace = Scope(project, tenant).namespace
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return {"jobs": [job.snapshot() for job in app.state.jobs.list(namespace)]}
+
+@app.get("/documents/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status and progress: files, pages parsed, chunks embedded, vectors upserted."""
+    return find_job(job_id).snapshot()
+
+@app.get("/documents/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events version of GET /documents/jobs/{id}.
+
+    Events: `progress` (the job, whenever it changes), then `done` (the
+    job, once it is done, failed or cancelled).
+    """
+    job = find_job(job_id)
+
+    async def event_stream():
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                snapshot = job.snapshot()
+                if snapshot["status"] in FINISHED:
+                    yield sse_event("done", snapshot)
+                    return
+                yield sse_event("progress", snapshot)
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.delete("/documents/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a job: a queued one never runs, a running one stops after its current batches.
+
+    Files it finished stay indexed; the rest resume from the checkpoint on
+    the project's next job.
+    """
+    job = app.state.jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job.snapshot()
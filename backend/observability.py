@@ -0,0 +1,340 @@
+"""Metrics, tracing and structured logging for the API.
+
+Metrics are Prometheus text-format counters, gauges and histograms kept
+in process (no client library needed); `render_metrics()` backs /metrics.
+Every request gets a trace ID held in a contextvar, and `span()` /
+`stage()` record nested timings under it, so concurrent requests never
+mix their spans. Logs are JSON lines tagged with the trace ID and are
+written by a background thread, so a slow stdout never blocks the event
+loop.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from ratelimit import estimate_tokens
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+_metrics = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self._labels(key))} {value}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        labels = self._labels(key)
+        lines = [
+            f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {n}"
+            for bound, n in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def render_metrics():
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+
+REQUEST_SECONDS = Histogram("rag_request_seconds", "HTTP request latency", ["endpoint", "status"])
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Latency of one pipeline stage", ["stage"])
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM tokens (provider usage, else estimated)", ["kind"])
+RETRIEVED_CHUNKS = Histogram("rag_retrieved_chunks", "Chunks per request", ["step"], buckets=COUNT_BUCKETS)
+RATE_LIMITED = Counter("rag_rate_limited_total", "429 / quota errors from upstream APIs", ["backend"])
+CACHE_REQUESTS = Counter("rag_cache_requests_total", "Cache lookups by result", ["cache", "result"])
+CACHE_HIT_RATIO = Gauge("rag_cache_hit_ratio", "Hit ratio since startup", ["cache"])
+LIMITER_QUEUED = Gauge("rag_limiter_queued", "Calls waiting for outbound quota", ["limiter"])
+LIMITER_RATE_SCALE = Gauge("rag_limiter_rate_scale", "Fraction of the configured quota in use after 429 adaptation", ["limiter"])
+ADMISSION_REJECTED = Counter("rag_admission_rejected_total", "Requests answered 429 by the outbound limiter", ["endpoint"])
+INGEST_JOBS = Gauge("rag_ingest_jobs", "Upload ingest jobs by status (finished ones: recent history)", ["status"])
+
+
+# --- tracing -------------------------------------------------------------
+
+_trace = contextvars.ContextVar("trace", default=None)
+_parent_span = contextvars.ContextVar("parent_span", default=None)
+
+
+class Trace:
+    def __init__(self, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans = []
+
+
+def current_trace_id():
+    trace = _trace.get()
+    return trace.id if trace else None
+
+
+@contextmanager
+def start_trace(trace_id=None):
+    trace = Trace(trace_id)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def _record_span(name, parent, start):
+    trace = _trace.get()
+    if trace is not None:
+        trace.spans.append({
+            "name": name,
+            "parent": parent,
+            "start_ms": round((start - trace.start) * 1000, 1),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+
+
+@contextmanager
+def span(name):
+    """Time a block as a child of the enclosing span of the current trace."""
+    parent = _parent_span.get()
+    token = _parent_span.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _parent_span.reset(token)
+        _record_span(name, parent, start)
+
+
+def record_stage(name, start, timings=None):
+    """Close a stage that began at perf_counter() `start`.
+
+    For code that cannot wrap the stage in a `with` block, e.g. across the
+    yields of a streaming generator.
+    """
+    elapsed = time.perf_counter() - start
+    _record_span(name, _parent_span.get(), start)
+    STAGE_SECONDS.observe(elapsed, stage=name)
+    if timings is not None:
+        timings[f"{name}_ms"] = round(elapsed * 1000, 1)
+
+
+@contextmanager
+def stage(name, timings=None):
+    """A span that also feeds the stage histogram and the response timings."""
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if timings is not None:
+            timings[f"{name}_ms"] = round(elapsed * 1000, 1)
+
+
+class TraceMiddleware:
+    """ASGI middleware: one trace per request, timed until the last body byte.
+
+    Plain ASGI instead of BaseHTTPMiddleware so streamed responses are
+    measured to the end of the stream, not to the first header.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        trace_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or None
+        status = 500
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-trace-id", trace.id.encode())]
+            await send(message)
+
+        with start_trace(trace_id) as trace:
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                elapsed = time.perf_counter() - trace.start
+                route = scope.get("route")
+                endpoint = getattr(route, "path", "unmatched")
+                REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+                if scope["path"] not in self.skip_paths:
+                    logger.info("request", extra={"fields": {
+                        "method": scope["method"], "endpoint": endpoint, "status": status,
+                        "duration_ms": round(elapsed * 1000, 1), "spans": trace.spans,
+                    }})
+
+
+# --- LLM usage -------------------------------------------------------------
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Counts prompt/completion tokens for every chat model call.
+
+    Uses the provider's usage metadata when the response carries it and
+    falls back to the 4-chars-per-token estimate otherwise.
+    """
+
+    def __init__(self):
+        self._prompt_estimates = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        texts = [str(message.content) for batch in messages for message in batch]
+        self._prompt_estimates[run_id] = estimate_tokens(texts)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        estimate = self._prompt_estimates.pop(run_id, 0)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), kind="prompt")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), kind="completion")
+                else:
+                    LLM_TOKENS.inc(estimate, kind="prompt")
+                    LLM_TOKENS.inc(estimate_tokens([generation.text]), kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._prompt_estimates.pop(run_id, None)
+        from embed_engine import is_rate_limit_error
+
+        if is_rate_limit_error(error):
+            RATE_LIMITED.inc(backend="llm")
+
+
+# --- logging ---------------------------------------------------------------
+
+logger = logging.getLogger("project_brain")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _TraceIdFilter(logging.Filter):
+    def filter(self, record):
+        # Runs on the caller's thread/task, where the trace contextvar is set
+        record.trace_id = current_trace_id()
+        return True
+
+
+_listener = None
+
+
+def configure_logging(level=logging.INFO):
+    """Route the app's logs through a queue to a JSON stdout writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_TraceIdFilter())
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
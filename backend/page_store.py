@@ -0,0 +1,231 @@
+"""Per-page text (and optional thumbnails) saved at ingest time, for citation previews.
+
+A citation is (file, page, chunk span). Showing it used to mean opening
+and parsing the PDF again. Ingest now writes every page's text to one
+store per project:
+
+  data.<n>.bin  - page texts (UTF-8) and PNG thumbnails, appended back to
+                  back; memory-mapped by readers, so a page is a slice, not a parse
+  index.json    - file -> per-page [offset, length] of the text and thumbnail
+
+A page's text is its prose followed by its table chunks, the same
+strings the chunks were cut from, so a chunk's start_index is its
+offset in the page text. Files replaced by a newer version leave dead
+bytes behind; the live ones are copied to data.<n+1>.bin once the dead
+ones are more than half of the file. data.<n>.bin stays until the next
+compaction, for readers still on the index that pointed to it.
+"""
+import json
+import mmap
+import os
+import threading
+
+PAGE_STORE_PATH = os.getenv("PAGE_STORE_PATH", "page_store")
+# Pre-render page thumbnails at ingest (needs PyMuPDF); off by default, rendering every page is slow
+PAGE_THUMBNAILS = os.getenv("PAGE_THUMBNAILS", "0") == "1"
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "400"))
+# Separator between a page's prose and each of its table chunks
+TABLE_SEPARATOR = "\n\n"
+COMPACT_RATIO = 0.5
+
+
+def page_text(prose, tables):
+    """The stored text of a page, and the offset at which each table chunk starts in it."""
+    text, offsets = prose, []
+    for chunk in tables:
+        text += TABLE_SEPARATOR
+        offsets.append(len(text))
+        text += chunk
+    return text, offsets
+
+
+def render_thumbnails(path, width=THUMBNAIL_WIDTH):
+    """PNG bytes per page, or None if PyMuPDF is not installed."""
+    try:
+        import fitz
+    except ImportError:
+        return None
+    pngs = []
+    with fitz.open(path) as pdf:
+        for page in pdf:
+            zoom = width / page.rect.width
+            pngs.append(page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png"))
+    return pngs
+
+
+class PageStore:
+    """Writers (ingest) append pages and `commit` whole files; readers (the API) slice the map.
+
+    A reader notices a commit from another process by index.json's mtime.
+    Compaction writes a new data file rather than rewriting the mapped
+    one, so a reader holding the previous index still reads valid bytes.
+    """
+
+    def __init__(self, path=PAGE_STORE_PATH):
+        self.path = path
+        self._index_path = os.path.join(path, "index.json")
+        self._lock = threading.RLock()
+        self._pending = {}  # file -> {page: [text span, thumbnail span]}
+        self._index = {"data": "data.0.bin", "files": {}}
+        self._index_mtime = None
+        self._map = None
+        self._load()
+
+    @property
+    def _data_path(self):
+        return os.path.join(self.path, self._index["data"])
+
+    # --- reading -----------------------------------------------------------
+
+    def _load(self):
+        with self._lock:
+            try:
+                mtime = os.stat(self._index_path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime == self._index_mtime:
+                return
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+            self._index_mtime = mtime
+            self._remap()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        try:
+            with open(self._data_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            pass  # compacted away since our index was read
+
+    def _slice(self, span):
+        """The span's bytes, or None if the data file no longer has them."""
+        offset, length = span
+        if self._map is None or offset + length > len(self._map):
+            self._remap()  # the data file grew since it was mapped
+        if self._map is None or offset + length > len(self._map):
+            return None
+        return self._map[offset:offset + length]
+
+    def _read(self, file_name, page, kind):
+        """Bytes of a page's text (kind 0) or thumbnail (kind 1), or None."""
+        with self._lock:
+            for _ in range(2):
+                spans = self._spans(file_name, page)
+                if not spans or not spans[kind]:
+                    return None
+                blob = self._slice(spans[kind])
+                if blob is not None:
+                    return blob
+                # Another process compacted twice since our index was read: its data file is gone
+                self._index_mtime = None
+                self._load()
+            return None
+
+    def _spans(self, file_name, page):
+        pages = self._index["files"].get(file_name, {}).get("pages", [])
+        return pages[page] if 0 <= page < len(pages) else None
+
+    def has(self, file_name):
+        self._load()
+        return file_name in self._index["files"]
+
+    def page_count(self, file_name):
+        self._load()
+        entry = self._index["files"].get(file_name)
+        return len(entry["pages"]) if entry else 0
+
+    def text(self, file_name, page):
+        """Text of a 0-based page, or None if the store does not have it."""
+        self._load()
+        blob = self._read(file_name, page, 0)
+        return blob.decode("utf-8") if blob is not None else None
+
+    def has_thumbnail(self, file_name, page):
+        self._load()
+        spans = self._spans(file_name, page)
+        return bool(spans and spans[1])
+
+    def thumbnail(self, file_name, page):
+        """PNG of a 0-based page, or None if it was not rendered at ingest."""
+        self._load()
+        return self._read(file_name, page, 1)
+
+    # --- writing (ingest) --------------------------------------------------
+
+    def _append(self, blob):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._data_path, "ab") as f:
+            offset = f.tell()
+            f.write(blob)
+        return [offset, len(blob)]
+
+    def put_pages(self, file_name, pages):
+        """Stage pages of a file being ingested: {0-based page: text}. Readers see them after `commit`."""
+        with self._lock:
+            staged = self._pending.setdefault(file_name, {})
+            for page, text in pages.items():
+                staged[page] = [self._append(text.encode("utf-8")), None]
+
+    def put_thumbnails(self, file_name, pngs):
+        with self._lock:
+            staged = self._pending.setdefault(file_name, {})
+            for page, png in enumerate(pngs):
+                if page in staged:
+                    staged[page][1] = self._append(png)
+
+    def commit(self, file_name, total_pages):
+        """Replace the file's previous version with its staged pages."""
+        with self._lock:
+            staged = self._pending.pop(file_name, {})
+            self._index["files"][file_name] = {"pages": [staged.get(page) for page in range(total_pages)]}
+            self._save()
+
+    def remove(self, file_name):
+        with self._lock:
+            if self._index["files"].pop(file_name, None) is not None:
+                self._save()
+
+    def _live_bytes(self):
+        return sum(
+            span[1] for entry in self._index["files"].values() for spans in entry["pages"] if spans
+            for span in spans if span
+        )
+
+    def _save(self):
+        # Replaced files, and pages staged by a run that failed, leave dead bytes behind
+        size = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+        stale = None
+        if not self._pending and size - self._live_bytes() > COMPACT_RATIO * size:
+            stale = self._compact()
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+        self._index_mtime = os.stat(self._index_path).st_mtime_ns
+        self._remap()
+        if stale:
+            # A reader may still be on the previous index, and so the previous file; the one before it is unused
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+    def _compact(self):
+        """Copy the live spans to a new data file; returns the path of the generation before the old one."""
+        self._remap()
+        generation = int(self._index["data"].split(".")[1]) + 1
+        new_name = f"data.{generation}.bin"
+        with open(os.path.join(self.path, new_name), "wb") as f:
+            for entry in self._index["files"].values():
+                for spans in entry["pages"]:
+                    for i, span in enumerate(spans or []):
+                        if span:
+                            blob = self._slice(span)
+                            spans[i] = [f.tell(), len(blob)]
+                            f.write(blob)
+        self._index["data"] = new_name
+        return os.path.join(self.path, f"data.{generation - 2}.bin") if generation >= 2 else None
@@ -0,0 +1,240 @@
+"""Find tables on PDF pages from text coordinates, so schedules stay whole.
+
+pypdf reports every text run with its position. Runs are grouped into
+lines by baseline, lines into cells by horizontal gaps, and a block of
+consecutive lines with at least MIN_COLUMNS cells becomes a table.
+Columns come from the x-ranges the body rows' cells cover, so a
+header that spans two columns does not merge them. Leading rows without
+digits are the header; a row whose first column is empty continues the
+row above it (wrapped cell text).
+
+Tables are indexed as one chunk each, rendered as "a | b | c" lines
+under their header and title. `parse_table_text` reads that format back, so
+rows can be recovered from a retrieved chunk without the PDF.
+"""
+import math
+import os
+import re
+
+MIN_COLUMNS = 3
+# Header + two rows
+MIN_ROWS = 3
+# Tables larger than this are indexed in row groups, each repeating the header
+TABLE_CHUNK_CHARS = int(os.getenv("TABLE_CHUNK_CHARS", "4000"))
+# Average glyph width as a fraction of the font size (Helvetica-ish)
+CHAR_WIDTH = 0.5
+CELL_SEPARATOR = " | "
+
+# Wide spaces or ASCII-art borders separate cells inside one text run
+_GAP = re.compile(r"\s{2,}|\s*\|\s*")
+
+
+class Cell:
+    __slots__ = ("x0", "x1", "text")
+
+    def __init__(self, x0, x1, text):
+        self.x0 = x0
+        self.x1 = x1
+        self.text = text
+
+
+class Line:
+    def __init__(self, y, size):
+        self.y = y
+        self.size = size
+        self.cells = []
+
+    @property
+    def text(self):
+        return " ".join(cell.text for cell in self.cells)
+
+
+class Table:
+    def __init__(self, page, title, header, rows):
+        self.page = page  # 0-based, like Document metadata
+        self.title = title
+        self.header = header
+        self.rows = rows
+
+    def records(self):
+        """One dict per row, keyed by header, tagged with the 0-based page."""
+        return [{"page": self.page, **dict(zip(self.header, row))} for row in self.rows]
+
+    def chunks(self):
+        """Text of the table in TABLE_CHUNK_CHARS-sized row groups: [(first row, text)]."""
+        head = "\n".join(part for part in (self.title, CELL_SEPARATOR.join(self.header)) if part)
+        groups, rows, size, first = [], [], len(head), 0
+        for i, row in enumerate(self.rows):
+            line = CELL_SEPARATOR.join(row)
+            if rows and size + len(line) + 1 > TABLE_CHUNK_CHARS:
+                groups.append((first, "\n".join([head, *rows])))
+                rows, size, first = [], len(head), i
+            rows.append(line)
+            size += len(line) + 1
+        groups.append((first, "\n".join([head, *rows])))
+        return groups
+
+
+def _mult(m, n):
+    return [
+        m[0] * n[0] + m[1] * n[2], m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2], m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4], m[4] * n[1] + m[5] * n[3] + n[5],
+    ]
+
+
+def extract_page(page):
+    """Returns (plain text, text runs as (x, y, font size, text)) from one pypdf pass."""
+    runs = []
+
+    def visit(text, cm, tm, font_dict, font_size):
+        text = text.replace("\n", " ")
+        if text.strip():
+            m = _mult(tm, cm)
+            runs.append((m[4], m[5], (font_size or 10) * (math.hypot(m[2], m[3]) or 1), text))
+
+    text = page.extract_text(visitor_text=visit) or ""
+    return text, runs
+
+
+def group_lines(runs):
+    """Text runs -> lines top to bottom, each split into cells left to right."""
+    lines = []
+    for x, y, size, text in sorted(runs, key=lambda run: (-run[1], run[0])):
+        if not lines or abs(lines[-1].y - y) > lines[-1].size * 0.5:
+            lines.append(Line(y, size))
+        char_width = size * CHAR_WIDTH
+        # Fixed-width layouts put a whole row in one run
+        offset = 0
+        for part in _GAP.split(text):
+            start = text.index(part, offset)
+            offset = start + len(part)
+            if part.strip():
+                lead = len(part) - len(part.lstrip())
+                lines[-1].cells.append(Cell(x + (start + lead) * char_width, x + offset * char_width, part.strip()))
+    for line in lines:
+        line.cells.sort(key=lambda cell: cell.x0)
+        merged = []
+        for cell in line.cells:
+            # Separate runs with a normal word gap are one cell ("Hollow" "Metal")
+            if merged and cell.x0 - merged[-1].x1 < line.size * CHAR_WIDTH * 1.5:
+                merged[-1] = Cell(merged[-1].x0, max(merged[-1].x1, cell.x1), f"{merged[-1].text} {cell.text}")
+            else:
+                merged.append(cell)
+        line.cells = merged
+    return lines
+
+
+def _columns(lines):
+    """Column x-ranges: where the cells of these lines overlap horizontally."""
+    gap = min(line.size for line in lines) * CHAR_WIDTH
+    columns = []
+    for x0, x1 in sorted((cell.x0, cell.x1) for line in lines for cell in line.cells):
+        if columns and x0 <= columns[-1][1] + gap:
+            columns[-1][1] = max(columns[-1][1], x1)
+        else:
+            columns.append([x0, x1])
+    return columns
+
+
+def _column_of(cell, columns):
+    def overlap(column):
+        return min(cell.x1, column[1]) - max(cell.x0, column[0])
+
+    return max(range(len(columns)), key=lambda i: (overlap(columns[i]), -abs(cell.x0 - columns[i][0])))
+
+
+def _has_digit(line):
+    return any(ch.isdigit() for ch in line.text)
+
+
+def _build_table(page, title, lines):
+    body = [line for line in lines if _has_digit(line)] or lines
+    columns = _columns(body)
+    if len(columns) < MIN_COLUMNS:
+        return None
+
+    header_lines = []
+    for line in lines:
+        if _has_digit(line) or len(header_lines) == 3:
+            break
+        header_lines.append(line)
+    header = [""] * len(columns)
+    for line in header_lines:
+        for cell in line.cells:
+            i = _column_of(cell, columns)
+            header[i] = f"{header[i]} {cell.text}".strip()
+    header = [name or f"column {i + 1}" for i, name in enumerate(header)]
+
+    rows = []
+    for line in lines[len(header_lines):]:
+        values = [""] * len(columns)
+        for cell in line.cells:
+            i = _column_of(cell, columns)
+            values[i] = f"{values[i]} {cell.text}".strip()
+        if rows and not values[0]:
+            # Wrapped text of the row above
+            rows[-1] = [f"{a} {b}".strip() for a, b in zip(rows[-1], values)]
+        else:
+            rows.append(values)
+    rows = [[value.replace("|", "/") for value in row] for row in rows]
+    if len(rows) < MIN_ROWS - 1:
+        return None
+    return Table(page, title, [name.replace("|", "/") for name in header], rows)
+
+
+def _title(prose):
+    """The closest all-caps heading among the few lines above a table, else the line right above."""
+    for line in reversed(prose[-3:]):
+        if line.text.isupper():
+            return line.text
+    return prose[-1].text if prose else ""
+
+
+def find_tables(lines, page):
+    """Returns (tables, lines outside any table)."""
+    tables, prose, run = [], [], []
+
+    def close_run():
+        table = _build_table(page, _title(prose), run) if len(run) >= MIN_ROWS else None
+        if table:
+            tables.append(table)
+        else:
+            prose.extend(run)
+        run.clear()
+
+    for i, line in enumerate(lines):
+        wide = len(line.cells) >= MIN_COLUMNS
+        # A narrower line between table lines is wrapped cell text, not the table's end
+        inside = run and len(line.cells) >= 1 and i + 1 < len(lines) and len(lines[i + 1].cells) >= MIN_COLUMNS
+        if wide or inside:
+            run.append(line)
+        else:
+            if run:
+                close_run()
+            prose.append(line)
+    if run:
+        close_run()
+    return tables, prose
+
+
+def parse_page(page, page_number):
+    """One PDF page -> (prose text, [Table]).
+
+    Pages without tables return pypdf's own text unchanged.
+    """
+    text, runs = extract_page(page)
+    tables, prose = find_tables(group_lines(runs), page_number)
+    if not tables:
+        return text, []
+    return "\n".join(line.text for line in prose), tables
+
+
+def parse_table_text(text):
+    """Read an indexed table chunk back into (header, rows)."""
+    lines = [line for line in text.splitlines() if CELL_SEPARATOR.strip() in line]
+    if not lines:
+        return [], []
+    header = [cell.strip() for cell in lines[0].split(CELL_SEPARATOR.strip())]
+    rows = [[cell.strip() for cell in line.split(CELL_SEPARATOR.strip())] for line in lines[1:]]
+    return header, rows
@@ -0,0 +1,54 @@
+"""Pinecone backend, imported only when VECTOR_BACKEND=pinecone.
+
+langchain_pinecone and the Pinecone SDK add noticeably to import time, so
+clients.build_vectorstore pulls this module in lazily.
+"""
+from langchain_core.documents import Document
+from langchain_pinecone import PineconeVectorStore
+
+# Vectors per Pinecone upsert request (2MB request limit ~ a few hundred 768-d vectors)
+PINECONE_UPSERT_BATCH = 100
+
+
+class PineconeStore(PineconeVectorStore):
+    """PineconeVectorStore that can also upsert vectors embedded elsewhere.
+
+    The ingest pipeline embeds chunks itself (batched, cached), so it needs
+    `add_embeddings` - the same signature LangChain's FAISS store uses.
+    Vectors written without text carry only their filter fields, and
+    searches with `ids_only=True` return IDs and scores for the chunk
+    store to hydrate (see chunk_store.py).
+    """
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, namespace=None):
+        text_embeddings = list(text_embeddings)
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        vectors = [
+            (id_, list(vector), {**metadata, self._text_key: text} if text else metadata)
+            for (text, vector), metadata, id_ in zip(text_embeddings, metadatas, ids)
+        ]
+        for i in range(0, len(vectors), PINECONE_UPSERT_BATCH):
+            self.index.upsert(vectors=vectors[i:i + PINECONE_UPSERT_BATCH], namespace=namespace or self._namespace)
+        return ids
+
+    def _id_hits(self, results):
+        return [(Document(id=match["id"], page_content="", metadata={}), match["score"]) for match in results["matches"]]
+
+    def similarity_search_by_vector_with_score(self, embedding, *, k=4, ids_only=False, **kwargs):
+        if not ids_only:
+            return super().similarity_search_by_vector_with_score(embedding, k=k, **kwargs)
+        results = self.index.query(
+            vector=embedding, top_k=k, include_metadata=False,
+            namespace=kwargs.get("namespace") or self._namespace, filter=kwargs.get("filter"),
+        )
+        return self._id_hits(results)
+
+    async def asimilarity_search_by_vector_with_score(self, embedding, *, k=4, ids_only=False, **kwargs):
+        if not ids_only:
+            return await super().asimilarity_search_by_vector_with_score(embedding, k=k, **kwargs)
+        async with self._async_index_context() as index:
+            results = await index.query(
+                vector=embedding, top_k=k, include_metadata=False,
+                namespace=kwargs.get("namespace") or self._namespace, filter=kwargs.get("filter"),
+            )
+        return self._id_hits(results)
@@ -0,0 +1,259 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from context_budget import pack_context
+from embed_engine import embed_query_batch
+from lexical import reciprocal_rank_fusion
+from observability import CACHE_REQUESTS, RETRIEVED_CHUNKS, record_stage, span, stage
+
+# Bounded pool for clients that only have a blocking API (e.g. the Google
+# embeddings client). Keeps them off the event loop without spawning a
+# thread per request.
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "8"))
+_blocking_pool = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="rag-blocking")
+
+# Chunks handed to the LLM. Keyword + vector fusion finds exact door marks
+# and section numbers, so 5 is enough; vector-only search keeps the old 25.
+HYBRID_K = int(os.getenv("HYBRID_K", "5"))
+DENSE_K = int(os.getenv("DENSE_K", "25"))
+# Candidates each retriever contributes before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context (trace ID, parent span) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_blocking_pool, functools.partial(context.run, fn, *args, **kwargs))
+
+
+def _has_native_aembed(embeddings):
+    # LangChain's base class "supports" aembed_query by running the sync
+    # method in the default executor; only trust a real override.
+    return type(embeddings).aembed_query is not Embeddings.aembed_query
+
+
+async def aembed_query(embeddings, text):
+    if _has_native_aembed(embeddings):
+        return await embeddings.aembed_query(text)
+    return await run_blocking(embeddings.embed_query, text)
+
+
+async def aembed_queries(embeddings, texts):
+    """Embed many queries with one batched API call (see embed_engine.embed_query_batch)."""
+    return await run_blocking(embed_query_batch, embeddings, list(texts))
+
+
+async def asearch_by_vector(vectorstore, query_vector, k, **kwargs):
+    if hasattr(vectorstore, "asimilarity_search_by_vector_with_score"):
+        return await vectorstore.asimilarity_search_by_vector_with_score(query_vector, k=k, **kwargs)
+    return await run_blocking(vectorstore.similarity_search_by_vector_with_score, query_vector, k=k, **kwargs)
+
+
+def build_sources(docs):
+    sources = []
+    for doc in docs:
+        source = {
+            "file": doc.metadata.get("source", "Unknown").split("/")[-1],
+            "page": doc.metadata.get("page", 0) + 1
+        }
+        start = doc.metadata.get("start_index")
+        if start is not None:
+            # Character span of the passage in the page text GET /source/{file}/{page} returns
+            source.update(start=start, end=start + len(doc.page_content))
+        sources.append(source)
+    return sources
+
+
+def _use_lexical(lexical):
+    return lexical is not None and len(lexical) > 0
+
+
+def retrieval_k(lexical):
+    return HYBRID_K if _use_lexical(lexical) else DENSE_K
+
+
+def _fuse(query, dense_docs, lexical, k, timings, filter=None):
+    with stage("lexical", timings):
+        keyword_docs = [doc for doc, _score in lexical.search(query, HYBRID_CANDIDATES, filter=filter)]
+        return reciprocal_rank_fusion(dense_docs, keyword_docs, k=k)
+
+
+def search_kwargs(namespace=None, filter=None, ids_only=False):
+    """Vector store arguments that scope a search to one project's namespace and a metadata pre-filter.
+
+    Both are applied by the store itself (Pinecone, LocalVectorStore), so
+    k results come back from inside the scope rather than being cut from
+    a corpus-wide top k. Omitted when unset: the default namespace, unfiltered.
+    `ids_only` asks Pinecone for IDs and scores without metadata; the
+    chunk store fills in the rest.
+    """
+    kwargs = {}
+    if namespace:
+        kwargs["namespace"] = namespace
+    if filter:
+        kwargs["filter"] = filter
+    if ids_only:
+        kwargs["ids_only"] = True
+    return kwargs
+
+
+def _use_chunks(chunks):
+    # An index ingested before the chunk store existed still has the text in its vectors
+    return chunks is not None and not chunks.empty()
+
+
+def _narrow(query, docs, lexical, k, timings, filter=None, chunks=None):
+    """Fuse with BM25 hits (if `lexical`), then fill in text and metadata from the chunk store (if `chunks`).
+
+    One blocking call: after an ingest the keyword index reloads from disk,
+    and hydrating reads SQLite.
+    """
+    if lexical is not None:
+        docs = _fuse(query, docs, lexical, k, timings, filter)
+    if chunks is None:
+        return docs
+    with stage("hydrate", timings):
+        return chunks.hydrate(docs)
+
+
+async def aretrieve(
+    query, embeddings, vectorstore, k, timings, query_vector=None, lexical=None, namespace=None, filter=None, chunks=None,
+):
+    with span("retrieve"):
+        # 1. Embed the query exactly once (or reuse the answer cache's vector)
+        if query_vector is None:
+            with stage("embed", timings):
+                query_vector = await aembed_query(embeddings, query)
+
+        # 2. One vector search, reusing that embedding
+        hybrid = _use_lexical(lexical)
+        chunks = chunks if chunks is not None and await run_blocking(_use_chunks, chunks) else None
+        with stage("search", timings):
+            results = await asearch_by_vector(
+                vectorstore, query_vector, max(k, HYBRID_CANDIDATES) if hybrid else k,
+                **search_kwargs(namespace, filter, ids_only=chunks is not None),
+            )
+
+        docs = [doc for doc, _score in results]
+        if not hybrid and chunks is None:
+            return docs
+        # 3. Fuse with BM25 hits so exact identifiers are not missed, and 4. only now read
+        # the text of the k chunks that are left. Both off the event loop
+        return await run_blocking(_narrow, query, docs, lexical if hybrid else None, k, timings, filter, chunks)
+
+
+def _pack(docs):
+    RETRIEVED_CHUNKS.observe(len(docs), step="retrieved")
+    packed, context = pack_context(docs)
+    RETRIEVED_CHUNKS.observe(len(packed), step="packed")
+    return packed, context
+
+
+async def acached_lookup(query, embeddings, cache, timings):
+    """Check the answer cache. Returns (cached value or None, query vector or None).
+
+    The query vector is returned so a miss can go straight to the search
+    without embedding the question twice.
+    """
+    if cache is None:
+        return None, None
+    cached = cache.get_exact(query)
+    if cached is not None:
+        CACHE_REQUESTS.inc(cache="answer", result="exact")
+        return {**cached, "cache": "exact"}, None
+
+    with stage("embed", timings):
+        query_vector = await aembed_query(embeddings, query)
+    cached = cache.get_similar(query, query_vector)
+    if cached is not None:
+        CACHE_REQUESTS.inc(cache="answer", result="semantic")
+        return {**cached, "cache": "semantic"}, query_vector
+    CACHE_REQUESTS.inc(cache="answer", result="miss")
+    return None, query_vector
+
+
+async def aanswer_question(
+    query, embeddings, vectorstore, qa_chain, k=None, cache=None, lexical=None, namespace=None, filter=None, chunks=None,
+):
+    """Single pass RAG: embed -> search -> generate, all on the same documents.
+
+    `qa_chain` is a stuff-documents chain (prompt | llm), so the retrieved
+    documents are handed to it directly instead of being fetched again.
+    Never blocks the event loop. `cache` must belong to the same
+    namespace; pass None with a filter.
+    """
+    timings = {}
+    cached, query_vector = await acached_lookup(query, embeddings, cache, timings)
+    if cached is not None:
+        return {**cached, "docs": [], "timings": timings, "context": None}
+
+    docs = await aretrieve(
+        query, embeddings, vectorstore, k or retrieval_k(lexical), timings, query_vector=query_vector, lexical=lexical,
+        namespace=namespace, filter=filter, chunks=chunks,
+    )
+    # Merge overlapping chunks, drop near-duplicates, stop at the token budget
+    docs, context = _pack(docs)
+
+    with stage("generate", timings):
+        answer = await qa_chain.ainvoke({"input": query, "context": docs})
+
+    sources = build_sources(docs)
+    if cache is not None:
+        cache.put(query, query_vector, {"answer": answer, "sources": sources})
+    return {"answer": answer, "sources": sources, "docs": docs, "timings": timings, "cache": None, "context": context}
+
+
+async def astream_answer(
+    query, embeddings, vectorstore, qa_chain, k=None, cache=None, lexical=None, namespace=None, filter=None, chunks=None,
+):
+    """Yield (event, data) pairs: sources first, then tokens, then timings
+    and the context packing report.
+
+    Citations are known as soon as retrieval finishes, so they go out
+    before the first token is generated. A cache hit is sent as a single
+    token.
+    """
+    timings = {}
+    start_total = time.perf_counter()
+    cached, query_vector = await acached_lookup(query, embeddings, cache, timings)
+    if cached is not None:
+        yield "sources", cached["sources"]
+        yield "token", cached["answer"]
+        timings["total_ms"] = _elapsed_ms(start_total)
+        yield "done", {"timings": timings, "cache": cached["cache"]}
+        return
+
+    docs = await aretrieve(
+        query, embeddings, vectorstore, k or retrieval_k(lexical), timings, query_vector=query_vector, lexical=lexical,
+        namespace=namespace, filter=filter, chunks=chunks,
+    )
+    # Merge overlapping chunks, drop near-duplicates, stop at the token budget
+    docs, context = _pack(docs)
+    sources = build_sources(docs)
+    yield "sources", sources
+
+    start = time.perf_counter()
+    tokens = []
+    async for token in qa_chain.astream({"input": query, "context": docs}):
+        if "first_token_ms" not in timings:
+            timings["first_token_ms"] = _elapsed_ms(start_total)
+        tokens.append(token)
+        yield "token", token
+    # Not a `with stage()`: the block would straddle yields to the client
+    record_stage("generate", start, timings)
+    timings["total_ms"] = _elapsed_ms(start_total)
+
+    if cache is not None:
+        cache.put(query, query_vector, {"answer": "".join(tokens), "sources": sources})
+    yield "done", {"timings": timings, "cache": None, "context": context}
@@ -0,0 +1,113 @@
+"""Project scoping: one vector namespace per (tenant, project), plus metadata filters.
+
+Each project's chunks live in their own namespace (a Pinecone namespace,
+or a sub-directory of the local index), so a search only ever touches the
+project it is for. Its keyword index, schedule store, manifest and
+checkpoint get their own files too; `Scope.path` derives them. The
+unnamed default project keeps the original namespace and file names.
+
+Filters use Pinecone's metadata filter syntax over the fields ingest
+attaches to every chunk (file, discipline, section, page; see
+ingest_pipeline.page_metadata) and are evaluated inside the search
+(Pinecone, LocalVectorStore, LexicalIndex), never on its results.
+"""
+import os
+import re
+
+from ingest_pipeline import PDF_FOLDER_PATH
+
+_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,62}$")
+
+
+def _check_name(kind, value):
+    if value and not _NAME.match(value):
+        raise ValueError(f"Invalid {kind} '{value}': use letters, digits, '.', '_' or '-' (max 63)")
+    return value or None
+
+
+class Scope:
+    """Which project (and tenant) a request or an ingest run is for."""
+
+    def __init__(self, project=None, tenant=None):
+        self.project = _check_name("project", project)
+        self.tenant = _check_name("tenant", tenant)
+        if self.tenant and not self.project:
+            raise ValueError("A tenant needs a project")
+
+    @property
+    def namespace(self):
+        """'' for the default project, else 'tenant__project' or 'project'."""
+        if not self.project:
+            return ""
+        return f"{self.tenant}__{self.project}" if self.tenant else self.project
+
+    def path(self, base_path):
+        """Per-project variant of a state file: lexical_index.json -> lexical_index.<namespace>.json"""
+        if not self.namespace:
+            return base_path
+        root, ext = os.path.splitext(base_path)
+        return f"{root}.{self.namespace}{ext}"
+
+    @property
+    def pdf_folder(self):
+        if not self.project:
+            return PDF_FOLDER_PATH
+        return os.path.join(PDF_FOLDER_PATH, *([self.tenant] if self.tenant else []), self.project)
+
+
+def normalize_section(section):
+    """'08 71 00', '08-71-00' and '087100' all -> '087100'."""
+    return re.sub(r"\D", "", str(section))
+
+
+def build_filter(files=None, disciplines=None, sections=None, page_from=None, page_to=None):
+    """Metadata filter from request fields; pages are 1-based like the chat sources."""
+    clauses = {}
+    if files:
+        clauses["file"] = {"$in": [os.path.basename(f) for f in files]}
+    if disciplines:
+        clauses["discipline"] = {"$in": [d.lower() for d in disciplines]}
+    if sections:
+        clauses["section"] = {"$in": [normalize_section(s) for s in sections]}
+    pages = {}
+    if page_from is not None:
+        pages["$gte"] = page_from - 1
+    if page_to is not None:
+        pages["$lte"] = page_to - 1
+    if pages:
+        clauses["page"] = pages
+    return clauses or None
+
+
+_OPERATORS = {
+    "$eq": lambda value, arg: value == arg,
+    "$ne": lambda value, arg: value != arg,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+    "$lte": lambda value, arg: value is not None and value <= arg,
+}
+
+
+def matches(metadata, filter):
+    """Evaluate a Pinecone-style metadata filter ($eq/$in/$gte/..., $and/$or) locally."""
+    if not filter:
+        return True
+    if metadata is None:
+        return False
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_OPERATORS[op](value, arg) for op, arg in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
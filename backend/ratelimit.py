@@ -0,0 +1,260 @@
+"""Outbound quota control for the embedding and LLM APIs.
+
+Each provider gets one shared `RateLimiter`: token buckets for requests
+and tokens per minute, a priority queue so interactive /chat calls go
+ahead of /extract and ingest, a wait bound per priority (past it the
+caller gets `Overloaded` with a retry time right away instead of queueing
+into a timeout) and AIMD adaptation to the provider's 429s.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Lower value = served first
+CHAT, EXTRACT, INGEST = 0, 1, 2
+PRIORITY_NAMES = {CHAT: "chat", EXTRACT: "extract", INGEST: "ingest"}
+# Longest a caller may queue for quota before being turned away; ingest waits as long as it takes
+MAX_WAIT = {
+    CHAT: float(os.getenv("LIMITER_MAX_WAIT_CHAT", "10")),
+    EXTRACT: float(os.getenv("LIMITER_MAX_WAIT_EXTRACT", "60")),
+    INGEST: None,
+}
+# AIMD: halve the rate on a provider 429, win back 10% of it every ADAPT_INTERVAL seconds of success
+MIN_RATE_SCALE = 0.1
+DECREASE_FACTOR = 0.5
+INCREASE_STEP = 0.1
+ADAPT_INTERVAL = float(os.getenv("LIMITER_ADAPT_INTERVAL", "5"))
+# How often a queued caller that is not at the head re-checks its place
+QUEUE_POLL_SECONDS = 0.05
+
+_priority = contextvars.ContextVar("limiter_priority", default=INGEST)
+
+
+@contextmanager
+def priority(level):
+    """Tag every limited call made in this block (and in run_blocking workers) with `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when the wait for quota would exceed the caller's bound."""
+
+    def __init__(self, limiter, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"{limiter} queue is full, retry in {self.retry_after}s")
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute`.
+
+    `capacity` defaults to one minute's worth, i.e. a full minute's quota
+    may be spent in a burst but never more.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def deficit(self, amount):
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount):
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+    def set_rate(self, per_minute):
+        with self._lock:
+            self._refill()
+            self.rate = per_minute / 60.0
+
+    def drain(self):
+        with self._lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = time.monotonic()
+
+    def try_acquire(self, amount=1):
+        """Take `amount` tokens if available. Returns 0, or seconds to wait."""
+        amount = min(amount, self.capacity)  # an oversized request must not wait forever
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    def acquire(self, amount=1):
+        while True:
+            wait = self.try_acquire(amount)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one provider.
+
+    Shared by threads (ingest, run_blocking workers) and the event loop:
+    `acquire` blocks, `aacquire` sleeps. Callers are admitted strictly in
+    (priority, arrival) order. Report provider 429s with
+    `on_rate_limited()` and successes with `on_success()`.
+    """
+
+    def __init__(self, rpm, tpm, name="api", burst_seconds=60, max_wait=None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm, max(1, rpm * burst_seconds / 60))
+        self.tokens = TokenBucket(tpm, max(1, tpm * burst_seconds / 60))
+        self.max_wait = MAX_WAIT if max_wait is None else max_wait
+        self.scale = 1.0
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, arrival, tokens)
+        self._arrivals = itertools.count()
+        self._last_adapted = time.monotonic()
+        self._last_decrease = -math.inf
+        self.counters = {"admitted": 0, "rejected": 0, "rate_limited": 0}
+
+    # --- admission ---------------------------------------------------------
+
+    def _estimate(self, entry):
+        """Seconds until `entry` and everything queued ahead of it fit the buckets."""
+        ahead = [other for other in self._queue if other < entry] + [entry]
+        return max(self.requests.deficit(len(ahead)), self.tokens.deficit(sum(other[2] for other in ahead)))
+
+    def _remove(self, entry):
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def _reject(self, entry, retry_after):
+        self._remove(entry)
+        self.counters["rejected"] += 1
+        return Overloaded(self.name, retry_after)
+
+    def _enqueue(self, tokens):
+        level = _priority.get()
+        entry = (level, next(self._arrivals), min(tokens, self.tokens.capacity))
+        max_wait = self.max_wait.get(level)
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            if max_wait is not None:
+                estimate = self._estimate(entry)
+                if estimate > max_wait:
+                    raise self._reject(entry, estimate)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        return entry, deadline
+
+    def _poll(self, entry, deadline):
+        """Admit `entry` if it is at the head and fits. Returns 0 or seconds to wait."""
+        with self._cond:
+            if self._queue[0] is entry:
+                wait = max(self.requests.deficit(1), self.tokens.deficit(entry[2]))
+                if wait == 0:
+                    self.requests.take(1)
+                    self.tokens.take(entry[2])
+                    heapq.heappop(self._queue)
+                    self.counters["admitted"] += 1
+                    self._cond.notify_all()
+                    return 0.0
+            else:
+                wait = QUEUE_POLL_SECONDS
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._reject(entry, self._estimate(entry))
+                wait = min(wait, remaining)
+            return wait
+
+    def check(self, level, tokens=1):
+        """Raise Overloaded now if a call at `level` could not be admitted in time."""
+        max_wait = self.max_wait.get(level)
+        if max_wait is None:
+            return
+        with self._cond:
+            estimate = self._estimate((level, math.inf, min(tokens, self.tokens.capacity)))
+            if estimate > max_wait:
+                self.counters["rejected"] += 1
+                raise Overloaded(self.name, estimate)
+
+    def acquire(self, tokens):
+        entry, deadline = self._enqueue(tokens)
+        try:
+            while True:
+                wait = self._poll(entry, deadline)
+                if wait == 0:
+                    return
+                with self._cond:
+                    self._cond.wait(wait)
+        except BaseException:
+            with self._cond:
+                self._remove(entry)
+            raise
+
+    async def aacquire(self, tokens):
+        entry, deadline = self._enqueue(tokens)
+        try:
+            while True:
+                wait = self._poll(entry, deadline)
+                if wait == 0:
+                    return
+                await asyncio.sleep(wait)
+        except BaseException:
+            with self._cond:
+                self._remove(entry)
+            raise
+
+    # --- adaptation --------------------------------------------------------
+
+    def _set_scale(self, scale):
+        self.scale = scale
+        self.requests.set_rate(self.rpm * scale)
+        self.tokens.set_rate(self.tpm * scale)
+        self._last_adapted = time.monotonic()
+
+    def on_rate_limited(self):
+        """The provider answered 429: halve the rate and stop the current burst."""
+        with self._cond:
+            self.counters["rate_limited"] += 1
+            self.requests.drain()
+            self.tokens.drain()
+            # One burst of 429s is one signal, not one per failed call
+            if time.monotonic() - self._last_decrease >= 1.0:
+                self._last_decrease = time.monotonic()
+                self._set_scale(max(MIN_RATE_SCALE, self.scale * DECREASE_FACTOR))
+
+    def on_success(self):
+        if self.scale < 1.0 and time.monotonic() - self._last_adapted >= ADAPT_INTERVAL:
+            with self._cond:
+                self._set_scale(min(1.0, self.scale + INCREASE_STEP))
+
+    def stats(self):
+        with self._cond:
+            return {**self.counters, "queued": len(self._queue), "rate_scale": round(self.scale, 2)}
+
+
+def estimate_tokens(texts):
+    # ~4 characters per token for English text; good enough for budgeting
+    return sum(len(t) for t in texts) // 4 + 1
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import threading
+import time
+
+SCHEDULE_DB_PATH = os.getenv("SCHEDULE_DB_PATH", "schedule.sqlite3")
+DOOR_FIELDS = ["mark", "location", "width_mm", "height_mm", "fire_rating", "material"]
+
+
+class ScheduleStore:
+    """Extracted door schedule rows, plus the hash of every page they came from.
+
+    Page hashes let a refresh re-extract only the pages whose text changed.
+    """
+
+    def __init__(self, path=SCHEDULE_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS doors (
+                file TEXT NOT NULL, page INTEGER NOT NULL,
+                {", ".join(f"{field} TEXT" for field in DOOR_FIELDS)}
+            );
+            CREATE INDEX IF NOT EXISTS doors_file_page ON doors (file, page);
+            CREATE TABLE IF NOT EXISTS pages (
+                file TEXT NOT NULL, page INTEGER NOT NULL, text_hash TEXT NOT NULL,
+                PRIMARY KEY (file, page)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self._conn.commit()
+
+    def page_hashes(self, file_name):
+        with self._lock:
+            rows = self._conn.execute("SELECT page, text_hash FROM pages WHERE file = ?", (file_name,)).fetchall()
+        return dict(rows)
+
+    def files(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT file FROM pages")]
+
+    def replace_pages(self, file_name, page_hashes, doors):
+        """Swap in freshly extracted rows for these pages of one file."""
+        pages = list(page_hashes)
+        with self._lock:
+            self._conn.executemany("DELETE FROM doors WHERE file = ? AND page = ?", [(file_name, p) for p in pages])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (file, page, text_hash) VALUES (?, ?, ?)",
+                [(file_name, p, h) for p, h in page_hashes.items()],
+            )
+            self._conn.executemany(
+                f"INSERT INTO doors (file, page, {', '.join(DOOR_FIELDS)}) VALUES (?, ?, {', '.join('?' * len(DOOR_FIELDS))})",
+                [(file_name, d["page"], *[_text(d.get(field)) for field in DOOR_FIELDS]) for d in doors],
+            )
+            self._touch()
+            self._conn.commit()
+
+    def remove_pages(self, file_name, pages):
+        with self._lock:
+            self._conn.executemany("DELETE FROM doors WHERE file = ? AND page = ?", [(file_name, p) for p in pages])
+            self._conn.executemany("DELETE FROM pages WHERE file = ? AND page = ?", [(file_name, p) for p in pages])
+            self._touch()
+            self._conn.commit()
+
+    def remove_file(self, file_name):
+        self.remove_pages(file_name, list(self.page_hashes(file_name)))
+
+    def doors(self, files=None, page_from=None, page_to=None):
+        """Rows, with 1-based pages like the chat sources; optionally only these files / that page range."""
+        where, params = [], []
+        if files:
+            where.append(f"file IN ({', '.join('?' * len(files))})")
+            params += list(files)
+        if page_from is not None:
+            where.append("page >= ?")
+            params.append(page_from - 1)
+        if page_to is not None:
+            where.append("page <= ?")
+            params.append(page_to - 1)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file, page, {', '.join(DOOR_FIELDS)} FROM doors "
+                f"{'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY file, page, rowid",
+                params,
+            ).fetchall()
+        return [door_row(f, {"page": page, **dict(zip(DOOR_FIELDS, rest))}) for f, page, *rest in rows]
+
+    def updated_at(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'updated_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def mark_refreshed(self):
+        with self._lock:
+            self._touch()
+            self._conn.commit()
+
+    def _touch(self):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('updated_at', ?)", (str(time.time()),))
+
+
+def door_row(file_name, door):
+    """A door as the API returns it: file, 1-based page and the door fields as text."""
+    return {"file": file_name, "page": door["page"] + 1, **{field: _text(door.get(field)) for field in DOOR_FIELDS}}
+
+
+def _text(value):
+    return None if value is None else str(value)
@@ -0,0 +1,36 @@
+"""Share one in-flight computation between identical concurrent requests.
+
+When a team opens the dashboard together, dozens of identical /chat or
+/extract calls arrive within seconds. The first caller for a key starts the
+work; everyone arriving before it finishes awaits the same result (or the
+same exception) instead of spending another retrieval and LLM call.
+"""
+import asyncio
+
+from observability import Counter
+
+COALESCED = Counter("rag_coalesced_requests_total", "Requests served by an identical in-flight request", ["endpoint"])
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight = {}  # key -> asyncio.Task
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Run `await fn(*args, **kwargs)` once per key at a time.
+
+        `key` is a tuple starting with the endpoint name. The work runs in
+        its own task, so one caller disconnecting does not cancel it for the
+        others.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            COALESCED.inc(endpoint=key[0])
+        return await asyncio.shield(task)
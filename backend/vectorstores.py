@@ -0,0 +1,298 @@
+import json
+import os
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from pipeline import run_blocking
+from projects import matches
+
+# Rewrite the local index once this share of its rows are dead (overwritten or deleted)
+LOCAL_COMPACT_RATIO = 0.5
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector index for corpora that fit on one machine.
+
+    On disk (one directory per index):
+      vectors.<n>.f32  - L2-normalized float32 rows, memory-mapped for search
+      log.<n>.jsonl    - one line per upsert ({"id", "row", "text", "metadata"})
+                         or delete ({"delete": id}); replayed on load
+      current.json     - {"generation": n}, the pair of files in use
+                         (generation 0, before any compaction, is vectors.f32 and log.jsonl)
+
+    Both files are append-only, so upserts from the ingest workers are
+    cheap and an API process picks up new rows by replaying the log tail.
+    Compaction writes the next generation and publishes both files with
+    one rename of current.json, so a reader in another process never pairs
+    new vectors with an old log. Search is a single matrix-vector product
+    over the mapped rows.
+
+    Like a Pinecone namespace, `namespace=` on writes and searches selects
+    a separate index under ns/<namespace>, so a project's search only
+    scans that project's rows.
+    """
+
+    def __init__(self, path, embedding=None, dim=None):
+        self.path = path
+        self._embedding = embedding
+        self._current_path = os.path.join(path, "current.json")
+        self._current_mtime = None
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self.dim = dim
+        self._namespaces = {}
+        self._use_generation(0)
+        self._reset()
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def _namespace(self, namespace):
+        """The store for `namespace` ('' or None is this one)."""
+        if not namespace:
+            return self
+        with self._lock:
+            if namespace not in self._namespaces:
+                self._namespaces[namespace] = LocalVectorStore(os.path.join(self.path, "ns", namespace), self._embedding)
+            return self._namespaces[namespace]
+
+    def _files(self, generation):
+        if not generation:
+            return os.path.join(self.path, "vectors.f32"), os.path.join(self.path, "log.jsonl")
+        return os.path.join(self.path, f"vectors.{generation}.f32"), os.path.join(self.path, f"log.{generation}.jsonl")
+
+    def _use_generation(self, generation):
+        self._generation = generation
+        self._vectors_path, self._log_path = self._files(generation)
+
+    def _check_generation(self):
+        """Switch to the files another process compacted into; True if it did."""
+        try:
+            mtime = os.stat(self._current_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._current_mtime:
+            return False
+        self._current_mtime = mtime
+        with open(self._current_path) as f:
+            generation = json.load(f)["generation"]
+        if generation == self._generation:
+            return False
+        self._use_generation(generation)
+        return True
+
+    def _reset(self):
+        self._rows = {}  # id -> row
+        self._ids = []  # row -> id (None once dead)
+        self._texts = []
+        self._metadatas = []
+        self._vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._log_offset = 0
+
+    def _load(self):
+        """Replay log lines written since the last load (possibly by another process)."""
+        with self._lock:
+            if self._check_generation():
+                self._reset()
+            if not os.path.exists(self._log_path):
+                return
+            if os.path.getsize(self._log_path) == self._log_offset:
+                return
+            with open(self._log_path, "rb") as f:
+                f.seek(self._log_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # being written right now; pick it up next time
+                    self._log_offset += len(line)
+                    self._apply(json.loads(line))
+            self._map_vectors()
+
+    def _apply(self, entry):
+        if "delete" in entry:
+            row = self._rows.pop(entry["delete"], None)
+            if row is not None:
+                self._ids[row] = None
+            return
+        if entry.get("dim"):
+            self.dim = entry["dim"]
+            return
+        row = entry["row"]
+        while len(self._ids) <= row:
+            self._ids.append(None)
+            self._texts.append(None)
+            self._metadatas.append(None)
+        old = self._rows.get(entry["id"])
+        if old is not None:
+            self._ids[old] = None
+        self._rows[entry["id"]] = row
+        self._ids[row] = entry["id"]
+        self._texts[row] = entry["text"]
+        self._metadatas[row] = entry["metadata"]
+
+    def _map_vectors(self):
+        rows = len(self._ids)
+        if rows == 0:
+            self._vectors = np.zeros((0, self.dim or 0), dtype=np.float32)
+        else:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        self._live = np.array([id_ is not None for id_ in self._ids], dtype=bool)
+
+    def _append_log(self, entries):
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        with open(self._log_path, "ab") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_offset += len(lines)
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, namespace=None, **kwargs):
+        if namespace:
+            return self._namespace(namespace).add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        text_embeddings = list(text_embeddings)
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        ids = ids or [os.urandom(10).hex() for _ in text_embeddings]
+        vectors = np.asarray([vector for _, vector in text_embeddings], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._load()
+            entries = []
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                entries.append({"dim": self.dim})
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            start = len(self._ids)
+            entries += [
+                {"id": id_, "row": start + i, "text": text, "metadata": metadata}
+                for i, ((text, _), metadata, id_) in enumerate(zip(text_embeddings, metadatas, ids))
+            ]
+            # Vectors first: a log line never points at rows that are not on disk yet
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._append_log(entries)
+            for entry in entries:
+                self._apply(entry)
+            self._map_vectors()
+            self._maybe_compact()
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, namespace=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(
+            zip(texts, self._embedding.embed_documents(texts)), metadatas=metadatas, ids=ids, namespace=namespace
+        )
+
+    def delete(self, ids=None, namespace=None, **kwargs):
+        if namespace:
+            return self._namespace(namespace).delete(ids=ids)
+        with self._lock:
+            self._load()
+            entries = [{"delete": id_} for id_ in ids or [] if id_ in self._rows]
+            if not entries:
+                return
+            self._append_log(entries)
+            for entry in entries:
+                self._apply(entry)
+            self._live = np.array([id_ is not None for id_ in self._ids], dtype=bool)
+            self._maybe_compact()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - len(self._rows)
+        if dead and dead >= LOCAL_COMPACT_RATIO * len(self._ids):
+            self.compact()
+
+    def compact(self):
+        """Rewrite both files with only the live rows, as the next generation."""
+        with self._lock:
+            live = np.flatnonzero(self._live)
+            vectors = np.array(self._vectors[live]) if len(live) else np.zeros((0, self.dim), dtype=np.float32)
+            entries = [{"dim": self.dim}] + [
+                {"id": self._ids[row], "row": i, "text": self._texts[row], "metadata": self._metadatas[row]}
+                for i, row in enumerate(live)
+            ]
+            generation = self._generation + 1
+            vectors_path, log_path = self._files(generation)
+            with open(vectors_path, "wb") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(log_path, "w") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in entries)
+                f.flush()
+                os.fsync(f.fileno())
+            tmp_path = self._current_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"generation": generation}, f)
+            os.replace(tmp_path, self._current_path)
+            # A reader may still be loading the previous generation; the one before it is unused
+            if generation >= 2:
+                for path in self._files(generation - 2):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._current_mtime = None
+            self._reset()
+            self._load()
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=None, **kwargs):
+        store = cls(path or os.path.join("local_index", "default"), embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, namespace=None, **kwargs):
+        """`filter` takes Pinecone's syntax ($eq, $in, $gte, ...) and masks rows before ranking."""
+        if namespace:
+            return self._namespace(namespace).similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+        self._load()
+        with self._lock:
+            vectors, live, ids = self._vectors, self._live, list(self._ids)
+            texts, metadatas = self._texts, self._metadatas
+        if not len(vectors):
+            return []
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = vectors @ query
+        mask = live.copy()
+        if filter:
+            mask &= np.array([matches(m, filter) for m in metadatas], dtype=bool)
+        scores = np.where(mask, scores, -np.inf)
+
+        k = min(k, int(mask.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (Document(id=ids[row], page_content=texts[row], metadata=dict(metadatas[row])), float(scores[row]))
+            for row in top
+        ]
+
+    async def asimilarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        # Replaying the log tail and the per-row filter are file I/O and Python loops: off the event loop
+        return await run_blocking(self.similarity_search_by_vector_with_score, embedding, k=k, filter=filter, **kwargs)
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k=k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter, **kwargs)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
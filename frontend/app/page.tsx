@@ -165,6 +165,35 @@
 import { useState } from "react";
 import ReactMarkdown from "react-markdown";
 
+// Read a Server-Sent Events response, calling onEvent for each event as it arrives
+const readEvents = async (res: Response, onEvent: (event: string, payload: any) => void) => {
+  const reader = res.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 export default function Home() {
   // --- LOGIN STATE ---
   const [email, setEmail] = useState("");
@@ -191,6 +220,8 @@ export default function Home() {
   };
 
   // 1. Function to send message to your Backend
+  // Uses the /chat/stream SSE endpoint: citations arrive right after retrieval,
+  // then the answer is appended token by token.
   const sendMessage = async () => {
     if (!input) return;
     const newMsg = { role: "user", content: input };
@@ -198,21 +229,40 @@ export default function Home() {
     setLoading(true);
     setInput("");
 
+    // Update the AI message we are currently streaming into (always the last one)
+    const updateLast = (patch: (msg: any) => any) =>
+      setMessages((prev) => [...prev.slice(0, -1), patch(prev[prev.length - 1])]);
+
     try {
-      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/chat`, {
+      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ query: input }),
       });
-      
-      const data = await res.json();
-      
-      // ✅ FIX: Directly use the 'answer' from backend. 
-      // If the backend catches a 429 Quota error, it sends the polite warning here.
-      setMessages((prev) => [
-        ...prev,
-        { role: "ai", content: data.answer, sources: data.sources },
-      ]);
+      if (res.status === 429) {
+        // ✅ Quota is fully booked: the backend says how long to wait (Retry-After)
+        const data = await res.json();
+        setMessages((prev) => [...prev, { role: "ai", content: data.message }]);
+        setLoading(false);
+        return;
+      }
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      setMessages((prev) => [...prev, { role: "ai", content: "", sources: [] }]);
+      setLoading(false);
+
+      await readEvents(res, (event, payload) => {
+        if (event === "sources") {
+          updateLast((msg) => ({ ...msg, sources: payload }));
+        } else if (event === "token") {
+          updateLast((msg) => ({ ...msg, content: msg.content + payload }));
+        } else if (event === "error") {
+          // ✅ Backend sends the polite 429 / quota warning here
+          updateLast((msg) => ({ ...msg, content: payload.message }));
+        } else if (event === "done") {
+          console.log("⏱️ Timings:", payload.timings);
+        }
+      });
 
     } catch (e) {
       console.error(e);
@@ -223,21 +273,44 @@ export default function Home() {
   };
 
   // 2. Function to ask for the Door Schedule
+  // Uses the /extract/stream SSE endpoint: rows fill the table as they are extracted,
+  // then the final merged table replaces them.
   const generateSchedule = async () => {
     setLoading(true);
+    const busy = (retryAfter: number) =>
+      setMessages(prev => [...prev, { role: "ai", content: `⏳ Busy: the AI quota is fully booked. Please try again in ${retryAfter}s.` }]);
+    const failed = () =>
+      setMessages(prev => [...prev, { role: "ai", content: "⚠️ Could not extract data (or AI quota exceeded)." }]);
     try {
-      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/extract`, {
+      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/extract/stream`, {
         method: "POST",
       });
-      const data = await res.json();
-      
-      if (data.doors && data.doors.length > 0) {
-        setSchedule(data.doors);
-        setMessages(prev => [...prev, { role: "ai", content: "✅ I have generated the door schedule." }]);
-      } else {
-        setMessages(prev => [...prev, { role: "ai", content: "⚠️ Could not extract data (or AI quota exceeded)." }]);
+      if (res.status === 429) {
+        busy((await res.json()).retry_after);
+        setLoading(false);
+        return;
       }
-      
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      // A door is one row per file and mark; a later `row` for it replaces the earlier one
+      const rows = new Map<string, any>();
+      await readEvents(res, (event, payload) => {
+        if (event === "row") {
+          rows.set(payload.mark ? `${payload.file}\u0000${payload.mark}` : `#${rows.size}`, payload);
+          setSchedule([...rows.values()]);
+        } else if (event === "done") {
+          if (payload.doors.length > 0) {
+            setSchedule(payload.doors);
+            setMessages(prev => [...prev, { role: "ai", content: "✅ I have generated the door schedule." }]);
+          } else {
+            failed();
+          }
+        } else if (event === "error") {
+          if (payload.retry_after) busy(payload.retry_after);
+          else failed();
+        }
+      });
+
     } catch (e) {
       console.error(e);
       setMessages(prev => [...prev, { role: "ai", content: "⚠️ Error generating schedule." }]);